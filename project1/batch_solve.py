@@ -0,0 +1,223 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+from water_jug_v3 import search, SearchStats, SearchBudget, ENGINES
+
+def is_int(value):
+    """
+    value: a field of a JSON record
+
+    True for a JSON integer, bools are ints in Python but not here
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def parse_record(line):
+    """
+    line: a single record from the input stream
+
+    Records are either JSON objects ({"id": ..., "capacities": [...], "goal": ...}) or the plain
+    form "c1,c2,...,cn goal". Capacities never include the goal jug, just like the test case files.
+    Returns the record as a dict, or None for blank and comment lines. A JSON record with bad fields
+    keeps its id and gets an error instead, other malformed lines raise
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+
+    if line.startswith('{'):
+        record = json.loads(line)
+        capacities, goal = record.get('capacities'), record.get('goal')
+        # int() would take "12" or 4.5 too, and a string of capacities would be read one digit per jug
+        if not isinstance(capacities, list) or not all(is_int(c) for c in capacities):
+            return {'id': record.get('id'), 'error': f'bad record: capacities should be a list of integers, got {capacities!r}'}
+        if not is_int(goal):
+            return {'id': record.get('id'), 'error': f'bad record: goal should be an integer, got {goal!r}'}
+        return {'id': record.get('id'), 'capacities': capacities, 'goal': goal}
+
+    capacities, goal = line.split()
+    return {'id': None, 'capacities': [int(c) for c in capacities.split(',')], 'goal': int(goal)}
+
+def read_records(stream):
+    """
+    stream: an iterable of lines
+
+    Lazily yields (index, record) pairs so the input is never held in memory. A line that can't be parsed
+    still gets its index, as a record holding only its id and an error
+    """
+    index = 0
+    for line in stream:
+        try:
+            record = parse_record(line)
+        except ValueError as error:
+            record = {'id': None, 'error': f'bad record: {error!r}'}
+        if record is None:
+            continue
+        yield index, record
+        index += 1
+
+def error_result(index, record, error):
+    """
+    index: the record's position in the input
+    record: the record, only its id is used
+    error: what went wrong
+
+    The result written for a record that could not be solved
+    """
+    return {'index': index, 'id': record.get('id'), 'error': error}
+
+def solve_chunk(chunk, engine='greedy', time_limit=None, max_expansions=None):
+    """
+    chunk: a list of (index, record) pairs
+    engine: search() engine to solve with
+    time_limit: optional seconds allowed per instance
+    max_expansions: optional expansions allowed per instance
+
+    Worker entry point, solves every record in the chunk and returns one result dict per record. A record
+    that is malformed or fails to solve gets an error result instead, the rest of the chunk is unaffected
+    """
+    results = []
+    for index, record in chunk:
+        if 'error' in record:
+            results.append(error_result(index, record, record['error']))
+            continue
+
+        stats = SearchStats()
+        budget = SearchBudget(time_limit, max_expansions) if time_limit is not None or max_expansions is not None else None
+        t0 = time.perf_counter()
+        try:
+            cost = search([int(1e9)] + record['capacities'], record['goal'], stats=stats, engine=engine, budget=budget)
+        except Exception as error:
+            results.append(error_result(index, record, repr(error)))
+            continue
+        t1 = time.perf_counter()
+
+        # budgeted results also report how far from optimal the answer can be
+        extra = {}
+        if budget is not None:
+            cost, extra = cost.cost, {'lower_bound': cost.lower_bound if cost.lower_bound != math.inf else None,
+                                      'complete': cost.complete}
+        results.append({
+            'index': index,
+            'id': record['id'],
+            'capacities': record['capacities'],
+            'goal': record['goal'],
+            'cost': cost,
+            'time': t1 - t0,
+            **extra,
+            **stats.as_dict(),
+        })
+    return results
+
+def chunked(records, chunksize):
+    """
+    records: an iterator of (index, record) pairs
+    chunksize: number of records per chunk
+
+    Groups records so each pool task amortises its pickling overhead over several instances
+    """
+    while True:
+        chunk = list(islice(records, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+def solve_stream(stream, workers=None, chunksize=16, max_in_flight=None, ordered=False, engine='greedy',
+                 time_limit=None, max_expansions=None):
+    """
+    stream: an iterable of input lines
+    workers: number of worker processes (defaults to the number of cpus)
+    chunksize: number of records sent to a worker at once
+    max_in_flight: maximum number of chunks submitted but not yet written (defaults to 4 per worker)
+    ordered: yield results in input order instead of completion order
+    engine: search() engine to solve with
+    time_limit: optional seconds allowed per instance, past it the best answer so far is written
+    max_expansions: optional expansions allowed per instance
+
+    Solves every record in the stream across a process pool, yielding result dicts as they finish.
+    At most max_in_flight chunks are ever pending (including finished chunks held back for ordering)
+    so memory stays flat regardless of the input size. A chunk whose worker fails gets an error result
+    per record and a broken pool is replaced, so one bad instance never stops the batch
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 4 * workers
+    chunks = chunked(read_records(stream), chunksize)
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {}
+        # Finished chunks waiting on an earlier chunk when ordering is requested
+        finished = {}
+        next_submit = 0
+        next_write = 0
+        exhausted = False
+
+        while True:
+            # Top up the pool, counting held back chunks against the in-flight budget
+            while not exhausted and len(pending) + len(finished) < max_in_flight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                try:
+                    future = pool.submit(solve_chunk, chunk, engine, time_limit, max_expansions)
+                except BrokenProcessPool:
+                    # A worker died and took the pool with it, its chunks are reported below
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                    future = pool.submit(solve_chunk, chunk, engine, time_limit, max_expansions)
+                pending[future] = next_submit, chunk
+                next_submit += 1
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                sequence, chunk = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as error:
+                    results = [error_result(index, record, repr(error)) for index, record in chunk]
+                if not ordered:
+                    yield from results
+                    continue
+
+                finished[sequence] = results
+                while next_write in finished:
+                    yield from finished.pop(next_write)
+                    next_write += 1
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve a stream of water jug instances, writing JSONL results as they finish')
+    parser.add_argument('input', help='file of instances, one per line, or - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='where to write JSONL results (default stdout)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: cpu count)')
+    parser.add_argument('-c', '--chunksize', type=int, default=16, help='instances per worker task')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='maximum chunks pending at once (default: 4 per worker)')
+    parser.add_argument('--ordered', action='store_true', help='write results in input order')
+    parser.add_argument('-e', '--engine', default='greedy', choices=sorted(ENGINES), help='search() engine to solve with')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds allowed per instance')
+    parser.add_argument('--max-expansions', type=int, default=None, help='expansions allowed per instance')
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for result in solve_stream(source, args.workers, args.chunksize, args.max_in_flight, args.ordered, args.engine,
+                                   args.time_limit, args.max_expansions):
+            sink.write(json.dumps(result) + '\n')
+            sink.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
@@ -0,0 +1,222 @@
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from functools import reduce
+
+import numpy as np
+
+from water_jug_v3 import search, SearchStats, ENGINES
+
+# name: (number of non-goal jugs, lowest capacity, highest capacity, highest goal multiplier)
+FAMILIES = {
+    'small-2': (2, 1, 50, 50),
+    'small-3': (3, 1, 50, 50),
+    'medium-2': (2, 1, 200, 200),
+    'medium-3': (3, 1, 200, 200),
+    'medium-4': (4, 1, 200, 200),
+    'large-goal-2': (2, 1, 200, 2000),
+    'wide-3': (3, 50, 1000, 200),
+}
+
+def make_instances(family, n_cases, seed):
+    """
+    family: a name from FAMILIES
+    n_cases: number of instances to generate
+    seed: seed for the instance generator
+
+    Generates the instances of a family the same way as generate_test_cases(), but from a private
+    RandomState so the same seed always gives the same instances regardless of any other numpy calls.
+    The goal is a random multiple of the gcd so every instance is solvable
+    """
+    n_states, low, high, goal_high = FAMILIES[family]
+    rng = np.random.RandomState(seed)
+    instances = []
+    for _ in range(n_cases):
+        capacities = [int(1e9)] + rng.randint(low, high + 1, size=n_states).tolist()
+        goal = int(rng.randint(1, goal_high + 1)) * reduce(math.gcd, capacities[1:])
+        instances.append((capacities, goal))
+    return instances
+
+def run_instance(capacities, goal, engine='greedy'):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    engine: search() engine to time
+
+    Times one search() and returns (cost, seconds, nodes expanded)
+    """
+    stats = SearchStats()
+    t0 = time.perf_counter()
+    cost = search(capacities, goal, stats=stats, engine=engine)
+    t1 = time.perf_counter()
+    return cost, t1 - t0, stats.expanded
+
+def peak_memory(capacities, goal, engine='greedy'):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    engine: search() engine to measure
+
+    Peak traced bytes of one search(), measured in its own run because tracing slows the search down
+    """
+    tracemalloc.start()
+    search(capacities, goal, engine=engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def run_family(family, n_cases=20, seed=0, repeats=3, warmup=2, engine='greedy'):
+    """
+    family: a name from FAMILIES
+    n_cases: number of instances in the family
+    seed: seed for the instance generator
+    repeats: timed runs per instance, the fastest is kept
+    warmup: untimed runs before timing starts
+    engine: search() engine to benchmark
+
+    Benchmarks search() on one family and returns a dict of summary metrics
+    """
+    instances = make_instances(family, n_cases, seed)
+    for capacities, goal in instances[:warmup]:
+        search(capacities, goal, engine=engine)
+
+    times, costs, expanded = [], [], []
+    for capacities, goal in instances:
+        runs = [run_instance(capacities, goal, engine) for _ in range(repeats)]
+        cost, _, nodes = runs[0]
+        times.append(min(seconds for _, seconds, _ in runs))
+        costs.append(cost)
+        expanded.append(nodes)
+
+    peak = max(peak_memory(capacities, goal, engine) for capacities, goal in instances)
+    total_time = sum(times)
+    return {
+        'n_cases': n_cases,
+        'seed': seed,
+        'p50': float(np.percentile(times, 50)),
+        'p90': float(np.percentile(times, 90)),
+        'p99': float(np.percentile(times, 99)),
+        'mean': float(np.mean(times)),
+        'total': total_time,
+        'expanded': int(sum(expanded)),
+        'nodes_per_sec': sum(expanded) / total_time if total_time > 0 else 0.0,
+        'peak_kib': peak / 1024,
+        'unsolved': sum(cost == -1 for cost in costs),
+        'costs': costs,
+    }
+
+def run(families, n_cases=20, seed=0, repeats=3, warmup=2, engine='greedy'):
+    """
+    families: names from FAMILIES to run
+    n_cases: number of instances per family
+    seed: seed for the instance generator
+    repeats: timed runs per instance
+    warmup: untimed runs per family
+    engine: search() engine to benchmark
+
+    Runs every family and returns the full machine-readable result
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'engine': engine,
+        'families': {family: run_family(family, n_cases, seed, repeats, warmup, engine) for family in families},
+    }
+
+def compare(baseline, candidate, threshold=0.1):
+    """
+    baseline: a result from run()
+    candidate: a result from run()
+    threshold: relative slowdown (or memory growth) tolerated before a metric counts as a regression
+
+    Returns a list of (family, metric, baseline value, candidate value, relative change) for every
+    family. Costs that differ are always reported since they mean the answer changed, as a 'costs' row
+    holding the unsolved counts and, in place of the relative change, how many instances changed cost.
+    Raises ValueError when the results don't come from the same engine, families, seeds and case counts,
+    since their numbers would not measure the same work
+    """
+    mismatches = []
+    if baseline.get('engine', 'greedy') != candidate.get('engine', 'greedy'):
+        mismatches.append(f"engine {baseline.get('engine', 'greedy')} vs {candidate.get('engine', 'greedy')}")
+    if sorted(baseline['families']) != sorted(candidate['families']):
+        mismatches.append(f"families {sorted(baseline['families'])} vs {sorted(candidate['families'])}")
+    for family, old in baseline['families'].items():
+        new = candidate['families'].get(family)
+        for field in ('seed', 'n_cases'):
+            if new is not None and old[field] != new[field]:
+                mismatches.append(f'{family} {field} {old[field]} vs {new[field]}')
+    if mismatches:
+        raise ValueError('results are not comparable: ' + ', '.join(mismatches))
+
+    rows = []
+    for family, old in baseline['families'].items():
+        new = candidate['families'][family]
+        if old['costs'] != new['costs']:
+            changed = sum(a != b for a, b in zip(old['costs'], new['costs']))
+            rows.append((family, 'costs', old['unsolved'], new['unsolved'], changed))
+
+        # Higher is worse for every metric except throughput
+        for metric, higher_is_worse in (('p50', True), ('p90', True), ('peak_kib', True), ('nodes_per_sec', False)):
+            if old[metric] == 0:
+                continue
+            change = (new[metric] - old[metric]) / old[metric]
+            if (change if higher_is_worse else -change) > threshold:
+                rows.append((family, metric, old[metric], new[metric], change))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seeded benchmark suite for the water jug search')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmark and write JSON results')
+    run_parser.add_argument('-f', '--family', action='append', choices=sorted(FAMILIES), help='family to run (default: all)')
+    run_parser.add_argument('-n', '--cases', type=int, default=20, help='instances per family')
+    run_parser.add_argument('-s', '--seed', type=int, default=0, help='instance generator seed')
+    run_parser.add_argument('-r', '--repeats', type=int, default=3, help='timed runs per instance')
+    run_parser.add_argument('--warmup', type=int, default=2, help='untimed runs per family')
+    run_parser.add_argument('-e', '--engine', default='greedy', choices=sorted(ENGINES), help='search() engine to benchmark')
+    run_parser.add_argument('-o', '--output', default='-', help='where to write the JSON results (default stdout)')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        result = run(args.family or list(FAMILIES), args.cases, args.seed, args.repeats, args.warmup, args.engine)
+        for family, metrics in result['families'].items():
+            print(f"{family:>12} | p50 {metrics['p50']:.5f}s | p90 {metrics['p90']:.5f}s | p99 {metrics['p99']:.5f}s | "
+                  f"{metrics['nodes_per_sec']:10.0f} nodes/s | peak {metrics['peak_kib']:9.1f} KiB", file=sys.stderr)
+
+        text = json.dumps(result, indent=2)
+        if args.output == '-':
+            print(text)
+        else:
+            with open(args.output, 'w') as f:
+                f.write(text)
+
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+
+        try:
+            regressions = compare(baseline, candidate, args.threshold)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            sys.exit(2)
+        for family, metric, old, new, change in regressions:
+            if metric == 'costs':
+                print(f'REGRESSION {family} costs: {change} of {len(baseline["families"][family]["costs"])} changed, unsolved {old} -> {new}')
+            else:
+                print(f'REGRESSION {family} {metric}: {old:.6g} -> {new:.6g} ({change:+.1%})')
+        if not regressions:
+            print('no regressions')
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,140 @@
+import math
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+from functools import reduce
+
+import numpy as np
+
+from vectorized_search import key_layout, bfs_layers, sorted_unique
+
+def goal_distances(capacities, max_goal, chunk_size=16384):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    max_goal: the largest goal the table needs to answer
+    chunk_size: number of frontier states expanded at once by bfs_layers()
+
+    Runs one breadth first expansion and records the depth at which every first jug amount is first reached.
+    Returns an int32 array where entry g is the minimal number of steps to get g into the first jug without it
+    ever holding more than max_goal, or -1 when g can't be reached. Because plans may pass above smaller goals
+    on the way, entries are never longer than search_vectorized() for the same goal.
+    The expansion stops as soon as every multiple of the gcd up to max_goal has been reached
+    """
+    distances = np.full(max_goal + 1, -1, dtype=np.int32)
+    distances[0] = 0
+
+    # Only multiples of the gcd can ever be reached, once they all are the table is complete
+    remaining = max_goal // reduce(math.gcd, capacities[1:])
+    if remaining == 0:
+        return distances
+
+    _, weights = key_layout(capacities, max_goal)
+    for depth, keys in bfs_layers(capacities, max_goal, chunk_size):
+        amounts = sorted_unique(keys // weights[0])
+        amounts = amounts[distances[amounts] < 0]
+        distances[amounts] = depth
+
+        remaining -= len(amounts)
+        if remaining == 0:
+            break
+
+    return distances
+
+class DistanceTables:
+    """
+    Answers many goals against the same capacities from one goal_distances() expansion per capacity set.
+    Tables are kept in an in-memory LRU and optionally persisted as .npy files that are memory-mapped on load,
+    so other processes pointed at the same directory reuse them
+    """
+    def __init__(self, max_goal=1000, maxsize=128, directory=None, chunk_size=16384):
+        """
+        max_goal: the largest goal that can be asked, every table covers 0..max_goal
+        maxsize: number of tables kept in memory
+        directory: optional directory for the on-disk store
+        chunk_size: number of frontier states expanded at once when building a table
+        """
+        self.max_goal = max_goal
+        self.maxsize = maxsize
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.tables = OrderedDict()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, capacities):
+        """
+        capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+
+        Every non-goal jug behaves the same way, so any ordering of them shares a table
+        """
+        return (capacities[0],) + tuple(sorted(capacities[1:]))
+
+    def path(self, key):
+        """
+        key: a table key from key()
+
+        Where the table for key lives in the on-disk store
+        """
+        return os.path.join(self.directory, '_'.join(str(c) for c in key) + f'_{self.max_goal}.npy')
+
+    def load(self, key):
+        """
+        key: a table key from key()
+
+        Memory-maps the table from the on-disk store, building and saving it first if no process has yet
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            distances = goal_distances(list(key), self.max_goal, self.chunk_size)
+
+            # Write to a temporary file and rename so readers never see a partial table
+            handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.npy')
+            with os.fdopen(handle, 'wb') as f:
+                np.save(f, distances)
+            os.replace(temporary, path)
+
+        return np.load(path, mmap_mode='r')
+
+    def table(self, capacities):
+        """
+        capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+
+        Returns the distance table for the capacities, most recently used tables are kept in memory
+        """
+        key = self.key(capacities)
+        if key in self.tables:
+            self.tables.move_to_end(key)
+            return self.tables[key]
+
+        if self.directory is None:
+            distances = goal_distances(list(key), self.max_goal, self.chunk_size)
+        else:
+            distances = self.load(key)
+
+        self.tables[key] = distances
+        if len(self.tables) > self.maxsize:
+            self.tables.popitem(last=False)
+        return distances
+
+    def lookup(self, capacities, goal):
+        """
+        capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+        goal: the desired state (aka amount of water needed in the fist jug)
+
+        Returns the number of steps to the goal, or -1 when it can't be reached
+        """
+        if goal > self.max_goal:
+            raise ValueError(f'goal {goal} is above the table bound {self.max_goal}')
+        # A negative index would silently read the distance of another goal from the end of the table
+        if goal < 0:
+            raise ValueError(f'goal {goal} is negative')
+        return int(self.table(capacities)[goal])
+
+if __name__ == '__main__':
+    # python distance_tables.py c1,c2,...,cn max_goal [directory]
+    capacities = [int(1e9)] + [int(c) for c in sys.argv[1].split(',')]
+    tables = DistanceTables(int(sys.argv[2]), directory=sys.argv[3] if len(sys.argv) > 3 else None)
+    for goal, distance in enumerate(tables.table(capacities)):
+        print(goal, distance)
@@ -0,0 +1,202 @@
+import heapq
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from water_jug_v3 import is_solvable, heuristic, generate_successors, generate_test_cases, search
+
+def place_values(capacities):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+
+    Returns the mixed-radix place value of every jug, where jug i has radix capacities[i] + 1.
+    The goal jug is the most significant digit so comparing packed states orders them exactly
+    like comparing the state lists, which keeps heap tie breaking identical to search()
+    """
+    weights = [1] * len(capacities)
+    for i in range(len(capacities) - 2, -1, -1):
+        weights[i] = weights[i + 1] * (capacities[i + 1] + 1)
+    return weights
+
+def pack_state(current_state, weights):
+    """
+    current_state: a list of the current state values
+    weights: the place values from place_values()
+
+    Packs a state into a single integer
+    """
+    return sum(amount * weight for amount, weight in zip(current_state, weights))
+
+def unpack_state(packed, weights):
+    """
+    packed: a packed state
+    weights: the place values from place_values()
+
+    Unpacks a packed state back into a list of amounts
+    """
+    current_state = []
+    for weight in weights:
+        amount, packed = divmod(packed, weight)
+        current_state.append(amount)
+    return current_state
+
+def is_packed_goal(packed, weights, goal):
+    """
+    packed: a packed state
+    weights: the place values from place_values()
+    goal: the target state amount
+
+    Returns True if the packed state is the goal state, false otherwise.
+    The goal jug is the most significant digit so no unpacking is needed
+    """
+    return packed // weights[0] == goal
+
+def generate_packed_successors(packed, capacities, weights):
+    """
+    packed: a packed state
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    weights: the place values from place_values()
+
+    Packed equivalent of generate_successors(), children are returned in the same order.
+    Every action moves water between at most two digits so each child is one or two additions away from its parent
+    """
+    current_state = unpack_state(packed, weights)
+
+    children = []
+    for i, water_amount in enumerate(current_state):
+        weight_i = weights[i]
+
+        # Fill fully from the tap if not the goal jug
+        if water_amount == 0 and i > 0:
+            children.append(packed + capacities[i] * weight_i)
+
+        # Dump the water on the ground
+        children.append(packed - water_amount * weight_i)
+
+        # Each jug can pour into any other
+        for j, other_amount in enumerate(current_state):
+            # Don't our into yourself
+            if i == j:
+                continue
+
+            # Pour what you can from one jug into another
+            delta = min(water_amount, capacities[j] - other_amount)
+            children.append(packed + delta * (weights[j] - weight_i))
+
+    return children
+
+def search_packed(capacities, goal):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+
+    search() over packed states, returns the same cost while keeping one int per state on the heap and in the closed set
+    """
+    if not is_solvable(capacities, goal):
+        return -1
+
+    weights = place_values(capacities)
+    # Anything at or above this has more than the goal in the first jug
+    overflow = (goal + 1) * weights[0]
+
+    initial_state = 0
+    frontier = [(heuristic(unpack_state(initial_state, weights), capacities, goal), 0, initial_state)]
+    closed = set()
+
+    while frontier:
+        _, current_cost, current_state = heapq.heappop(frontier)
+
+        # problem is symmetrical to this, helps discount a lot of states and speed up
+        if current_state >= overflow:
+            continue
+
+        # don't search the same state twice
+        if current_state in closed:
+            continue
+
+        # woo we found the goal!
+        if is_packed_goal(current_state, weights, goal):
+            return current_cost
+
+        while frontier:
+            _ = heapq.heappop(frontier)
+
+        # populate with child states
+        closed.add(current_state)
+        for next_state in generate_packed_successors(current_state, capacities, weights):
+            total_cost = current_cost + 1 + heuristic(unpack_state(next_state, weights), capacities, goal)
+            heapq.heappush(frontier, (total_cost, current_cost + 1, next_state))
+
+    # no goal found
+    return -1
+
+def closed_set_bytes(n_states, capacities, packed):
+    """
+    n_states: number of states to put in the set
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    packed: measure packed ints instead of tuples
+
+    Measures the memory of a closed set holding n_states distinct states of the given shape
+    """
+    weights = place_values(capacities)
+    # Keep the goal jug non-empty so packed states are as wide as they are mid-search
+    offset = weights[0] * 1000
+    tracemalloc.start()
+    closed = set()
+    for index in range(n_states):
+        state = unpack_state(offset + index, weights)
+        closed.add(pack_state(state, weights) if packed else tuple(state))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+def compare(n_cases=5, n_closed=100000, seed=0, search_max_jugs=5):
+    """
+    n_cases: number of random instances per jug count
+    n_closed: number of states used for the closed set memory comparison
+    seed: seed for the random instances
+    search_max_jugs: largest jug count to time end to end, search() can run for a very long time beyond 5 jugs
+
+    Compares tuple and packed states for every generate_test_cases size, printing throughput (successors per second),
+    end to end search time and the bytes per state of a closed set
+    """
+    np.random.seed(seed)
+    print('jugs | tuple succ/s | packed succ/s | tuple search s | packed search s | tuple B/state | packed B/state')
+    for n_states in range(1, 10):
+        cases = [generate_test_cases(n_states) for _ in range(n_cases)]
+
+        # Raw successor generation throughput from a fixed mid-search state
+        capacities = cases[0][0]
+        weights = place_values(capacities)
+        state = [capacities[0] // 2] + [c // 2 for c in capacities[1:]]
+        packed = pack_state(state, weights)
+        repeats = 2000
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            children = generate_successors(state, capacities)
+        t1 = time.perf_counter()
+        for _ in range(repeats):
+            children = generate_packed_successors(packed, capacities, weights)
+        t2 = time.perf_counter()
+        tuple_rate = repeats * len(children) / (t1 - t0)
+        packed_rate = repeats * len(children) / (t2 - t1)
+
+        # End to end search, checking both agree
+        tuple_time = packed_time = float('nan')
+        if n_states <= search_max_jugs:
+            t0 = time.perf_counter()
+            expected = [search(capacities, goal) for capacities, goal in cases]
+            t1 = time.perf_counter()
+            actual = [search_packed(capacities, goal) for capacities, goal in cases]
+            t2 = time.perf_counter()
+            assert expected == actual, 'packed search disagrees with search'
+            tuple_time, packed_time = t1 - t0, t2 - t1
+
+        tuple_bytes = closed_set_bytes(n_closed, capacities, packed=False) / n_closed
+        packed_bytes = closed_set_bytes(n_closed, capacities, packed=True) / n_closed
+        print(f'{n_states:4d} | {tuple_rate:12.0f} | {packed_rate:13.0f} | {tuple_time:14.4f} | {packed_time:15.4f} | {tuple_bytes:13.1f} | {packed_bytes:14.1f}')
+
+if __name__ == '__main__':
+    compare(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,47 @@
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from water_jug_v3 import generate_test_cases, search
+
+def measure(capacities, goal, return_path):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    return_path: run search() in path mode
+
+    Returns (peak traced bytes, seconds) for one search
+    """
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    search(capacities, goal, return_path=return_path)
+    t1 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, t1 - t0
+
+def compare(n_cases=10, seed=0, max_jugs=4):
+    """
+    n_cases: number of random instances per jug count
+    seed: seed for the random instances
+    max_jugs: largest number of non-goal jugs to try
+
+    Compares peak memory and time of search() in cost-only and path mode on random test cases
+    """
+    np.random.seed(seed)
+    print('jugs | cost-only peak KiB | path peak KiB | overhead | cost-only s | path s')
+    for n_states in range(1, max_jugs + 1):
+        cases = [generate_test_cases(n_states) for _ in range(n_cases)]
+        cost_peak = cost_time = path_peak = path_time = 0
+        for capacities, goal in cases:
+            peak, seconds = measure(capacities, goal, False)
+            cost_peak, cost_time = max(cost_peak, peak), cost_time + seconds
+            peak, seconds = measure(capacities, goal, True)
+            path_peak, path_time = max(path_peak, peak), path_time + seconds
+
+        print(f'{n_states:4d} | {cost_peak / 1024:18.1f} | {path_peak / 1024:13.1f} | {path_peak / cost_peak - 1:7.1%} | {cost_time:11.4f} | {path_time:6.4f}')
+
+if __name__ == '__main__':
+    compare(*[int(arg) for arg in sys.argv[1:]])
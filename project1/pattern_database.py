@@ -0,0 +1,172 @@
+import sys
+import time
+from itertools import combinations
+
+import numpy as np
+
+from water_jug_v3 import generate_test_cases, lower_bound_heuristic, search, SearchStats
+
+def dilate(mask, axis, width):
+    """
+    mask: a boolean array
+    axis: axis to dilate along
+    width: how far each True spreads in both directions
+
+    Returns a mask that is True wherever mask has a True within width steps along axis
+    """
+    # counts[k] is the number of Trues before position k, so a window [lo, hi] holds counts[hi + 1] - counts[lo]
+    padding = [(0, 0)] * mask.ndim
+    padding[axis] = (1, 0)
+    counts = np.pad(np.cumsum(mask, axis=axis, dtype=np.int32), padding)
+    length = mask.shape[axis]
+    index = np.arange(length)
+    upper = np.take(counts, np.minimum(index + width, length - 1) + 1, axis=axis)
+    lower = np.take(counts, np.maximum(index - width, 0), axis=axis)
+    return upper > lower
+
+def pattern_moves(shape, capacities, goal):
+    """
+    shape: shape of the abstract state space, the first jug first
+    capacities: capacities of the jugs in the abstract state, in the same order
+    goal: the desired state (aka amount of water needed in the fist jug)
+
+    Returns (states, children) pairs of flat indices, one pair for every fill, dump and pour between the jugs
+    in the pattern, so that the abstract state children[k] is one move away from states[k].
+    Moves that would leave more than the goal in the first jug are dropped, search() prunes those states
+    """
+    grid = np.indices(shape, dtype=np.int64)
+    flat = np.arange(int(np.prod(shape)), dtype=np.int64).reshape(shape)
+    moves = []
+
+    def add(valid, child):
+        moves.append((flat[valid], np.ravel_multi_index([c[valid] for c in child], shape)))
+
+    for i in range(len(shape)):
+        # Dump the water on the ground
+        child = list(grid)
+        child[i] = np.zeros_like(grid[i])
+        add(np.ones(shape, dtype=bool), child)
+
+        # Fill fully from the tap if not the goal jug, generate_successors() only fills empty jugs
+        if i > 0:
+            child = list(grid)
+            child[i] = np.full_like(grid[i], capacities[i])
+            add(grid[i] == 0, child)
+
+        # Each jug can pour into any other
+        for j in range(len(shape)):
+            if i == j:
+                continue
+            delta = np.minimum(grid[i], capacities[j] - grid[j])
+            child = list(grid)
+            child[i] = grid[i] - delta
+            child[j] = grid[j] + delta
+            add(child[0] <= goal, child)
+
+    return moves
+
+def pattern_distances(capacities, goal, pattern):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    pattern: indices of the non-goal jugs kept in the abstraction
+
+    Builds an exact distance table for an abstraction that keeps the first jug and the pattern jugs and forgets
+    every other jug. A forgotten jug could hold anything, so a move through it may change any kept jug by up to
+    the largest forgotten capacity, and moves between forgotten jugs are free self loops. Every real move is a
+    move of the abstraction, so the table never overestimates and taking the max over patterns stays admissible.
+    Returns an int16 array indexed by (first jug, *pattern jugs), -1 where the goal can't be reached
+    """
+    kept = [0] + list(pattern)
+    forgotten = [c for i, c in enumerate(capacities[1:], 1) if i not in pattern]
+    width = max(forgotten, default=0)
+    shape = (goal + 1,) + tuple(capacities[i] + 1 for i in pattern)
+    moves = pattern_moves(shape, [capacities[i] for i in kept], goal)
+
+    distances = np.full(shape, -1, dtype=np.int16)
+    frontier = np.zeros(shape, dtype=bool)
+    frontier[goal] = True
+    reached = frontier.copy()
+    depth = 0
+
+    # Breadth first backwards from every goal state, a state joins the next layer when one of its moves lands in this one
+    while frontier.any():
+        distances[frontier] = depth
+        depth += 1
+
+        parents = np.zeros(shape, dtype=bool)
+        flat_frontier = frontier.ravel()
+        flat_parents = parents.ravel()
+        for states, children in moves:
+            flat_parents[states] |= flat_frontier[children]
+        if width:
+            for axis in range(len(shape)):
+                parents |= dilate(frontier, axis, width)
+
+        frontier = parents & ~reached
+        reached |= frontier
+
+    return distances
+
+class PatternDatabase:
+    """
+    Pattern-database heuristic for one instance, callable as heuristic(current_state, capacities, goal) so it
+    can be passed to search() as heuristic_fn. Each pattern keeps the first jug plus pattern_size non-goal
+    jugs and the estimate is the largest exact abstract distance over all patterns
+    """
+    def __init__(self, capacities, goal, pattern_size=1, max_entries=2_000_000):
+        """
+        capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+        goal: the desired state (aka amount of water needed in the fist jug)
+        pattern_size: number of non-goal jugs kept per pattern
+        max_entries: patterns with a bigger table than this are skipped
+        """
+        self.goal = goal
+        self.patterns = []
+        self.tables = []
+        for pattern in combinations(range(1, len(capacities)), min(pattern_size, len(capacities) - 1)):
+            if (goal + 1) * np.prod([capacities[i] + 1 for i in pattern]) > max_entries:
+                continue
+            self.patterns.append(pattern)
+            self.tables.append(pattern_distances(capacities, goal, pattern))
+
+    def __call__(self, current_state, capacities, goal):
+        """
+        current_state: a list of the current state values
+        capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+        goal: the target state amount
+
+        Returns the largest pattern distance, inf when some pattern proves the goal unreachable
+        """
+        # search() prunes these before expanding them
+        if current_state[0] > goal:
+            return 0
+
+        estimate = 0
+        for pattern, table in zip(self.patterns, self.tables):
+            distance = table[(current_state[0],) + tuple(current_state[i] for i in pattern)]
+            if distance < 0:
+                return float('inf')
+            estimate = max(estimate, distance)
+        return int(estimate)
+
+if __name__ == '__main__':
+    # Compare expansions and time of the default heuristic against the pattern database on random test cases. Both
+    # run the optimal A* engine, the greedy one expands about as many states as the path is long whatever the heuristic
+    np.random.seed(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    for n_states in range(1, 6):
+        for _ in range(3):
+            capacities, goal = generate_test_cases(n_states, high=60)
+            default_stats, pattern_stats = SearchStats(), SearchStats()
+
+            t0 = time.perf_counter()
+            default_cost = search(capacities, goal, stats=default_stats, heuristic_fn=lower_bound_heuristic, engine='astar')
+            t1 = time.perf_counter()
+            database = PatternDatabase(capacities, goal)
+            t2 = time.perf_counter()
+            pattern_cost = search(capacities, goal, stats=pattern_stats, heuristic_fn=database, engine='astar')
+            t3 = time.perf_counter()
+            if pattern_cost != default_cost:
+                sys.exit(f'{capacities} goal {goal}: the pattern database gave cost {pattern_cost}, the default heuristic {default_cost}')
+            print(f'{n_states} jugs | heuristic {default_cost} in {t1 - t0:.4f}s, {default_stats.expanded} expanded | '
+                  f'pattern database {pattern_cost} in {t3 - t2:.4f}s (+{t2 - t1:.4f}s build), {pattern_stats.expanded} expanded')
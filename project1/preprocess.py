@@ -0,0 +1,122 @@
+import math
+import sys
+import time
+
+import numpy as np
+
+from water_jug_v3 import is_solvable, generate_test_cases, search
+from vectorized_search import key_layout, key_states, bfs_layers
+
+def delivery_costs(capacities, max_states=100_000):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    max_states: stop the expansion after this many states, every cost found so far is still achievable
+
+    Breadth first search over the non-goal jugs only (bfs_layers() with the first jug held at 0) to find, for every
+    amount a, the fewest moves that start with every non-goal jug empty, pour exactly a into the first jug and dump
+    whatever is left so every non-goal jug is empty again. Returns a float array indexed by amount, inf when unknown
+    """
+    costs = np.full(max(capacities[1:]) + 1, math.inf)
+    radices, weights = key_layout(capacities, 0)
+
+    explored = 0
+    for depth, keys in bfs_layers(capacities, 0):
+        states = key_states(keys, weights, radices)[:, 1:]
+        nonzero = states > 0
+        others = nonzero.sum(axis=1)
+        for k in range(states.shape[1]):
+            holding = nonzero[:, k]
+            # reach the state, pour jug k into the first jug, then dump every other jug that still holds water
+            np.minimum.at(costs, states[holding, k], depth + 1 + others[holding] - 1)
+
+        explored += len(keys)
+        if explored >= max_states:
+            break
+
+    return costs
+
+def step_bounds(capacities, goal, max_states=100_000):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    max_states: passed to delivery_costs()
+
+    Returns (lower, upper) bounds on the optimal number of steps, upper is inf when no plan was constructed.
+
+    The first jug only grows by pouring a non-goal jug into it, which empties that jug, so every such pour needs its
+    own earlier move that put water in the jug. At least ceil(goal / largest capacity) pours are needed, so the
+    optimum is at least twice that.
+
+    The upper bound is a shortest path over the amount in the first jug, where each step is a delivery from
+    delivery_costs() or pouring the first jug into an empty jug and dumping it (2 moves). The amount stays within
+    0..goal throughout, so the plan is also valid under search()'s pruning
+    """
+    if not is_solvable(capacities, goal):
+        return math.inf, math.inf
+    if goal == 0:
+        return 0, 0
+
+    lower = 2 * -(-goal // max(capacities[1:]))
+
+    costs = delivery_costs(capacities, max_states)
+    best = np.full(goal + 1, math.inf)
+    best[0] = 0
+    while True:
+        previous = best.copy()
+
+        # Deliveries commute, so one pass per amount that doubles the shift covers any number of repeats of it
+        for amount in np.flatnonzero(np.isfinite(costs)):
+            shift, cost = int(amount), costs[amount]
+            while shift <= goal:
+                best[shift:] = np.minimum(best[shift:], best[:goal + 1 - shift] + cost)
+                shift, cost = shift * 2, cost * 2
+
+        # Pour the first jug into an empty jug of capacity c and dump it
+        for capacity in set(capacities[1:]):
+            if capacity <= goal:
+                best[:goal + 1 - capacity] = np.minimum(best[:goal + 1 - capacity], best[capacity:] + 2)
+
+        if np.array_equal(best, previous):
+            break
+
+    return lower, float(best[goal])
+
+def solve(capacities, goal, engine='astar', stats=None, return_path=False, max_states=100_000, **kwargs):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    engine: search() engine used when the bounds don't meet
+    stats: optional SearchStats to record how much work the search did
+    return_path: also return the actions taken, see search()
+    max_states: passed to delivery_costs()
+    kwargs: passed on to search()
+
+    Answers the instance from step_bounds() alone when the lower and upper bound meet, otherwise runs search()
+    with the bounds so the optimal engines can prune everything that can't beat the upper bound.
+    A path is only known after a search, so return_path always searches
+    """
+    lower, upper = step_bounds(capacities, goal, max_states)
+    if lower == math.inf:
+        return (-1, None) if return_path else -1
+    if lower == upper and not return_path:
+        return int(lower)
+
+    return search(capacities, goal, stats=stats, return_path=return_path, engine=engine, bounds=(lower, upper), **kwargs)
+
+if __name__ == '__main__':
+    # How often the bounds settle an instance without search, and how long preprocessing takes next to A*
+    np.random.seed(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    for n_states in range(1, 5):
+        settled, total_bounds, total_search = 0, 0.0, 0.0
+        for _ in range(10):
+            capacities, goal = generate_test_cases(n_states, high=60)
+            t0 = time.perf_counter()
+            lower, upper = step_bounds(capacities, goal)
+            t1 = time.perf_counter()
+            optimal = search(capacities, goal, engine='astar')
+            t2 = time.perf_counter()
+            assert lower <= optimal <= upper, (capacities, goal, lower, optimal, upper)
+            settled += lower == upper
+            total_bounds += t1 - t0
+            total_search += t2 - t1
+        print(f'{n_states} jugs | settled without search {settled}/10 | bounds {total_bounds:.4f}s | astar {total_search:.4f}s')
@@ -0,0 +1,19 @@
+import pytest
+
+from batch_solve import parse_record
+
+@pytest.mark.parametrize('line', ['{"id": 1, "capacities": "12", "goal": 4}', '{"id": 1, "capacities": [3, true], "goal": 4}',
+                                  '{"id": 1, "capacities": [3, "5"], "goal": 4}', '{"id": 1, "capacities": [3, 5], "goal": 4.5}',
+                                  '{"id": 1, "goal": 4}'])
+def test_bad_json_record_keeps_its_id(line):
+    record = parse_record(line)
+    assert record['id'] == 1 and 'error' in record and 'capacities' not in record
+
+@pytest.mark.parametrize('line', ['{"id": 1, "capacities": [3, 5], "goal": 4}', '3,5 4'])
+def test_records(line):
+    record = parse_record(line)
+    assert record['capacities'] == [3, 5] and record['goal'] == 4
+
+@pytest.mark.parametrize('line', ['', '   ', '# a comment'])
+def test_skipped_lines(line):
+    assert parse_record(line) is None
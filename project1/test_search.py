@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from distance_tables import DistanceTables
+from pattern_database import PatternDatabase
+from preprocess import solve
+from vectorized_search import search_vectorized
+from water_jug_v3 import SearchBudget, generate_test_cases, search
+
+def instances(seed, count=12):
+    """
+    seed: seed for generate_test_cases
+
+    Returns small random instances, with a few fixed ones: unsolvable, a goal of 0 and jugs of equal capacity
+    """
+    np.random.seed(seed)
+    cases = [generate_test_cases(n_states, high=30) for n_states in (1, 2, 3) for _ in range(count // 3)]
+    return cases + [([int(1e9), 3, 5], 4), ([int(1e9), 4, 6], 5), ([int(1e9), 3, 5], 0), ([int(1e9), 4, 4, 7], 9)]
+
+@pytest.mark.parametrize('engine', ['astar', 'idastar', 'anytime'])
+@pytest.mark.parametrize('symmetry', [False, True])
+def test_optimal_engines(engine, symmetry):
+    for capacities, goal in instances(0):
+        assert search(capacities, goal, engine=engine, symmetry=symmetry) == search_vectorized(capacities, goal), (capacities, goal)
+
+def test_optimal_with_pattern_database_and_bounds():
+    for capacities, goal in instances(1):
+        expected = search_vectorized(capacities, goal)
+        assert search(capacities, goal, engine='astar', heuristic_fn=PatternDatabase(capacities, goal)) == expected, (capacities, goal)
+        assert solve(capacities, goal) == expected, (capacities, goal)
+
+def test_greedy_never_beats_optimal():
+    for capacities, goal in instances(2):
+        optimal = search_vectorized(capacities, goal)
+        cost = search(capacities, goal)
+        assert (cost == -1) == (optimal == -1) and cost >= optimal, (capacities, goal)
+
+def test_budget_result():
+    capacities, goal = [int(1e9), 3, 5], 4
+    result = search(capacities, goal, engine='astar', budget=SearchBudget(max_expansions=1_000_000))
+    assert result.complete and result.cost == result.lower_bound == 7
+    result = search(capacities, goal, engine='anytime', budget=SearchBudget(max_expansions=1))
+    assert not result.complete and result.lower_bound <= 7
+
+def test_lookup_matches_search():
+    tables = DistanceTables(40)
+    for capacities in ([int(1e9), 3, 5], [int(1e9), 4, 6], [int(1e9), 4, 4, 7]):
+        for goal in range(41):
+            distance = tables.lookup(capacities, goal)
+            optimal = search_vectorized(capacities, goal)
+            # The table lets the first jug pass above smaller goals on the way, so it can only be shorter
+            assert (distance == -1) == (optimal == -1) and distance <= optimal, (capacities, goal)
+        assert tables.lookup(capacities, 40) == search_vectorized(capacities, 40)
+
+def test_lookup_edge_cases():
+    tables = DistanceTables(10)
+    assert tables.lookup([int(1e9), 3, 5], 0) == 0
+    assert tables.lookup([int(1e9), 4, 6], 5) == -1
+    assert tables.lookup([int(1e9), 3, 5], 10) == search_vectorized([int(1e9), 3, 5], 10)
+    with pytest.raises(ValueError):
+        tables.lookup([int(1e9), 3, 5], 11)
+    with pytest.raises(ValueError):
+        tables.lookup([int(1e9), 3, 5], -1)
+
+def test_lookup_saved_tables(tmp_path):
+    saved = DistanceTables(20, directory=tmp_path)
+    first = [saved.lookup([int(1e9), 3, 5], goal) for goal in range(21)]
+    reloaded = DistanceTables(20, directory=tmp_path)
+    assert [reloaded.lookup([int(1e9), 3, 5], goal) for goal in range(21)] == first
+    assert first == [DistanceTables(20).lookup([int(1e9), 3, 5], goal) for goal in range(21)]
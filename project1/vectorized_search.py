@@ -0,0 +1,199 @@
+import sys
+import time
+
+import numpy as np
+
+from water_jug_v3 import is_solvable, symmetry_groups, generate_test_cases, search
+
+def pour_pairs(n_jugs):
+    """
+    n_jugs: number of jugs including the goal jug
+
+    Returns the (source, destination) index arrays of every pour, in the same order as generate_successors()
+    """
+    sources, destinations = [], []
+    for i in range(n_jugs):
+        for j in range(n_jugs):
+            if i != j:
+                sources.append(i)
+                destinations.append(j)
+    return np.asarray(sources), np.asarray(destinations)
+
+def expand_layer(layer, keys, capacities, weights, sources, destinations):
+    """
+    layer: (m, n) array of states
+    keys: (m,) packed keys of the states in layer
+    capacities: (n,) array of the maximum value permitted for each jug
+    weights: (n,) mixed-radix place value of every jug
+    sources: source jug of every pour from pour_pairs()
+    destinations: destination jug of every pour from pour_pairs()
+
+    Computes every fill, dump and pour of every state in the layer at once by broadcasting over
+    (state, action). Each action only moves water in one or two jugs, so children are produced
+    directly as packed keys (parent key plus the change in each jug times its place value)
+    """
+    # Fill fully from the tap if not the goal jug, only allowed when the jug is empty
+    fills = (keys[:, None] + capacities[1:] * weights[1:])[layer[:, 1:] == 0]
+
+    # Dump the water on the ground
+    dumps = keys[:, None] - layer * weights
+
+    # Pour what you can from one jug into another, for every ordered pair of jugs
+    delta = np.minimum(layer[:, sources], capacities[destinations] - layer[:, destinations])
+    pours = keys[:, None] + delta * (weights[destinations] - weights[sources])
+
+    return np.concatenate([fills, dumps.ravel(), pours.ravel()])
+
+def key_states(keys, weights, radices):
+    """
+    keys: packed keys
+    weights: (n,) mixed-radix place value of every jug
+    radices: (n,) radix of every jug
+
+    Unpacks keys back into a (k, n) array of states
+    """
+    return keys[:, None] // weights % radices
+
+def canonical_keys(keys, weights, radices, groups):
+    """
+    keys: packed keys
+    weights: (n,) mixed-radix place value of every jug
+    radices: (n,) radix of every jug
+    groups: the groups of interchangeable jugs from symmetry_groups()
+
+    Vectorized canonical_state(), sorts the amounts within every group and repacks them.
+    Jugs in a group share a radix so a sorted row is still a valid key
+    """
+    states = key_states(keys, weights, radices)
+    for group in groups:
+        states[:, group] = np.sort(states[:, group], axis=1)
+    return states @ weights
+
+def sorted_unique(keys):
+    """
+    keys: state keys
+
+    Returns the distinct keys in sorted order, a plain sort followed by dropping repeats is
+    cheaper than np.unique for the integer keys used here
+    """
+    keys = np.sort(keys)
+    if len(keys) == 0:
+        return keys
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+
+def seen(keys, visited):
+    """
+    keys: state keys to look up
+    visited: sorted keys of every visited state
+
+    Vectorized membership test with a binary search per key, unlike np.isin this never re-sorts visited
+    """
+    if len(visited) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(visited, keys), len(visited) - 1)
+    return visited[positions] == keys
+
+def key_layout(capacities, max_amount):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    max_amount: the most the first jug may hold before a state is pruned
+
+    Returns the int64 (radices, weights) used to pack states into keys, the first jug is the most significant digit
+    """
+    # The first jug never holds more than max_amount once pruned, so it only needs max_amount + 1 values
+    radices = np.asarray([max_amount + 1] + [c + 1 for c in capacities[1:]], dtype=np.int64)
+    weights = np.ones(len(capacities), dtype=np.int64)
+    for i in range(len(capacities) - 2, -1, -1):
+        weights[i] = weights[i + 1] * radices[i + 1]
+
+    # Children can briefly go past max_amount by one pour before being pruned so that headroom has to fit in 64 bits too
+    if (max_amount + 1 + max(capacities[1:])) * int(weights[0]) >= 2 ** 63:
+        raise ValueError('state space is too large to pack into 64 bit keys')
+    return radices, weights
+
+def bfs_layers(capacities, max_amount, chunk_size=16384, symmetry=False):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    max_amount: the most the first jug may hold before a state is pruned
+    chunk_size: number of frontier states expanded at once, bounds peak memory to roughly chunk_size * n^2 integers
+    symmetry: keep one canonical_keys() representative of states that only differ by swapping jugs of equal capacity
+
+    Breadth first search from the empty state holding each layer as a 2-D array. Every action of every state is
+    computed with array operations and children are deduplicated against the sorted packed keys of visited states.
+    Yields (depth, keys) for every expanded chunk, where keys are the packed children (see key_layout()) not seen in an
+    earlier layer. A child reached from two chunks of the same layer can be yielded twice
+    """
+    n = len(capacities)
+    caps = np.asarray(capacities, dtype=np.int64)
+    sources, destinations = pour_pairs(n)
+    radices, weights = key_layout(capacities, max_amount)
+    groups = symmetry_groups(capacities) if symmetry else []
+    # Every key at or above limit has more than max_amount in the first jug
+    limit = int(radices[0]) * int(weights[0])
+
+    keys = np.zeros(1, dtype=np.int64)
+    layer = key_states(keys, weights, radices)
+    visited = keys
+
+    depth = 0
+    while len(layer):
+        depth += 1
+        candidates = []
+        for start in range(0, len(layer), chunk_size):
+            children = expand_layer(layer[start:start + chunk_size], keys[start:start + chunk_size],
+                                    caps, weights, sources, destinations)
+
+            # problem is symmetrical to this, helps discount a lot of states and speed up
+            children = children[children < limit]
+            if groups:
+                children = canonical_keys(children, weights, radices, groups)
+
+            # Sorting first keeps the binary searches into visited cache friendly
+            children = sorted_unique(children)
+            children = children[~seen(children, visited)]
+            candidates.append(children)
+            yield depth, children
+
+        # Chunks can produce the same child, deduplicate once more across the whole layer
+        keys = sorted_unique(np.concatenate(candidates))
+        layer = key_states(keys, weights, radices)
+
+        # Both halves are already sorted, a stable sort merges the two runs in linear time
+        visited = np.sort(np.concatenate([visited, keys]), kind='stable')
+
+def search_vectorized(capacities, goal, chunk_size=16384, symmetry=False):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    chunk_size: number of frontier states expanded at once, bounds peak memory to roughly chunk_size * n^2 integers
+    symmetry: merge states that only differ by swapping jugs of equal capacity, the cost is unchanged
+
+    Runs bfs_layers() until a child has the goal in the first jug, so the cost returned is the optimal
+    number of steps (using the same pruning of states with more than the goal in the first jug)
+    """
+    if not is_solvable(capacities, goal):
+        return -1
+    if goal == 0:
+        return 0
+
+    _, weights = key_layout(capacities, goal)
+    for depth, keys in bfs_layers(capacities, goal, chunk_size, symmetry):
+        # woo we found the goal!
+        if np.any(keys >= goal * weights[0]):
+            return depth
+
+    # no goal found
+    return -1
+
+if __name__ == '__main__':
+    # Compare against search() on random test cases, reporting the breadth first throughput
+    np.random.seed(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    for n_states in range(1, 6):
+        for _ in range(5):
+            capacities, goal = generate_test_cases(n_states)
+            t0 = time.perf_counter()
+            optimal = search_vectorized(capacities, goal)
+            t1 = time.perf_counter()
+            greedy = search(capacities, goal)
+            t2 = time.perf_counter()
+            print(f'{n_states} jugs | optimal {optimal} in {t1 - t0:.4f}s | search() {greedy} in {t2 - t1:.4f}s')
@@ -1,5 +1,6 @@
 import math
 import heapq
+from array import array
 from functools import reduce
 import numpy as np
 import time
@@ -58,6 +59,19 @@ def heuristic(current_state, capacities, goal):
     # Using next_distance maintains admissable and consistent (I get non-optimal results otherwise)
     return (current_distance + next_distance) / goal
 
+def lower_bound_heuristic(current_state, capacities, goal):
+    """
+    current_state: a list of the current state values
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the target state amount
+
+    A heuristic that never overestimates, for the engines that promise optimal costs.
+    One move changes the first jug by at most the largest other capacity, and every state that isn't the goal is at least a step away
+    """
+    if is_goal(current_state, goal):
+        return 0
+    return max(1, -(-(goal - current_state[0]) // max(capacities[1:])))
+
 def generate_successors(current_state, capacities):
     """
     current_state: a list of the current state values
@@ -103,49 +117,619 @@ def generate_successors(current_state, capacities):
     
     return children
 
-def search(capacities, goal):
+def describe_move(current_state, move):
+    """
+    current_state: a list of the current state values
+    move: index of a child in generate_successors(current_state, capacities)
+
+    Children are always generated in the same order, so a child's index is enough to recover the action that made it.
+    Returns ('fill', i), ('dump', i) or ('pour', i, j)
+    """
+    n = len(current_state)
+    for i, water_amount in enumerate(current_state):
+        if water_amount == 0 and i > 0:
+            if move == 0:
+                return ('fill', i)
+            move -= 1
+
+        if move == 0:
+            return ('dump', i)
+        move -= 1
+
+        if move < n - 1:
+            return ('pour', i, move if move < i else move + 1)
+        move -= n - 1
+
+    raise ValueError('move is out of range for this state')
+
+def reconstruct_path(capacities, parents, moves, parent, move):
     """
     capacities: a list of the maximum value permitted for each element in the state (aka water jug)
-    goal: the desired state (aka amount of water needed in the fist jug)
+    parents: closed index of the parent of every closed state, -1 for the initial state
+    moves: move that produced every closed state from its parent
+    parent: closed index of the goal's parent
+    move: move that produced the goal from its parent
 
-    Here we run the A* Search algorithm to find the shortest path from the intial state to our goal state
-    I.e. the shortest amount of steps to fill our jug to the desired amount
+    Follows parent indices back to the initial state, then replays the moves forwards to describe them
     """
-    if not is_solvable(capacities, goal):
-        return -1
+    path_moves = []
+    while parent != -1:
+        path_moves.append(move)
+        parent, move = parents[parent], moves[parent]
+    path_moves.reverse()
+
+    current_state = [0] * len(capacities)
+    path = []
+    for move in path_moves:
+        path.append(describe_move(current_state, move))
+        current_state = list(generate_successors(current_state, capacities)[move])
+    return path
+
+def symmetry_groups(capacities):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+
+    Returns the indices of every group of two or more non-goal jugs with the same capacity.
+    Jugs in a group are interchangeable, so swapping their amounts gives an equivalent state
+    """
+    groups = {}
+    for i, capacity in enumerate(capacities[1:], 1):
+        groups.setdefault(capacity, []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+def canonical_state(current_state, groups):
+    """
+    current_state: a list of the current state values
+    groups: the groups from symmetry_groups()
+
+    Returns the state as a tuple with the amounts sorted within every group of interchangeable jugs,
+    so all permutations of an equivalent state share one canonical form
+    """
+    canonical = list(current_state)
+    for group in groups:
+        for i, amount in zip(group, sorted(current_state[i] for i in group)):
+            canonical[i] = amount
+    return tuple(canonical)
+
+class SearchStats:
+    """
+    Counters filled in by search() when an instance is passed as its stats argument.
+    Leaving stats as None skips all of the bookkeeping, so the only cost is a handful of None checks per expansion
+    """
+    def __init__(self, callback=None, every=1000, timing=False):
+        """
+        callback: optional function called with this SearchStats after every `every` expansions, for live progress
+        every: number of expansions between callback calls
+        timing: also time heuristic() and generate_successors(), this adds two perf_counter calls per call so is off by default
+        """
+        self.callback = callback
+        self.every = every
+        self.timing = timing
+
+        # nodes popped and expanded
+        self.expanded = 0
+        # children pushed onto the frontier
+        self.generated = 0
+        # popped states that were already closed
+        self.duplicates = 0
+        # popped states with more than the goal in the first jug
+        self.pruned = 0
+        # largest the frontier got
+        self.peak_frontier = 0
+        # seconds spent in heuristic() and generate_successors() when timing is on
+        self.heuristic_time = 0.0
+        self.successor_time = 0.0
+
+    def as_dict(self):
+        """
+        Returns the counters as a plain dict, e.g. for JSON output
+        """
+        return {
+            'expanded': self.expanded,
+            'generated': self.generated,
+            'duplicates': self.duplicates,
+            'pruned': self.pruned,
+            'peak_frontier': self.peak_frontier,
+            'heuristic_time': self.heuristic_time,
+            'successor_time': self.successor_time,
+        }
 
+class SearchBudget:
+    """
+    Wall-clock and expansion limits for one search() call, passed as its budget argument
+    """
+    def __init__(self, time_limit=None, max_expansions=None):
+        """
+        time_limit: seconds the search may run for, measured from when the budget is created
+        max_expansions: number of states the search may expand
+        """
+        self.deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self.max_expansions = max_expansions
+        self.expansions = 0
+
+    def spend(self):
+        """
+        Counts one expansion and returns True once either limit has been reached
+        """
+        self.expansions += 1
+        if self.max_expansions is not None and self.expansions > self.max_expansions:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+class BudgetExhausted(Exception):
+    """
+    Raised by the engines when their SearchBudget runs out, carrying what they know so far
+    """
+    def __init__(self, cost, path, lower_bound):
+        super().__init__(cost, path, lower_bound)
+        self.cost = cost
+        self.path = path
+        self.lower_bound = lower_bound
+
+class SearchResult:
+    """
+    What search() returns when it is given a budget
+    """
+    def __init__(self, cost, lower_bound, complete, path=None):
+        """
+        cost: cost of the best solution found, -1 when none was found
+        lower_bound: proven lower bound on the optimal cost, equal to cost once an optimal engine completes
+        complete: True when the search finished within its budget
+        path: the actions of the best solution when return_path was set
+        """
+        self.cost = cost
+        self.lower_bound = lower_bound
+        self.complete = complete
+        self.path = path
+
+    def as_dict(self):
+        """
+        Returns the result as a plain dict, e.g. for JSON output
+        """
+        return {'cost': self.cost, 'lower_bound': self.lower_bound, 'complete': self.complete, 'path': self.path}
+
+def timed_successors(current_state, capacities, stats):
+    """
+    current_state: a list of the current state values
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    stats: optional SearchStats
+
+    generate_successors(), timed into stats.successor_time when stats.timing is on
+    """
+    if stats is None or not stats.timing:
+        return generate_successors(current_state, capacities)
+    t0 = time.perf_counter()
+    children = generate_successors(current_state, capacities)
+    stats.successor_time += time.perf_counter() - t0
+    return children
+
+def timed_heuristic(current_state, capacities, goal, heuristic_fn, stats):
+    """
+    current_state: a list of the current state values
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the target state amount
+    heuristic_fn: the heuristic to call
+    stats: optional SearchStats
+
+    heuristic_fn(), timed into stats.heuristic_time when stats.timing is on
+    """
+    if stats is None or not stats.timing:
+        return heuristic_fn(current_state, capacities, goal)
+    t0 = time.perf_counter()
+    estimate = heuristic_fn(current_state, capacities, goal)
+    stats.heuristic_time += time.perf_counter() - t0
+    return estimate
+
+def record_expansion(stats, frontier_size):
+    """
+    stats: optional SearchStats
+    frontier_size: size of the frontier (or depth of the stack) after the expansion
+
+    Shared end of expansion bookkeeping for every engine, including the progress callback
+    """
+    if stats is None:
+        return
+    stats.expanded += 1
+    stats.peak_frontier = max(stats.peak_frontier, frontier_size)
+    if stats.callback is not None and stats.expanded % stats.every == 0:
+        stats.callback(stats)
+
+def greedy_search(capacities, goal, stats, heuristic_fn, groups, return_path, bounds=None, budget=None):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    stats: optional SearchStats
+    heuristic_fn: estimate of the remaining steps
+    groups: the groups from symmetry_groups(), empty to switch symmetry off
+    return_path: also rebuild the path
+    bounds: not used for pruning, the greedy path isn't optimal so known bounds on the optimum can't prune it
+    budget: optional SearchBudget, the only lower bound greedy can report when it runs out is bounds[0]
+
+    The original search() loop. The frontier is emptied after every pop so only the children of the latest state
+    are ever considered, which makes it a fast single path search whose cost isn't guaranteed to be optimal.
+    Returns (cost, path), path is None unless return_path
+    """
     initial_state =  [0] * len(capacities)
-    frontier = [(heuristic(initial_state, capacities, goal), 0, initial_state)]
+    frontier = [(heuristic_fn(initial_state, capacities, goal), 0, initial_state, -1, -1)]
     closed = set()
+    parents = array('q')
+    moves = array('H')
     
     while frontier:
-        _, current_cost, current_state = heapq.heappop(frontier)
-        # print(current_state)
-        # input()
+        _, current_cost, current_state, parent, move = heapq.heappop(frontier)
         
         # problem is symmetrical to this, helps discount a lot of states and speed up
         if current_state[0] > goal:
+            if stats is not None:
+                stats.pruned += 1
             continue
 
         # don't search the same state twice
-        if tuple(current_state) in closed:
+        key = canonical_state(current_state, groups) if groups else tuple(current_state)
+        if key in closed:
+            if stats is not None:
+                stats.duplicates += 1
             continue
         
         # woo we found the goal!
         if is_goal(current_state, goal):
-            return current_cost
+            return current_cost, reconstruct_path(capacities, parents, moves, parent, move) if return_path else None
+
+        if budget is not None and budget.spend():
+            raise BudgetExhausted(-1, None, bounds[0] if bounds is not None else 0)
         
         while frontier:
             _ = heapq.heappop(frontier)
 
         # populate with child states
-        closed.add(tuple(current_state))
-        for next_state in generate_successors(current_state, capacities):
-            total_cost = current_cost + 1 + heuristic(next_state, capacities, goal)
-            heapq.heappush(frontier, (total_cost, current_cost + 1 , next_state))
+        closed.add(key)
+        if return_path:
+            index = len(parents)
+            parents.append(parent)
+            moves.append(max(move, 0))
+        else:
+            index = -1
+
+        # children that are permutations of each other or of a closed state only need pushing once
+        seen = set()
+        for next_move, next_state in enumerate(timed_successors(current_state, capacities, stats)):
+            if groups:
+                next_key = canonical_state(next_state, groups)
+                if next_key in seen or next_key in closed:
+                    if stats is not None:
+                        stats.duplicates += 1
+                    continue
+                seen.add(next_key)
+
+            total_cost = current_cost + 1 + timed_heuristic(next_state, capacities, goal, heuristic_fn, stats)
+            heapq.heappush(frontier, (total_cost, current_cost + 1 , next_state, index, next_move))
+            if stats is not None:
+                stats.generated += 1
+
+        record_expansion(stats, len(frontier))
 
     # no goal found
-    return -1
+    return -1, None
+
+def astar_search(capacities, goal, stats, heuristic_fn, groups, return_path, bounds=None, budget=None):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    stats: optional SearchStats
+    heuristic_fn: estimate of the remaining steps, must never overestimate for the cost to be optimal
+    groups: the groups from symmetry_groups(), empty to switch symmetry off
+    return_path: also rebuild the path
+    bounds: optional (lower, upper) bound on the optimal cost, children whose estimate goes past upper are never pushed
+    budget: optional SearchBudget, when it runs out the estimate of the state being expanded is a proven lower bound
+
+    A* that keeps its whole frontier. Children are only pushed when they improve on the best known cost of their
+    state, so the heap holds few stale entries, and any that are left are skipped when popped.
+    Returns (cost, path), path is None unless return_path
+    """
+    initial_state =  tuple([0] * len(capacities))
+    frontier = [(heuristic_fn(initial_state, capacities, goal), 0, initial_state, -1, -1)]
+    best = {canonical_state(initial_state, groups) if groups else initial_state: 0}
+    closed = set()
+    parents = array('q')
+    moves = array('H')
+    upper = bounds[1] if bounds is not None else math.inf
+
+    while frontier:
+        estimate, current_cost, current_state, parent, move = heapq.heappop(frontier)
+
+        # a cheaper way to this state was pushed after this entry
+        key = canonical_state(current_state, groups) if groups else current_state
+        if key in closed or best[key] < current_cost:
+            if stats is not None:
+                stats.duplicates += 1
+            continue
+
+        # woo we found the goal!
+        if is_goal(current_state, goal):
+            return current_cost, reconstruct_path(capacities, parents, moves, parent, move) if return_path else None
+
+        # every state still on the frontier has an estimate at least this one's
+        if budget is not None and budget.spend():
+            raise BudgetExhausted(-1, None, max(math.ceil(estimate), bounds[0] if bounds is not None else 0))
+
+        closed.add(key)
+        if return_path:
+            index = len(parents)
+            parents.append(parent)
+            moves.append(max(move, 0))
+        else:
+            index = -1
+
+        for next_move, next_state in enumerate(timed_successors(current_state, capacities, stats)):
+            # problem is symmetrical to this, helps discount a lot of states and speed up
+            if next_state[0] > goal:
+                if stats is not None:
+                    stats.pruned += 1
+                continue
+
+            next_key = canonical_state(next_state, groups) if groups else next_state
+            next_cost = current_cost + 1
+            if next_cost >= best.get(next_key, next_cost + 1):
+                if stats is not None:
+                    stats.duplicates += 1
+                continue
+
+            total_cost = next_cost + timed_heuristic(next_state, capacities, goal, heuristic_fn, stats)
+            # can't lead to anything better than the known upper bound
+            if total_cost > upper:
+                if stats is not None:
+                    stats.pruned += 1
+                continue
+
+            best[next_key] = next_cost
+            heapq.heappush(frontier, (total_cost, next_cost, next_state, index, next_move))
+            if stats is not None:
+                stats.generated += 1
+
+        record_expansion(stats, len(frontier))
+
+    # no goal found
+    return -1, None
+
+def idastar_search(capacities, goal, stats, heuristic_fn, groups, return_path, bounds=None, budget=None, table_size=1_000_000):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    stats: optional SearchStats
+    heuristic_fn: estimate of the remaining steps, must never overestimate for the cost to be optimal
+    groups: the groups from symmetry_groups(), empty to switch symmetry off
+    return_path: also rebuild the path
+    bounds: optional (lower, upper) bound on the optimal cost, the first round starts at lower and no round goes past upper
+    budget: optional SearchBudget, when it runs out the current round's bound is a proven lower bound
+    table_size: most states remembered per round to cut off repeated visits, bounds memory when the space is larger
+
+    Iterative deepening A*, a depth first search bounded by cost plus heuristic that raises the bound to the smallest
+    value that went over it each round. Only the current path and at most table_size visited states are stored, so
+    memory is fixed no matter how large the state space is, at the price of re-expanding states every round.
+    Returns (cost, path), path is None unless return_path
+    """
+    initial_state = tuple([0] * len(capacities))
+    bound = heuristic_fn(initial_state, capacities, goal)
+    upper = math.inf
+    if bounds is not None:
+        bound, upper = max(bound, bounds[0]), bounds[1]
+
+    while True:
+        # Each stack entry is (state, cost, children left to try, move that made the state)
+        on_path = {canonical_state(initial_state, groups) if groups else initial_state}
+        # cheapest cost each state was reached at this round, a state reached again for no less was already searched
+        visited = {}
+        stack = [(initial_state, 0, None, -1)]
+        next_bound = math.inf
+
+        while stack:
+            current_state, current_cost, children, move = stack[-1]
+
+            # woo we found the goal!
+            if is_goal(current_state, goal):
+                path = None
+                if return_path:
+                    path = []
+                    for state, _, _, move in stack[1:]:
+                        path.append(describe_move(stack[len(path)][0], move))
+                return current_cost, path
+
+            # first visit, expand the state
+            if children is None:
+                if budget is not None and budget.spend():
+                    raise BudgetExhausted(-1, None, math.ceil(bound))
+                children = enumerate(timed_successors(current_state, capacities, stats))
+                stack[-1] = (current_state, current_cost, children, move)
+                record_expansion(stats, len(stack))
+
+            for next_move, next_state in children:
+                # problem is symmetrical to this, helps discount a lot of states and speed up
+                if next_state[0] > goal:
+                    if stats is not None:
+                        stats.pruned += 1
+                    continue
+
+                # cycles along the current path are always caught, other repeats only while the table has room
+                next_key = canonical_state(next_state, groups) if groups else next_state
+                if next_key in on_path or visited.get(next_key, math.inf) <= current_cost + 1:
+                    if stats is not None:
+                        stats.duplicates += 1
+                    continue
+
+                total_cost = current_cost + 1 + timed_heuristic(next_state, capacities, goal, heuristic_fn, stats)
+                if total_cost > bound:
+                    next_bound = min(next_bound, total_cost)
+                    continue
+
+                if stats is not None:
+                    stats.generated += 1
+                if next_key in visited or len(visited) < table_size:
+                    visited[next_key] = current_cost + 1
+                on_path.add(next_key)
+                stack.append((next_state, current_cost + 1, None, next_move))
+                break
+            else:
+                stack.pop()
+                on_path.discard(canonical_state(current_state, groups) if groups else current_state)
+
+        # no state went over the bound so the whole space was searched, or the rest can't beat upper
+        if next_bound == math.inf or next_bound > upper:
+            return -1, None
+        bound = next_bound
+
+def anytime_search(capacities, goal, stats, heuristic_fn, groups, return_path, bounds=None, budget=None, weight=2.0):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    stats: optional SearchStats
+    heuristic_fn: estimate of the remaining steps, must never overestimate for the final cost to be optimal
+    groups: the groups from symmetry_groups(), empty to switch symmetry off
+    return_path: also rebuild the path
+    bounds: optional (lower, upper) bound on the optimal cost, nothing estimated past upper is pushed
+    budget: optional SearchBudget, when it runs out the best solution so far is reported with a proven lower bound
+    weight: how much the heuristic is trusted over the cost so far, larger finds a first solution sooner
+
+    Anytime weighted A*. The frontier is ordered by cost + weight * heuristic so a first solution turns up quickly,
+    then the search carries on, pruning everything whose unweighted estimate can't beat the best solution so far,
+    and keeps improving it. Once the frontier is empty the best solution is optimal.
+    Returns (cost, path), path is None unless return_path
+    """
+    initial_state =  tuple([0] * len(capacities))
+    initial_estimate = heuristic_fn(initial_state, capacities, goal)
+    # entries carry the unweighted heuristic last so the proven lower bound can be read off the frontier
+    frontier = [(weight * initial_estimate, 0, initial_state, -1, -1, initial_estimate)]
+    best = {canonical_state(initial_state, groups) if groups else initial_state: 0}
+    parents = array('q')
+    moves = array('H')
+    upper = bounds[1] if bounds is not None else math.inf
+    incumbent, incumbent_path = math.inf, None
+
+    while frontier:
+        _, current_cost, current_state, parent, move, estimate = heapq.heappop(frontier)
+
+        # a cheaper way to this state was pushed after this entry
+        key = canonical_state(current_state, groups) if groups else current_state
+        if best[key] < current_cost:
+            if stats is not None:
+                stats.duplicates += 1
+            continue
+
+        # can't improve on the best solution so far
+        if current_cost + estimate >= incumbent:
+            if stats is not None:
+                stats.pruned += 1
+            continue
+
+        # woo we found a better goal! keep going to improve on it
+        if is_goal(current_state, goal):
+            incumbent = current_cost
+            if return_path:
+                incumbent_path = reconstruct_path(capacities, parents, moves, parent, move)
+            continue
+
+        if budget is not None and budget.spend():
+            lower = min([current_cost + estimate] + [entry[1] + entry[5] for entry in frontier])
+            lower = max(math.ceil(lower), bounds[0] if bounds is not None else 0)
+            raise BudgetExhausted(incumbent if incumbent < math.inf else -1, incumbent_path, min(lower, incumbent))
+
+        if return_path:
+            index = len(parents)
+            parents.append(parent)
+            moves.append(max(move, 0))
+        else:
+            index = -1
+
+        for next_move, next_state in enumerate(timed_successors(current_state, capacities, stats)):
+            # problem is symmetrical to this, helps discount a lot of states and speed up
+            if next_state[0] > goal:
+                if stats is not None:
+                    stats.pruned += 1
+                continue
+
+            next_key = canonical_state(next_state, groups) if groups else next_state
+            next_cost = current_cost + 1
+            if next_cost >= best.get(next_key, next_cost + 1):
+                if stats is not None:
+                    stats.duplicates += 1
+                continue
+
+            next_estimate = timed_heuristic(next_state, capacities, goal, heuristic_fn, stats)
+            if next_cost + next_estimate >= incumbent or next_cost + next_estimate > upper:
+                if stats is not None:
+                    stats.pruned += 1
+                continue
+
+            best[next_key] = next_cost
+            heapq.heappush(frontier, (next_cost + weight * next_estimate, next_cost, next_state, index, next_move, next_estimate))
+            if stats is not None:
+                stats.generated += 1
+
+        record_expansion(stats, len(frontier))
+
+    if incumbent == math.inf:
+        return -1, None
+    return incumbent, incumbent_path
+
+# engine name: (search function, heuristic used when none is given)
+ENGINES = {
+    'greedy': (greedy_search, heuristic),
+    'astar': (astar_search, lower_bound_heuristic),
+    'idastar': (idastar_search, lower_bound_heuristic),
+    'anytime': (anytime_search, lower_bound_heuristic),
+}
+
+def search(capacities, goal, stats=None, return_path=False, heuristic_fn=None, symmetry=False, engine='greedy', bounds=None,
+           budget=None, **engine_options):
+    """
+    capacities: a list of the maximum value permitted for each element in the state (aka water jug)
+    goal: the desired state (aka amount of water needed in the fist jug)
+    stats: optional SearchStats to record how much work the search did
+    return_path: also return the actions taken, as (cost, path) where path is a list of describe_move() actions
+    heuristic_fn: estimate of the remaining steps, called like heuristic(current_state, capacities, goal).
+        Defaults to heuristic() for greedy and lower_bound_heuristic() for the optimal engines, which need one that never overestimates
+    symmetry: treat states that only differ by swapping jugs of equal capacity as the same state
+    engine: 'greedy' (the original single path search), 'astar' (optimal, keeps every reached state in memory),
+        'idastar' (optimal, memory is bounded but states are expanded many times) or 'anytime' (weighted A* that finds
+        a solution fast and keeps improving it until it is optimal or the budget runs out)
+    bounds: optional (lower, upper) bound on the optimal cost, e.g. from preprocess.step_bounds(), used by the optimal engines to prune
+    budget: optional SearchBudget. When given, search() returns a SearchResult instead of blocking until the search is done
+    engine_options: passed to the engine, e.g. weight for anytime or table_size for idastar
+
+    Here we run the A* Search algorithm to find the shortest path from the intial state to our goal state
+    I.e. the shortest amount of steps to fill our jug to the desired amount
+
+    With return_path every closed state gets one entry in two flat arrays, the closed index of its parent (8 bytes)
+    and the index of the move that produced it (2 bytes), and frontier entries carry the same two numbers.
+    Parents are never stored as states, the path is rebuilt by replaying the moves once the goal is found
+
+    With symmetry the closed set and the children of each expansion are deduplicated on canonical_state(), which
+    shrinks the explored space by up to the factorial of each group size. The frontier still holds the real states
+    so paths replay exactly
+    """
+    if engine not in ENGINES:
+        raise ValueError(f'unknown engine {engine}, expected one of {sorted(ENGINES)}')
+
+    if not is_solvable(capacities, goal):
+        if budget is not None:
+            return SearchResult(-1, math.inf, True)
+        return (-1, None) if return_path else -1
+
+    engine_fn, default_heuristic = ENGINES[engine]
+    groups = symmetry_groups(capacities) if symmetry else []
+    try:
+        cost, path = engine_fn(capacities, goal, stats, heuristic_fn or default_heuristic, groups, return_path, bounds,
+                               budget, **engine_options)
+    except BudgetExhausted as exhausted:
+        return SearchResult(exhausted.cost, exhausted.lower_bound, False, exhausted.path)
+
+    if budget is not None:
+        # greedy can't prove its cost is optimal, only what the bounds say
+        if engine == 'greedy':
+            lower = bounds[0] if bounds is not None else 0
+        else:
+            lower = cost if cost != -1 else math.inf
+        return SearchResult(cost, lower, True, path)
+    return (cost, path) if return_path else cost
 
 def generate_test_cases(n_states, low=1, high=200):
     """
@@ -155,7 +739,7 @@ def generate_test_cases(n_states, low=1, high=200):
 
     Generates random test cases
     """
-    capacities = [int(1e9)] + np.random.random_integers(low, high, size=n_states).tolist()
+    capacities = [int(1e9)] + np.random.randint(low, high + 1, size=n_states).tolist()
     goal = np.random.randint(low, high) * reduce(math.gcd, capacities[1:])
 
     return capacities, goal
@@ -163,6 +747,8 @@ def generate_test_cases(n_states, low=1, high=200):
 if __name__ == '__main__':
     # Random test cases
     if sys.argv[1] == 'random':
+        # python water_jug_v3.py random [seed], see benchmark.py for comparable measurements
+        np.random.seed(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
         for i in range(1, 10):
             print('________________________________________________________________')
             print(f'{i} non-goal states')
@@ -171,9 +757,9 @@ if __name__ == '__main__':
                 capacities, goal_states = generate_test_cases(i)
 
                 print(goal_states, ' | ', capacities)
-                t0 = time.time()
+                t0 = time.perf_counter()
                 path = search(capacities, goal_states)
-                t1 = time.time()
+                t1 = time.perf_counter()
                 times.append(t1 - t0)
                 if path == -1:
                     print('We made an error, all generated test cases shoudl be solvable')
@@ -191,9 +777,9 @@ if __name__ == '__main__':
             capacities = [int(1e9)] + [int(i) for i in lines[0].split(',')]
             goal_states = int(lines[1])
 
-            t0 = time.time()
+            t0 = time.perf_counter()
             path = search(capacities, goal_states)
-            t1 = time.time()
+            t1 = time.perf_counter()
 
             if path == -1:
                 print('No path found')
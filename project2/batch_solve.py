@@ -0,0 +1,151 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from count_dp import BeamExhausted, dp_search
+from csp_framework import SearchStats
+from read_csp import load
+from tile_placement import build_csp
+from tiles import SHAPES
+
+# name: solver called as engine(csp, bushes, bush_targets, shape_targets), the backtracking ones also take stats
+ENGINES = {
+    'backtracking': lambda csp, bushes, bush_targets, shape_targets, stats=None: csp.backtracking_search(bushes, bush_targets, shape_targets, stats=stats),
+    'nogoods': lambda csp, bushes, bush_targets, shape_targets, stats=None: csp.backtracking_search(bushes, bush_targets, shape_targets, stats=stats,
+                                                                                                     nogoods=100_000),
+    'restarts': lambda csp, bushes, bush_targets, shape_targets, stats=None: csp.backtracking_search(bushes, bush_targets, shape_targets, stats=stats,
+                                                                                                      nogoods=100_000, restarts=50, seed=0),
+    'dp': dp_search,
+}
+
+def problem_files(patterns: List[str]) -> List[str]:
+    """
+    Expand directories and glob patterns into problem files
+
+    patterns: List[str] - directories (every .txt file in them), glob patterns or plain paths
+
+    returns: List[str] - the matching files, sorted within each pattern, without repeats
+    """
+    files: List[str] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*.txt')
+        for path in sorted(glob.glob(pattern)):
+            if path not in files:
+                files.append(path)
+    return files
+
+def check_solution(csp, solution: Optional[Dict], recorded: List[list], valid: bool) -> str:
+    """
+    Compare a solver result with the solution recorded in the problem file
+
+    csp: CSP - the problem
+    solution: Optional[Dict] - the solver's result
+    recorded: List[list] - [tile id, tile size, shape] rows from the file, tile ids count locations row by row
+    valid: bool - whether the solution meets the targets
+
+    returns: str - 'match' when the solution places the recorded shape everywhere, 'alternative' for a different valid
+        solution, 'invalid' when it misses the targets, 'missed' when nothing was found but the file records a
+        solution and 'unsolved' when neither has one
+    """
+    if solution is None:
+        return 'missed' if recorded else 'unsolved'
+    if not valid:
+        return 'invalid'
+
+    shapes = SHAPES[csp.assignment_array(solution)]
+    expected = np.full(len(shapes), -1)
+    for tile_id, _, shape in recorded:
+        expected[tile_id] = shape.value
+    return 'match' if recorded and np.array_equal(shapes, expected) else 'alternative'
+
+def solve_file(path: str, engine: str = 'backtracking', timing: Optional[bool] = None) -> Dict:
+    """
+    Worker entry point, load one problem file, solve it and check the result
+
+    path: str - the problem file
+    engine: str - a name from ENGINES
+    timing: Optional[bool] - add a backtracking engine's SearchStats to the report, True also times every
+        constraint, None leaves the stats out
+
+    returns: Dict - the report line for the file, its status is 'incomplete' when the dp beam gave up without
+        finding a solution, otherwise from check_solution
+    """
+    t0 = time.perf_counter()
+    bushes, shape_targets, size, bush_targets, recorded = load(path)
+    csp, bush_dict = build_csp(bushes, shape_targets, size, bush_targets)
+    t1 = time.perf_counter()
+    stats = SearchStats(timing=timing) if timing is not None and engine != 'dp' else None
+    incomplete = False
+    try:
+        if stats is not None:
+            solution = ENGINES[engine](csp, bush_dict, bush_targets, shape_targets, stats=stats)
+        else:
+            solution = ENGINES[engine](csp, bush_dict, bush_targets, shape_targets)
+    except BeamExhausted:
+        solution, incomplete = None, True
+    t2 = time.perf_counter()
+
+    valid = solution is not None and csp.matches_target(solution, bush_dict, bush_targets, shape_targets)
+    return {
+        'path': path,
+        'size': size,
+        'engine': engine,
+        'status': 'incomplete' if incomplete else check_solution(csp, solution, recorded, valid),
+        'load_time': t1 - t0,
+        'solve_time': t2 - t1,
+        'solution': csp.assignment_array(solution).tolist() if solution is not None else None,
+        **({'stats': stats.as_dict()} if stats is not None else {}),
+    }
+
+def solve_files(paths: List[str], workers: Optional[int] = None, engine: str = 'backtracking', ordered: bool = False,
+                timing: Optional[bool] = None) -> Iterator[Dict]:
+    """
+    Solve problem files across a process pool
+
+    paths: List[str] - the problem files
+    workers: Optional[int] - number of worker processes, defaults to the number of cpus
+    engine: str - a name from ENGINES
+    ordered: bool - yield reports in the order of paths instead of as they finish
+    timing: Optional[bool] - passed to solve_file
+
+    returns: Iterator[Dict] - one report per file, from solve_file
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(solve_file, path, engine, timing) for path in paths]
+        for future in (futures if ordered else as_completed(futures)):
+            yield future.result()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve tile placement problem files, writing a JSONL report line per file as it finishes')
+    parser.add_argument('problems', nargs='+', help='problem files, directories of .txt problems or glob patterns')
+    parser.add_argument('-o', '--output', default='-', help='where to write the JSONL report (default stdout)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: cpu count)')
+    parser.add_argument('-e', '--engine', default='backtracking', choices=sorted(ENGINES), help='solver to use')
+    parser.add_argument('--ordered', action='store_true', help='write reports in input order')
+    parser.add_argument('--stats', action='store_true', help='add search statistics to each report (not for dp)')
+    parser.add_argument('--profile', action='store_true', help='like --stats, also timing every constraint and the LCV ordering')
+    args = parser.parse_args()
+
+    paths = problem_files(args.problems)
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w')
+    counts: Dict[str, int] = {}
+    try:
+        for report in solve_files(paths, args.workers, args.engine, args.ordered,
+                                  True if args.profile else (False if args.stats else None)):
+            sink.write(json.dumps(report) + '\n')
+            sink.flush()
+            counts[report['status']] = counts.get(report['status'], 0) + 1
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+
+    print(f'{len(paths)} files | ' + ' | '.join(f'{status} {count}' for status, count in sorted(counts.items())), file=sys.stderr)
+    sys.exit(1 if counts.get('invalid') or counts.get('missed') or counts.get('incomplete') else 0)
@@ -0,0 +1,237 @@
+import argparse
+import json
+import math
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from batch_solve import ENGINES
+from count_dp import BeamExhausted
+from generate import generate
+from tile_placement import build_csp
+
+# name: (locations per side, bush density)
+FAMILIES = {
+    'small-3': (3, 0.6),
+    'small-4': (4, 0.6),
+    'medium-5': (5, 0.6),
+    'medium-6': (6, 0.6),
+    'sparse-6': (6, 0.3),
+    'large-10': (10, 0.6),
+    'large-20': (20, 0.6),
+}
+
+def measure(conn, blocks: int, seed: int, density: float, engine: str, trace: bool) -> None:
+    """
+    Child process entry point, generate one problem, solve it and send the measurements back through conn
+
+    conn: multiprocessing.connection.Connection - where to send the result dict
+    blocks: int - locations per side
+    seed: int - generator seed
+    density: float - chance that a cell holds a bush
+    engine: str - a name from batch_solve.ENGINES
+    trace: bool - measure the peak traced memory instead of the time, tracing slows the search down
+    """
+    bushes, shape_targets, bush_targets, _ = generate(blocks, seed, density)
+    csp, bush_dict = build_csp(bushes, shape_targets, 4 * blocks, bush_targets)
+
+    if trace:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        solution = ENGINES[engine](csp, bush_dict, bush_targets, shape_targets)
+    except BeamExhausted:
+        # The generator only makes solvable problems, a dp beam that found nothing counts as unsolved
+        solution = None
+    t1 = time.perf_counter()
+    peak = tracemalloc.get_traced_memory()[1] if trace else None
+    if trace:
+        tracemalloc.stop()
+
+    conn.send({
+        'time': t1 - t0,
+        # dp_search doesn't expand search nodes, every backtracking engine counts them, over all of its runs
+        'expanded': csp.expanded if engine != 'dp' else None,
+        'solved': solution is not None and csp.matches_target(solution, bush_dict, bush_targets, shape_targets),
+        'peak': peak,
+    })
+    conn.close()
+
+def run_instance(blocks: int, seed: int, density: float, engine: str, time_limit: float, trace: bool = False) -> Optional[Dict]:
+    """
+    Run measure() in its own process so a search that runs past time_limit can be killed
+
+    blocks: int - locations per side
+    seed: int - generator seed
+    density: float - chance that a cell holds a bush
+    engine: str - a name from batch_solve.ENGINES
+    time_limit: float - seconds to wait for the result
+    trace: bool - passed to measure()
+
+    returns: Optional[Dict] - the measurements, None when the time limit ran out
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=measure, args=(sender, blocks, seed, density, engine, trace))
+    process.start()
+    result = receiver.recv() if receiver.poll(time_limit) else None
+    if process.is_alive():
+        process.terminate()
+    process.join()
+    return result
+
+def run_family(family: str, engine: str = 'backtracking', n_cases: int = 5, seed: int = 0, time_limit: float = 30.0) -> Dict:
+    """
+    Benchmark one engine on one family and return a dict of summary metrics
+
+    family: str - a name from FAMILIES
+    engine: str - a name from batch_solve.ENGINES
+    n_cases: int - number of problems, seeds seed to seed + n_cases - 1
+    seed: int - seed of the first problem
+    time_limit: float - seconds allowed per problem, slower problems count as timeouts
+
+    returns: Dict - the family's metrics, times are to the first solution
+    """
+    blocks, density = FAMILIES[family]
+    times, expanded, peaks, solved, timeouts = [], [], [], [], 0
+    for case in range(seed, seed + n_cases):
+        result = run_instance(blocks, case, density, engine, time_limit)
+        if result is None:
+            timeouts += 1
+            continue
+        times.append(result['time'])
+        solved.append(result['solved'])
+        if result['expanded'] is not None:
+            expanded.append(result['expanded'])
+
+        memory = run_instance(blocks, case, density, engine, 10 * time_limit, trace=True)
+        if memory is not None:
+            peaks.append(memory['peak'])
+
+    total_time = sum(times)
+    return {
+        'n_cases': n_cases,
+        'seed': seed,
+        'timeouts': timeouts,
+        'solved': sum(solved),
+        'p50': float(np.percentile(times, 50)) if times else math.inf,
+        'p90': float(np.percentile(times, 90)) if times else math.inf,
+        'mean': float(np.mean(times)) if times else math.inf,
+        'total': total_time,
+        'expanded': int(sum(expanded)) if expanded else None,
+        'nodes_per_sec': sum(expanded) / total_time if expanded and total_time > 0 else None,
+        'peak_kib': max(peaks) / 1024 if peaks else None,
+    }
+
+def commit() -> Optional[str]:
+    """
+    returns: Optional[str] - the git commit being benchmarked, None outside a git checkout
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(families: List[str], engine: str = 'backtracking', n_cases: int = 5, seed: int = 0, time_limit: float = 30.0) -> Dict:
+    """
+    Run every family and return the full machine-readable result
+
+    families: List[str] - names from FAMILIES to run
+    engine: str - a name from batch_solve.ENGINES
+    n_cases: int - number of problems per family
+    seed: int - seed of the first problem
+    time_limit: float - seconds allowed per problem
+
+    returns: Dict - environment, commit and per family metrics
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'commit': commit(),
+        'engine': engine,
+        'time_limit': time_limit,
+        'families': {family: run_family(family, engine, n_cases, seed, time_limit) for family in families},
+    }
+
+def compare(baseline: Dict, candidate: Dict, threshold: float = 0.1) -> List[tuple]:
+    """
+    Find regressions between two results of run()
+
+    baseline: Dict - a result from run()
+    candidate: Dict - a result from run()
+    threshold: float - relative slowdown (or memory growth) tolerated before a metric counts as a regression
+
+    returns: List[tuple] - (family, metric, baseline value, candidate value, relative change) for every family both
+        results share. Fewer solved problems or more timeouts are always reported
+    """
+    rows = []
+    for family, old in baseline['families'].items():
+        new = candidate['families'].get(family)
+        if new is None:
+            continue
+
+        if new['solved'] < old['solved']:
+            rows.append((family, 'solved', old['solved'], new['solved'], math.inf))
+        if new['timeouts'] > old['timeouts']:
+            rows.append((family, 'timeouts', old['timeouts'], new['timeouts'], math.inf))
+
+        # Higher is worse for every metric except throughput
+        for metric, higher_is_worse in (('p50', True), ('p90', True), ('peak_kib', True), ('nodes_per_sec', False)):
+            if old[metric] is None or new[metric] is None or old[metric] in (0, math.inf):
+                continue
+            change = (new[metric] - old[metric]) / old[metric]
+            if (change if higher_is_worse else -change) > threshold:
+                rows.append((family, metric, old[metric], new[metric], change))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seeded scaling benchmark for the tile placement engines')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmark and write JSON results')
+    run_parser.add_argument('-f', '--family', action='append', choices=sorted(FAMILIES), help='family to run (default: all)')
+    run_parser.add_argument('-e', '--engine', default='backtracking', choices=sorted(ENGINES), help='engine to benchmark')
+    run_parser.add_argument('-n', '--cases', type=int, default=5, help='problems per family')
+    run_parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the first problem')
+    run_parser.add_argument('-t', '--time-limit', type=float, default=30.0, help='seconds allowed per problem')
+    run_parser.add_argument('-o', '--output', default='-', help='where to write the JSON results (default stdout)')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        result = run(args.family or list(FAMILIES), args.engine, args.cases, args.seed, args.time_limit)
+        for family, metrics in result['families'].items():
+            throughput = f"{metrics['nodes_per_sec']:10.0f} nodes/s" if metrics['nodes_per_sec'] is not None else f"{'-':>10} nodes/s"
+            peak = f"{metrics['peak_kib']:9.1f} KiB" if metrics['peak_kib'] is not None else f"{'-':>9} KiB"
+            print(f"{family:>10} | solved {metrics['solved']}/{metrics['n_cases']} | timeouts {metrics['timeouts']} | "
+                  f"p50 {metrics['p50']:.5f}s | p90 {metrics['p90']:.5f}s | {throughput} | peak {peak}", file=sys.stderr)
+
+        text = json.dumps(result, indent=2)
+        if args.output == '-':
+            print(text)
+        else:
+            with open(args.output, 'w') as f:
+                f.write(text)
+
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+
+        regressions = compare(baseline, candidate, args.threshold)
+        for family, metric, old, new, change in regressions:
+            print(f'REGRESSION {family} {metric}: {old:.6g} -> {new:.6g} ({change:+.1%})')
+        if not regressions:
+            print('no regressions')
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,90 @@
+from typing import Generic, TypeVar, Dict, List, Type
+
+import numpy as np
+
+from tiles import Tile
+
+V = TypeVar('V')
+
+class BushIndex(Generic[V]):
+    """
+    Per problem lookup tables of how many bushes of each color every tile hides and leaves visible at every location.
+    Built once so consistency checks, LCV ordering and target matching never touch the bush masks again
+    """
+    def __init__(self, bushes: Dict[V, np.ndarray], tiles: List[Type[Tile]]) -> None:
+        """
+        bushes: Dict[V, np.ndarray] - the initial 4x4 bushes for all grid locations
+        tiles: List[Type[Tile]] - every tile class that can be placed
+        """
+        self.locations: List[V] = list(bushes)
+        self.location_ids: Dict[V, int] = {location: i for i, location in enumerate(self.locations)}
+        self.tile_ids: Dict[Type[Tile], int] = {tile: i for i, tile in enumerate(tiles)}
+
+        # (locations, 4, 4, colors) one-hot of the bush color in every cell, colors 1 to 4
+        blocks = np.stack([np.asarray(bushes[location]) for location in self.locations])
+        colors = (blocks[..., None] == np.arange(1, 5)).astype(np.int32)
+        masks = np.stack([np.asarray(tile().mask) for tile in tiles]).astype(np.int32)
+
+        # (locations, tiles, colors) bushes hidden and left visible by every tile at every location
+        self.hidden: np.ndarray = np.einsum('lxyc,txy->ltc', colors, masks)
+        self.totals: np.ndarray = colors.sum(axis=(1, 2))
+        self.visible: np.ndarray = self.totals[:, None, :] - self.hidden
+        # (locations, tiles) visible bushes of any color, the LCV criterion
+        self.visible_total: np.ndarray = self.visible.sum(axis=2)
+
+    def tile_id(self, tile: Tile) -> int:
+        """
+        tile: Tile - a tile instance
+
+        returns: int - the position of the tile's class in the tables
+        """
+        return self.tile_ids[type(tile)]
+
+    def hidden_counts(self, location: V, tile: Tile) -> np.ndarray:
+        """
+        location: V - a grid location
+        tile: Tile - the tile placed there
+
+        returns: np.ndarray - bushes of colors 1 to 4 the tile hides
+        """
+        return self.hidden[self.location_ids[location], self.tile_ids[type(tile)]]
+
+    def visible_counts(self, location: V, tile: Tile) -> np.ndarray:
+        """
+        location: V - a grid location
+        tile: Tile - the tile placed there
+
+        returns: np.ndarray - bushes of colors 1 to 4 left visible
+        """
+        return self.visible[self.location_ids[location], self.tile_ids[type(tile)]]
+
+    def constraining(self, location: V, tile: Tile) -> int:
+        """
+        location: V - a grid location
+        tile: Tile - a possible tile
+
+        returns: int - number of bushes left visible, the proxy CSP.constraining computes from the masks
+        """
+        return int(self.visible_total[self.location_ids[location], self.tile_ids[type(tile)]])
+
+    def lcv_order(self, location: V, domain: List[Tile]) -> List[Tile]:
+        """
+        location: V - a grid location
+        domain: List[Tile] - the tiles that can be placed there
+
+        returns: List[Tile] - the domain sorted by least constraining value
+        """
+        return sorted(domain, key=lambda tile: self.constraining(location, tile))
+
+    def assignment_counts(self, assignment: Dict[V, Tile], table: np.ndarray) -> np.ndarray:
+        """
+        assignment: Dict[V, Tile] - an assignment of tiles to locations
+        table: np.ndarray - self.hidden or self.visible
+
+        returns: np.ndarray - the table summed over the assignment, one count per color
+        """
+        if not assignment:
+            return np.zeros(4, dtype=table.dtype)
+        locations = [self.location_ids[location] for location in assignment]
+        tiles = [self.tile_ids[type(tile)] for tile in assignment.values()]
+        return table[locations, tiles].sum(axis=0)
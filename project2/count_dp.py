@@ -0,0 +1,167 @@
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from csp_framework import CSP
+from tiles import Shape
+
+class BeamExhausted(Exception):
+    """
+    Raised by dp_search when no solution survived but max_states had cut some states, so one may still exist
+    """
+
+def location_deltas(csp: CSP, bushes: Dict, variable) -> np.ndarray:
+    """
+    How placing each tile of a variable's domain changes the counts the constraints look at
+
+    csp: CSP - the problem
+    bushes: Dict - the initial bushes for all grid locations
+    variable: V - a grid location
+
+    returns: np.ndarray - (tiles, 7) placed tiles per Shape followed by hidden bushes of colors 1 to 4, one row per
+        tile in csp.domains[variable]
+    """
+    deltas = np.zeros((len(csp.domains[variable]), len(Shape) + 4), dtype=np.int64)
+    for i, tile in enumerate(csp.domains[variable]):
+        deltas[i, tile.shape.value] = 1
+        if csp.bush_index is not None:
+            deltas[i, len(Shape):] = csp.bush_index.hidden_counts(variable, tile)
+        else:
+            hidden = bushes[variable] * tile.mask
+            deltas[i, len(Shape):] = [np.count_nonzero(hidden == bush) for bush in range(1, 5)]
+    return deltas
+
+def state_keys(states: np.ndarray, weights: Optional[np.ndarray]) -> np.ndarray:
+    """
+    states: np.ndarray - (states, dimensions) count vectors
+    weights: Optional[np.ndarray] - mixed radix weights, None when the packed keys wouldn't fit in an int64
+
+    returns: np.ndarray - one sortable key per state, equal exactly when the states are
+    """
+    if weights is not None:
+        return states @ weights
+    states = np.ascontiguousarray(states)
+    return states.view(np.dtype((np.void, states.dtype.itemsize * states.shape[1]))).ravel()
+
+def dp_search(csp: CSP, bushes: Dict, bush_targets: Dict[int, int], shape_targets: Dict[Shape, int], assignment: Optional[Dict] = None,
+              max_states: Optional[int] = 2000) -> Optional[Dict]:
+    """
+    Solve the tile placement problem by dynamic programming over the counts instead of backtracking
+
+    csp: CSP - the problem, only its variables, domains and bush index are used
+    bushes: Dict - the initial bushes for all grid locations
+    bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
+    shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
+    assignmet: Optional[Dict] - a partial assignment the solution has to extend, it is not modified
+    max_states: Optional[int] - most states kept per location, None keeps them all
+
+    returns: Optional[Dict] - the solution if one exists, otherwise None. When a layer had to be cut down to
+        max_states and nothing was found BeamExhausted is raised instead, so None always means there is no solution
+
+    ShapeConstraint and BushConstraint only look at how many tiles of each shape are placed and how many bushes of
+    each color are hidden, so two partial assignments with the same counts can be completed in exactly the same ways.
+    The sweep goes through the locations in order and keeps one layer of distinct count vectors per location, with a
+    back-pointer to the state and tile that first reached each one. A state is dropped when the locations after it
+    can't make up the difference to the targets, so whatever survives the last location is a solution.
+
+    Without max_states this is exact, but the number of distinct counts grows like a power of the number of locations
+    (one dimension per shape and color). A layer bigger than max_states keeps the states closest to the straight line
+    from no tiles to the targets, where every location so far did its proportional share. Those are the furthest from
+    running out of room in any dimension, and the time and memory per location stay fixed however big the landscape
+    gets. Constraints other than these two are not looked at
+    """
+    assignment = assignment or {}
+    variables: List = list(csp.variables)
+    if sum(shape_targets.values()) != len(variables):
+        return None
+
+    totals = np.zeros(4, dtype=np.int64)
+    for variable in variables:
+        totals += [np.count_nonzero(np.asarray(bushes[variable]) == bush) for bush in range(1, 5)]
+    # Colors without a target can be anything, so they are left out of the counts altogether
+    counted = np.array([True] * len(Shape) + [k in bush_targets for k in range(1, 5)])
+    target = np.array([shape_targets.get(shape, 0) for shape in Shape] + [totals[k - 1] - bush_targets.get(k, 0) for k in range(1, 5)])[counted]
+
+    steps: List[np.ndarray] = []
+    tiles: List[np.ndarray] = []
+    for variable in variables:
+        allowed = [i for i, tile in enumerate(csp.domains[variable]) if variable not in assignment or type(tile) is type(assignment[variable])]
+        if not allowed:
+            return None
+        tiles.append(np.array(allowed))
+        steps.append(location_deltas(csp, bushes, variable)[allowed][:, counted])
+
+    # The fewest and most counts the first k locations can add up to
+    low, high = np.zeros_like(target), np.zeros_like(target)
+    prefix = [(low, high)]
+    for deltas in steps:
+        low, high = low + deltas.min(axis=0), high + deltas.max(axis=0)
+        prefix.append((low, high))
+    if np.any(target < low) or np.any(target > high):
+        return None
+    share = (target - low) / np.maximum(high - low, 1)
+
+    radices = np.concatenate([[len(variables) + 1] * len(Shape), totals + 1])[counted]
+    weights = np.concatenate([[1], np.cumprod(radices[:-1])]) if np.prod(radices.astype(float)) < 2 ** 62 else None
+
+    states = np.zeros((1, len(target)), dtype=np.int64)
+    parents: List[np.ndarray] = []
+    choices: List[np.ndarray] = []
+    truncated = False
+    for i, deltas in enumerate(steps):
+        children = (states[:, None, :] + deltas[None, :, :]).reshape(-1, len(target))
+        parent = np.repeat(np.arange(len(states)), len(deltas))
+        choice = np.tile(np.arange(len(deltas)), len(states))
+
+        # Keep children the remaining locations can still take to the target
+        prefix_low, prefix_high = prefix[i + 1]
+        window_low, window_high = target - (high - prefix_high), target - (low - prefix_low)
+        keep = np.all((children >= window_low) & (children <= window_high), axis=1)
+        children, parent, choice = children[keep], parent[keep], choice[keep]
+        if len(children) == 0:
+            if truncated:
+                raise BeamExhausted(f'no solution among the {max_states} states kept per location')
+            return None
+
+        # np.unique keeps the first occurrence, the child of the earliest state through the earliest tile
+        _, first = np.unique(state_keys(children, weights), return_index=True)
+        if max_states is not None and len(first) > max_states:
+            line = prefix_low + share * (prefix_high - prefix_low)
+            distance = (((children[first] - line) / (window_high - window_low + 1)) ** 2).sum(axis=1)
+            first = first[np.argpartition(distance, max_states - 1)[:max_states]]
+            truncated = True
+        first.sort()
+
+        states = children[first]
+        parents.append(parent[first])
+        choices.append(choice[first])
+
+    # Every surviving state hits the targets exactly, walk the back-pointers of the first one
+    solution = {}
+    state = 0
+    for i in range(len(variables) - 1, -1, -1):
+        solution[variables[i]] = csp.domains[variables[i]][tiles[i][choices[i][state]]]
+        state = parents[i][state]
+    return {variable: solution[variable] for variable in variables}
+
+if __name__ == '__main__':
+    # Time the count DP against backtracking on a problem file
+    from read_csp import read
+    from tile_placement import build_csp
+
+    bushes, shape_targets, size, bush_targets, _ = read(sys.argv[1])
+    csp, bush_dict = build_csp(np.asarray(bushes), shape_targets, size, bush_targets)
+
+    t0 = time.perf_counter()
+    try:
+        solution = dp_search(csp, bush_dict, bush_targets, shape_targets)
+        outcome = f'valid {solution is not None and csp.matches_target(solution, bush_dict, bush_targets, shape_targets)}'
+    except BeamExhausted as error:
+        outcome = f'incomplete, {error}'
+    t1 = time.perf_counter()
+    print(f'dp {t1 - t0:.4f}s | {outcome}')
+    if len(sys.argv) > 2 and sys.argv[2] == '--compare':
+        solution = csp.backtracking_search(bush_dict, bush_targets, shape_targets)
+        print(f'backtracking {time.perf_counter() - t1:.4f}s | valid {solution is not None}')
@@ -1,8 +1,13 @@
-from typing import Generic, TypeVar, Dict, List, Optional
+from typing import Generic, TypeVar, Dict, List, Optional, Tuple, Union, Callable, Iterator, Hashable
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from random import Random
+from time import perf_counter
+import json
+import os
 
-from tiles import Shape
+from tiles import Shape, MASKS, SHAPES, TILE_TYPES
+from bush_index import BushIndex
 import numpy as np
 
 V = TypeVar('V')
@@ -16,18 +21,165 @@ class Constraint(Generic[V, D], ABC):
     def satisfied(self, assignment: Dict[V, D]) -> bool:
         ...
 
+    def reset(self, assignment: Dict[V, D]) -> None:
+        """
+        Rebuild any running state from scratch, called once before a search starts
+
+        assignmet: Dict[V, D] - the assignment the search starts from
+        """
+        for variable, value in assignment.items():
+            self.assign(variable, value)
+
+    def assign(self, variable: V, value: D) -> None:
+        """
+        Called by the search right after variable is assigned value, incremental constraints update their tallies here
+
+        variable: V - the variable being assigned
+        value: D - its new value
+        """
+
+    def unassign(self, variable: V, value: D) -> None:
+        """
+        Called by the search when variable is unassigned again, must exactly undo assign
+
+        variable: V - the variable being unassigned
+        value: D - the value it had
+        """
+
+    def satisfied_incrementally(self, assignment: Dict[V, D]) -> bool:
+        """
+        Same answer as satisfied for the assignment the search has built through assign and unassign.
+        Constraints with running tallies override this to check them without scanning the assignment
+
+        assignmet: Dict[V, D] - the current local assignment of V -> D
+        """
+        return self.satisfied(assignment)
+
+    def propagate(self, assignment: Dict[V, D], domains: Dict[V, List[D]]) -> Optional[List[Tuple[V, D]]]:
+        """
+        Find values of unassigned variables that can no longer be part of a solution
+
+        assignmet: Dict[V, D] - the current local assignment of V -> D
+        domains: Dict[V, List[D]] - the live domains of every variable
+
+        returns: Optional[List[Tuple[V, D]]] - (variable, value) pairs to prune, None when no solution is left at all
+        """
+        return []
+
+    def state(self) -> Optional[Hashable]:
+        """
+        A summary of the running tallies such that two assignments of the same variables with equal states allow
+        exactly the same completions. The search caches subproblems without a solution under these, None (the
+        default) means the constraint has no such summary and nothing is cached
+
+        returns: Optional[Hashable] - the summary, None when there is none
+        """
+        return None
+
+class SearchStats:
+    """
+    Counters filled in by CSP.backtracking_search when an instance is passed as its stats argument.
+    Leaving stats as None skips all of the bookkeeping, so the only cost is a few None checks per node
+    """
+    def __init__(self, callback: Optional[Callable[['SearchStats'], None]] = None, every: int = 1000, timing: bool = False) -> None:
+        """
+        callback: Optional[Callable[[SearchStats], None]] - called with these stats after every `every` nodes, for live progress
+        every: int - number of nodes between callback calls
+        timing: bool - also time every constraint call and the LCV ordering, two perf_counter calls each so off by default
+        """
+        self.callback: Optional[Callable[['SearchStats'], None]] = callback
+        self.every: int = every
+        self.timing: bool = timing
+        self.started: float = perf_counter()
+
+        # nodes expanded, values taken back after their subtree failed, and the most variables assigned at once
+        self.expanded: int = 0
+        self.backtracks: int = 0
+        self.max_depth: int = 0
+        # satisfied_incrementally calls, propagation rounds and values pruned by them
+        self.consistency_checks: int = 0
+        self.propagations: int = 0
+        self.pruned: int = 0
+        # seconds spent ordering values when timing is on
+        self.lcv_time: float = 0.0
+        # subproblems recorded as having no solution, nodes cut off because they were recorded, and restarts
+        self.nogoods: int = 0
+        self.nogood_hits: int = 0
+        self.restarts: int = 0
+        # per Constraint subclass: {'checks', 'check_time', 'propagations', 'propagate_time'}
+        self.constraints: Dict[str, Dict[str, float]] = {}
+
+    def constraint(self, constraint: 'Constraint') -> Dict[str, float]:
+        """
+        constraint: Constraint - a constraint of the search
+
+        returns: Dict[str, float] - the counters of the constraint's class, created on first use
+        """
+        name = type(constraint).__name__
+        if name not in self.constraints:
+            self.constraints[name] = {'checks': 0, 'check_time': 0.0, 'propagations': 0, 'propagate_time': 0.0}
+        return self.constraints[name]
+
+    def node(self, depth: int) -> None:
+        """
+        Count one expanded node and call the callback when it is due
+
+        depth: int - variables assigned at the node
+        """
+        self.expanded += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if self.callback is not None and self.expanded % self.every == 0:
+            self.callback(self)
+
+    def as_dict(self) -> Dict:
+        """
+        returns: Dict - the counters as plain nested dicts, e.g. for JSON output
+        """
+        elapsed = perf_counter() - self.started
+        return {
+            'elapsed': elapsed,
+            'expanded': self.expanded,
+            'nodes_per_sec': self.expanded / elapsed if elapsed > 0 else 0.0,
+            'backtracks': self.backtracks,
+            'max_depth': self.max_depth,
+            'consistency_checks': self.consistency_checks,
+            'propagations': self.propagations,
+            'pruned': self.pruned,
+            'lcv_time': self.lcv_time,
+            'nogoods': self.nogoods,
+            'nogood_hits': self.nogood_hits,
+            'restarts': self.restarts,
+            'constraints': {name: dict(counters) for name, counters in self.constraints.items()},
+        }
+
 class CSP(Generic[V, D]):
-    def __init__(self, variables: List[V], domains: Dict[V, List[D]]) -> None:
+    def __init__(self, variables: List[V], domains: Dict[V, List[D]], bush_index: Optional[BushIndex[V]] = None) -> None:
         self.variables: List[V] = variables
         self.domains: Dict[V, List[D]] = domains
         self.constraints: Dict[V, List[Constraint[V, D]]] = {}
+        # every constraint once, however many variables it covers
+        self.all_constraints: List[Constraint[V, D]] = []
+        self.bush_index: Optional[BushIndex[V]] = bush_index
+        # LCV orderings only depend on the bushes under each variable, so with an index they are sorted once up front
+        self.lcv_orders: Dict[V, List[D]] = {}
+        # Domains pruned by propagation during a search, kept in LCV order
+        self.live_domains: Dict[V, List[D]] = {}
+        self.inference: bool = False
+        # Nodes expanded by the last search
+        self.expanded: int = 0
+        # Instrumentation of the current search, see SearchStats
+        self.stats: Optional[SearchStats] = None
 
         for variable in self.variables:
             self.constraints[variable] = []
             if variable not in self.domains:
                 raise LookupError("Every variable should have a domain assigned to it")
+            if bush_index is not None:
+                self.lcv_orders[variable] = bush_index.lcv_order(variable, self.domains[variable])
     
     def add_constraint(self, constraint: Constraint[V, D]) -> None:
+        self.all_constraints.append(constraint)
         for variable in constraint.variables:
             if variable not in self.variables:
                 raise LookupError("Variable in constraint not in CSP")
@@ -39,12 +191,137 @@ class CSP(Generic[V, D]):
             if not constraint.satisfied(assignment):
                 return False
         return True
+
+    def consistent_incrementally(self, variable: V, assignment: Dict[V, D]) -> bool:
+        """
+        consistent() for the assignment being built by the search, using the constraints' running tallies
+
+        variable: V - the variable that was just assigned
+        assignmet: Dict[V, D] - the current local assignment of V -> D
+        """
+        stats = self.stats
+        for constraint in self.constraints[variable]:
+            if stats is None:
+                satisfied = constraint.satisfied_incrementally(assignment)
+            else:
+                stats.consistency_checks += 1
+                counters = stats.constraint(constraint)
+                counters['checks'] += 1
+                if stats.timing:
+                    t0 = perf_counter()
+                    satisfied = constraint.satisfied_incrementally(assignment)
+                    counters['check_time'] += perf_counter() - t0
+                else:
+                    satisfied = constraint.satisfied_incrementally(assignment)
+            if not satisfied:
+                return False
+        return True
+
+    def assign(self, variable: V, value: D, assignment: Dict[V, D], trail: List[tuple]) -> None:
+        """
+        Assign a value in place and tell every constraint on the variable
+
+        variable: V - the variable to assign
+        value: D - its value
+        assignmet: Dict[V, D] - the current local assignment, updated in place
+        trail: List[tuple] - every assignment and pruning in the order it happened, undo pops from the end
+        """
+        assignment[variable] = value
+        trail.append((variable,))
+        for constraint in self.constraints[variable]:
+            constraint.assign(variable, value)
+
+    def prune(self, variable: V, value: D, trail: List[tuple]) -> None:
+        """
+        Remove a value from a live domain, remembering where it was so undo can put it back in LCV order
+
+        variable: V - the variable whose domain shrinks
+        value: D - the value to remove
+        trail: List[tuple] - every assignment and pruning in the order it happened
+        """
+        domain = self.live_domains[variable]
+        position = domain.index(value)
+        del domain[position]
+        trail.append((variable, position, value))
+
+    def undo(self, assignment: Dict[V, D], trail: List[tuple], mark: int) -> None:
+        """
+        Undo every assignment and pruning since the trail was mark long, newest first
+
+        assignmet: Dict[V, D] - the current local assignment, updated in place
+        trail: List[tuple] - every assignment and pruning in the order it happened
+        mark: int - the length of the trail to return to
+        """
+        while len(trail) > mark:
+            entry = trail.pop()
+            if len(entry) == 3:
+                variable, position, value = entry
+                self.live_domains[variable].insert(position, value)
+                continue
+
+            variable = entry[0]
+            value = assignment.pop(variable)
+            for constraint in self.constraints[variable]:
+                constraint.unassign(variable, value)
+
+    def propagate(self, assignment: Dict[V, D], trail: List[tuple]) -> bool:
+        """
+        AC-3 style propagation over the constraints: every constraint prunes the live domains it can, and whenever one
+        prunes anything the others are queued again until nothing changes. Every pruning goes on the trail
+
+        assignmet: Dict[V, D] - the current local assignment of V -> D
+        trail: List[tuple] - every assignment and pruning in the order it happened
+
+        returns: bool - False when some constraint or domain wipes out, True otherwise
+        """
+        queue = list(self.all_constraints)
+        queued = set(map(id, queue))
+        while queue:
+            constraint = queue.pop(0)
+            queued.discard(id(constraint))
+
+            stats = self.stats
+            if stats is None:
+                removals = constraint.propagate(assignment, self.live_domains)
+            else:
+                stats.propagations += 1
+                counters = stats.constraint(constraint)
+                counters['propagations'] += 1
+                if stats.timing:
+                    t0 = perf_counter()
+                    removals = constraint.propagate(assignment, self.live_domains)
+                    counters['propagate_time'] += perf_counter() - t0
+                else:
+                    removals = constraint.propagate(assignment, self.live_domains)
+            if removals is None:
+                return False
+            if not removals:
+                continue
+
+            changed = set()
+            for variable, value in removals:
+                if value in self.live_domains[variable]:
+                    self.prune(variable, value, trail)
+                    if stats is not None:
+                        stats.pruned += 1
+                    changed.add(variable)
+                    if not self.live_domains[variable]:
+                        return False
+
+            # Revisit every other constraint on the variables that lost values
+            for variable in changed:
+                for other in self.constraints[variable]:
+                    if other is not constraint and id(other) not in queued:
+                        queue.append(other)
+                        queued.add(id(other))
+        return True
     
-    def most_constrained_variable(self, assignment: Dict[V, D]) -> V:
+    def most_constrained_variable(self, assignment: Dict[V, D], rng: Optional[Random] = None) -> V:
         """
         Calculate the most constrained variable as the one with the smallest domain
 
         assignmet: Dict[V, D] - the current local assignment of V -> D
+        rng: Optional[Random] - break ties at random instead of taking the first variable
         """
         unassigned: List[V] = []
 
@@ -54,7 +331,11 @@ class CSP(Generic[V, D]):
         
         # Attempting to use inverse constraint as a proxy for degree (makes things worse)
         # criterion = lambda variable: (len(self.domains[variable]), sum([self.constraining(bushes[variable], domain) for domain in self.domains[variable]]))
-        criterion = lambda variable: len(self.domains[variable])
+        domains = self.live_domains if self.inference else self.domains
+        criterion = lambda variable: len(domains[variable])
+        if rng is not None:
+            smallest = min(map(criterion, unassigned))
+            return rng.choice([variable for variable in unassigned if criterion(variable) == smallest])
         return min(unassigned, key=criterion)
     
     def constraining(self, bushes: List[int], domain: D,) -> int:
@@ -81,85 +362,479 @@ class CSP(Generic[V, D]):
 
         returns: List[D] - domains sorted by least constraining value
         """
+        # Live domains are kept in LCV order, copied since propagation changes them while the caller iterates
+        if self.inference:
+            return list(self.live_domains[variable])
 
         # No sorting is needed
         if len(self.domains[variable]) == 1:
             return self.domains[variable]
 
+        if self.bush_index is not None:
+            return self.lcv_orders[variable]
+
         criterion = lambda value: self.constraining(bushes[variable], value)
         return sorted(self.domains[variable], key=criterion)
 
-    def matches_target(self, assignment: Dict[V, D], bushes: Dict[V, List[int]], bush_targets: Dict[int, int], shape_targets: Dict[Shape, int]) -> bool:
+    def assignment_array(self, assignment: Union[Dict[V, D], np.ndarray]) -> np.ndarray:
+        """
+        The array form of an assignment: one int8 per variable in self.variables order, the tile's index into
+        tiles.TILE_TYPES or -1 where the variable is unassigned
+
+        assignmet: Union[Dict[V, D], np.ndarray] - an assignment of V -> D, arrays are returned as they are
+
+        returns: np.ndarray - the assignment as an int8 array
+        """
+        if isinstance(assignment, np.ndarray):
+            return assignment
+        return np.fromiter((assignment[variable].index if variable in assignment else -1 for variable in self.variables),
+                           dtype=np.int8, count=len(self.variables))
+
+    def array_assignment(self, array: np.ndarray) -> Dict[V, D]:
+        """
+        assignmet: np.ndarray - an assignment in the form assignment_array returns
+
+        returns: Dict[V, D] - the same assignment as a dict of V -> D, built from the shared tile instances
+        """
+        return {variable: TILE_TYPES[index]() for variable, index in zip(self.variables, array.tolist()) if index >= 0}
+
+    def visible_grid(self, bushes: Dict[V, List[int]], array: np.ndarray) -> np.ndarray:
+        """
+        bushes: Dict[V, List[int]] - the initial bushes for all grid locations
+        array: np.ndarray - a complete assignment in the form assignment_array returns
+
+        returns: np.ndarray - (variables, 4, 4) bushes left visible under every variable, in self.variables order
+        """
+        return np.stack([np.asarray(bushes[variable]) for variable in self.variables]) * (1 - MASKS[array])
+
+    def matches_target(self, assignment: Union[Dict[V, D], np.ndarray], bushes: Dict[V, List[int]], bush_targets: Dict[int, int], shape_targets: Dict[Shape, int]) -> bool:
         """
         Determine if an assignment is a valid solution
 
-        assignmet: Dict[V, D] - the current local assignment of V -> D
+        assignmet: Union[Dict[V, D], np.ndarray] - the current local assignment of V -> D, or its assignment_array
         bushes: Dict[V, List[int]] - the initial bushes for all grid locations
         bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
         shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
 
         returns: bool - True if solution is valid, False otherwise
         """
-        bush_counts = defaultdict(int)
-        shape_counts = defaultdict(int)
+        array = self.assignment_array(assignment)
+        if np.any(array < 0):
+            return False
 
-        for k, v in assignment.items():
-            shape_counts[v.shape] += 1
-            
-            visible = bushes[k] * (1 - v.mask)
-            for i in range(1, 5):
-                bush_counts[i] += np.count_nonzero(visible == i)
+        shape_counts = np.bincount(SHAPES[array], minlength=len(Shape))
+        if any(shape_counts[k.value] != v for k, v in shape_targets.items()) or \
+                shape_counts.sum() != sum(shape_targets.values()):
+            return False
 
-        return bush_counts == bush_targets and shape_counts == shape_targets
+        if self.bush_index is not None:
+            tile_ids = np.asarray([self.bush_index.tile_ids[tile] for tile in TILE_TYPES])
+            visible = self.bush_index.visible[np.arange(len(array)), tile_ids[array]].sum(axis=0)
+        else:
+            visible = np.bincount(self.visible_grid(bushes, array).ravel(), minlength=5)[1:]
+        return all(visible[k - 1] == v for k, v in bush_targets.items())
     
-    def display_assignment(self, size: int, bushes: Dict[V, List[int]], assignment: Dict[V, D]):
+    def display_assignment(self, size: int, bushes: Dict[V, List[int]], assignment: Union[Dict[V, D], np.ndarray]):
         """
         Display an assignment with its bush count
 
         size: int - the size of the landsacpe
         bushes: Dict[V, List[int]] - the initial bushes for all grid locations
-        assignmet: Dict[V, D] - the current local assignment of V -> D
+        assignmet: Union[Dict[V, D], np.ndarray] - a complete assignment of V -> D, or its assignment_array
         """
-        final = np.zeros((size, size), dtype=int)
-        for k, v in assignment.items():
-            final[k.row*4:(k.row+1)*4, k.column*4:(k.column+1)*4] = bushes[k] * (1 - v.mask)
-        print([np.count_nonzero(final == i) for i in range(1, 5)])
+        # Lay the (variables, 4, 4) blocks out on the grid by their row and column
+        blocks = self.visible_grid(bushes, self.assignment_array(assignment))
+        positions = np.asarray([(variable.row, variable.column) for variable in self.variables])
+        grid = np.zeros((size // 4, size // 4, 4, 4), dtype=blocks.dtype)
+        grid[positions[:, 0], positions[:, 1]] = blocks
+        final = grid.transpose(0, 2, 1, 3).reshape(size, size)
+        print(np.bincount(final.ravel(), minlength=5)[1:].tolist())
         print(final)
     
-    def backtracking_search(self, bushes: Dict[V, List[int]], bush_targets: Dict[int, int], shape_targets: Dict[Shape, int], assignment: Dict[V, D] = {}) -> Optional[Dict[V, D]]:
+    def backtracking_search(self, bushes: Dict[V, List[int]], bush_targets: Dict[int, int], shape_targets: Dict[Shape, int], assignment: Optional[Dict[V, D]] = None, inference: bool = True,
+                            stats: Optional[SearchStats] = None, nogoods: Union[int, 'NogoodCache'] = 0, restarts: int = 0, restart_base: int = 100,
+                            seed: Optional[int] = None, hint: Optional[Dict[V, D]] = None) -> Optional[Dict[V, D]]:
         """
-        Determine if an assignment is a valid solution
+        Find the first solution
 
         bushes: Dict[V, List[int]] - the initial bushes for all grid locations
         bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
         shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
-        assignmet: Dict[V, D] - the current local assignment of V -> D
+        assignmet: Optional[Dict[V, D]] - the partial assignment to start from, it is not modified
+        inference: bool - propagate the constraints after every assignment and pick variables by their live domains
+        stats: Optional[SearchStats] - filled in with what the search did, None skips the bookkeeping
+        nogoods: Union[int, NogoodCache] - size of a NogoodCache shared by every run, 0 caches nothing, or a cache
+            to share with other searches of the same problem
+        restarts: int - runs that give up after restart_base * luby(run) nodes before a last run without a limit
+        restart_base: int - nodes per unit of the restart schedule
+        seed: Optional[int] - randomize the variable and value ordering of every run with this seed, with restarts
+            and no seed the orderings are randomized anyway
+        hint: Optional[Dict[V, D]] - values to try first, e.g. an earlier solution, so the search stays close to it
 
-        returns: Optional[Dict[V, D]] - the solution if one exists, otherwise None
-        """
-        if len(assignment) == len(self.variables):
-            if self.matches_target(assignment, bushes, bush_targets, shape_targets):
-                return assignment
-            return None
-
-        # MCV
-        first: V = self.most_constrained_variable(assignment)
-
-        # LCV
-        for value in self.least_constraining_value(first, bushes):
-            local_assignment = assignment.copy()
-            local_assignment[first] = value
-            
-            # If the value is consistent add it to the local assignment and continue searching
-            if self.consistent(first, local_assignment):
-                result: Optional[Dict[V, D]] = self.backtracking_search(bushes, bush_targets, shape_targets, local_assignment)
-
-                # If we found a solution return it
-                if result is not None:
-                    return result
-            
-            # There was an issue with the value
-            # local assignment loses scope (and so reverts to previous state) and we continue searching
-        
-        # No solution found
-        return None
\ No newline at end of file
+        returns: Optional[Dict[V, D]] - the solution if one exists, otherwise None, self.expanded counts the nodes of
+            every run
+        """
+        if isinstance(nogoods, NogoodCache):
+            cache = nogoods
+        else:
+            cache = NogoodCache(nogoods) if nogoods > 0 else None
+        rng = Random(seed) if seed is not None or restarts > 0 else None
+        # prepare() resets self.expanded at the start of every run
+        expanded = 0
+        for run in range(1, restarts + 2):
+            # Nogoods don't depend on the ordering, so later runs skip whatever earlier runs proved has no solution
+            limit = restart_base * luby(run) if run <= restarts else None
+            stream = SolutionStream(self, bushes, bush_targets, shape_targets, assignment, inference, stats,
+                                    nogoods=cache, rng=rng, node_limit=limit, hint=hint)
+            solution = next(iter(stream), None)
+            expanded += self.expanded
+            if solution is not None or not stream.cut_off:
+                self.expanded = expanded
+                return solution
+            if stats is not None:
+                stats.restarts += 1
+        self.expanded = expanded
+        return None
+
+    def solutions(self, bushes: Dict[V, List[int]], bush_targets: Dict[int, int], shape_targets: Dict[Shape, int], assignment: Optional[Dict[V, D]] = None, inference: bool = True,
+                  stats: Optional[SearchStats] = None, checkpoint: Optional[Dict] = None) -> 'SolutionStream[V, D]':
+        """
+        Every solution, one at a time, see SolutionStream
+
+        bushes: Dict[V, List[int]] - the initial bushes for all grid locations
+        bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
+        shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
+        assignmet: Optional[Dict[V, D]] - the partial assignment to start from, it is not modified
+        inference: bool - propagate the constraints after every assignment and pick variables by their live domains
+        stats: Optional[SearchStats] - filled in with what the search did, None skips the bookkeeping
+        checkpoint: Optional[Dict] - from SolutionStream.checkpoint() or load_checkpoint(), continues that search instead
+
+        returns: SolutionStream[V, D] - iterate it for the solutions
+        """
+        return SolutionStream(self, bushes, bush_targets, shape_targets, assignment, inference, stats, checkpoint)
+
+    def nogood_key(self, assigned: int) -> Optional[tuple]:
+        """
+        The key a subproblem is cached under in a NogoodCache: which variables are assigned and every constraint's state
+
+        assigned: int - bit i set when self.variables[i] is assigned
+
+        returns: Optional[tuple] - the key, None when some constraint has no state
+        """
+        states = []
+        for constraint in self.all_constraints:
+            state = constraint.state()
+            if state is None:
+                return None
+            states.append(state)
+        return (assigned, tuple(states))
+
+    def prepare(self, bushes: Dict[V, List[int]], assignment: Dict[V, D], inference: bool = True, stats: Optional[SearchStats] = None) -> Optional[List[tuple]]:
+        """
+        Reset the constraint tallies and live domains for a search that starts from the given partial assignment
+
+        bushes: Dict[V, List[int]] - the initial bushes for all grid locations
+        assignmet: Dict[V, D] - the partial assignment the search starts from
+        inference: bool - propagate the constraints after every assignment and pick variables by their live domains
+        stats: Optional[SearchStats] - instrumentation for the search, None skips the bookkeeping
+
+        returns: Optional[List[tuple]] - the trail to search with, None when propagation already rules the assignment out
+        """
+        for constraint in self.all_constraints:
+            constraint.reset(assignment)
+
+        self.expanded = 0
+        self.stats = stats
+        self.inference = False
+        trail: List[tuple] = []
+        if inference:
+            self.live_domains = {variable: list(self.least_constraining_value(variable, bushes)) for variable in self.variables}
+            self.inference = True
+            if not self.propagate(assignment, trail):
+                return None
+        return trail
+
+def luby(i: int) -> int:
+    """
+    The Luby restart sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ..., within a constant factor of the best
+    fixed restart schedule whatever the runtime distribution
+
+    i: int - position in the sequence, from 1
+
+    returns: int - the i-th term
+    """
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+class NogoodCache:
+    """
+    Subproblems known to have no solution, keyed by CSP.nogood_key. With counting constraints the same remaining
+    budgets come up again and again in sibling branches that merely placed tiles in a different order, a cached key
+    cuts those off right after propagation. Holds at most max_size keys, dropping the least recently used first
+    """
+    def __init__(self, max_size: int = 100_000) -> None:
+        """
+        max_size: int - keys to keep before evicting
+        """
+        self.max_size: int = max_size
+        self.keys: OrderedDict = OrderedDict()
+        self.evictions: int = 0
+
+    def __contains__(self, key: tuple) -> bool:
+        if key in self.keys:
+            self.keys.move_to_end(key)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: tuple) -> None:
+        """
+        key: tuple - a CSP.nogood_key whose subproblem has no solution
+        """
+        self.keys[key] = None
+        self.keys.move_to_end(key)
+        if len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+            self.evictions += 1
+
+class SolutionStream(Generic[V, D]):
+    """
+    Backtracking search with an explicit stack instead of recursion, so the depth is only limited by memory and the
+    search can stop after any solution and carry on later. Iterating yields every solution in the order the
+    recursive search would have found them.
+
+    The stack holds one frame per assigned variable: the variable, its values in the order they are tried, and how
+    many have been tried. Between solutions that is the whole state of the search, the constraint tallies and live
+    domains follow from replaying the frames, so checkpoint() is a small JSON-able dict. Only one stream per CSP can
+    run at a time since they share the constraints' tallies
+    """
+    def __init__(self, csp: CSP[V, D], bushes: Dict[V, List[int]], bush_targets: Dict[int, int], shape_targets: Dict[Shape, int], assignment: Optional[Dict[V, D]] = None,
+                 inference: bool = True, stats: Optional[SearchStats] = None, checkpoint: Optional[Dict] = None,
+                 checkpoint_path: Optional[str] = None, checkpoint_every: int = 100_000, nogoods: Optional[NogoodCache] = None,
+                 rng: Optional[Random] = None, node_limit: Optional[int] = None, hint: Optional[Dict[V, D]] = None) -> None:
+        """
+        csp: CSP[V, D] - the problem
+        bushes: Dict[V, List[int]] - the initial bushes for all grid locations
+        bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
+        shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
+        assignmet: Optional[Dict[V, D]] - the partial assignment to start from, it is not modified
+        inference: bool - propagate the constraints after every assignment and pick variables by their live domains
+        stats: Optional[SearchStats] - filled in with what the search did, None skips the bookkeeping
+        checkpoint: Optional[Dict] - a checkpoint() of an earlier stream on the same problem to continue from, its
+            assignment and inference replace the ones given here
+        checkpoint_path: Optional[str] - save a checkpoint here every checkpoint_every nodes and after every solution
+        checkpoint_every: int - nodes between automatic checkpoints
+        nogoods: Optional[NogoodCache] - skip the subproblems in it and add the ones found to have no solution
+        rng: Optional[Random] - break MCV ties at random and shuffle values within about one place of their LCV order
+        node_limit: Optional[int] - stop after expanding this many nodes, setting cut_off
+        hint: Optional[Dict[V, D]] - a value per variable to try before the others
+        """
+        self.csp: CSP[V, D] = csp
+        self.bushes: Dict[V, List[int]] = bushes
+        self.bush_targets: Dict[int, int] = bush_targets
+        self.shape_targets: Dict[Shape, int] = shape_targets
+        self.stats: Optional[SearchStats] = stats
+        self.checkpoint_path: Optional[str] = checkpoint_path
+        self.checkpoint_every: int = checkpoint_every
+        self.nogoods: Optional[NogoodCache] = nogoods
+        self.rng: Optional[Random] = rng
+        self.node_limit: Optional[int] = node_limit
+        self.hint: Dict[V, D] = hint or {}
+        # Whether the search stopped at node_limit rather than running out of solutions
+        self.cut_off: bool = False
+
+        variable_ids = {variable: i for i, variable in enumerate(csp.variables)}
+        if checkpoint is not None:
+            if checkpoint['variables'] != len(csp.variables):
+                raise ValueError("Checkpoint is for a different problem")
+            self.initial: Dict[V, D] = {csp.variables[i]: csp.domains[csp.variables[i]][j] for i, j in checkpoint['assignment']}
+            self.inference: bool = checkpoint['inference']
+            self.found: int = checkpoint['found']
+            self.done: bool = checkpoint['done']
+            # [variable, values in the order they are tried, number tried so far, nogood key, solutions found before it]
+            self.frames: List[list] = [[csp.variables[i], [csp.domains[csp.variables[i]][j] for j in values], tried, None, self.found]
+                                       for i, values, tried in checkpoint['frames']]
+        else:
+            self.initial = dict(assignment) if assignment is not None else {}
+            self.inference = inference
+            self.found = 0
+            self.done = False
+            self.frames = []
+        self.variable_ids: Dict[V, int] = variable_ids
+        self.started: bool = False
+
+    def checkpoint(self) -> Dict:
+        """
+        The state of the search between solutions, as plain ints and lists. Variables and values are stored by
+        their position in csp.variables and csp.domains
+
+        returns: Dict - pass it back as SolutionStream(checkpoint=...) or CSP.solutions(checkpoint=...)
+        """
+        def value_id(variable: V, value: D) -> int:
+            return self.csp.domains[variable].index(value)
+
+        return {
+            'variables': len(self.csp.variables),
+            'assignment': [[self.variable_ids[variable], value_id(variable, value)] for variable, value in self.initial.items()],
+            'inference': self.inference,
+            'found': self.found,
+            'done': self.done,
+            'frames': [[self.variable_ids[variable], [value_id(variable, value) for value in values], tried] for variable, values, tried, *_ in self.frames],
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Write checkpoint() to a JSON file, through a temporary file so a crash never leaves half a checkpoint
+
+        path: str - where to write the checkpoint
+        """
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.checkpoint(), f)
+        os.replace(path + '.tmp', path)
+
+    def __iter__(self) -> Iterator[Dict[V, D]]:
+        for assignment in self.search():
+            yield dict(assignment)
+
+    def count(self) -> int:
+        """
+        Run the search to the end without building the solutions
+
+        returns: int - the number of solutions, including the ones found before a checkpoint this stream resumed
+        """
+        for _ in self.search():
+            pass
+        return self.found
+
+    def search(self) -> Iterator[Dict[V, D]]:
+        """
+        The search itself, yields the live assignment at every solution. It is changed as soon as the search continues,
+        so copy it to keep it
+        """
+        if self.started:
+            raise RuntimeError("A SolutionStream can only be iterated once")
+        self.started = True
+        if self.done:
+            return
+
+        csp = self.csp
+        stats = self.stats
+        assignment = dict(self.initial)
+        trail = csp.prepare(self.bushes, assignment, self.inference, stats)
+        if trail is None:
+            self.done = True
+            return
+
+        # Bit i of assigned[-1] is set when csp.variables[i] is assigned, one entry per frame on top of the start
+        assigned: List[int] = [sum(1 << self.variable_ids[variable] for variable in assignment)]
+        nogoods = self.nogoods if self.nogoods is not None and csp.nogood_key(assigned[0]) is not None else None
+        rng = self.rng
+        nodes = 0
+
+        # Replay every frame's current value except the newest, which is taken back first thing anyway
+        marks: List[int] = []
+        for depth, (variable, values, tried, *_) in enumerate(self.frames):
+            marks.append(len(trail))
+            assigned.append(assigned[-1] | 1 << self.variable_ids[variable])
+            if depth < len(self.frames) - 1:
+                csp.assign(variable, values[tried - 1], assignment, trail)
+                if not (csp.consistent_incrementally(variable, assignment) and (not csp.inference or csp.propagate(assignment, trail))):
+                    raise ValueError("Checkpoint does not match the problem")
+
+        # A fresh search starts by expanding the root, a resumed one by moving on from the newest frame's value
+        expand = not self.frames
+        since_checkpoint = 0
+        while True:
+            if expand and len(assignment) == len(csp.variables):
+                if csp.matches_target(assignment, self.bushes, self.bush_targets, self.shape_targets):
+                    self.found += 1
+                    if self.checkpoint_path is not None:
+                        self.save(self.checkpoint_path)
+                    yield assignment
+            elif expand:
+                key = csp.nogood_key(assigned[-1]) if nogoods is not None else None
+                if key is not None and key in nogoods:
+                    if stats is not None:
+                        stats.nogood_hits += 1
+                elif self.node_limit is not None and nodes >= self.node_limit:
+                    self.cut_off = True
+                    return
+                else:
+                    nodes += 1
+                    csp.expanded += 1
+                    if stats is not None:
+                        stats.node(len(assignment))
+
+                    # MCV
+                    first: V = csp.most_constrained_variable(assignment, rng)
+
+                    # LCV, copied since the live domain changes while the frame works through it
+                    if stats is not None and stats.timing:
+                        t0 = perf_counter()
+                        values = list(csp.least_constraining_value(first, self.bushes))
+                        stats.lcv_time += perf_counter() - t0
+                    else:
+                        values = list(csp.least_constraining_value(first, self.bushes))
+                    if rng is not None:
+                        jitter = [i + 2 * rng.random() for i in range(len(values))]
+                        values = [value for _, value in sorted(zip(jitter, values), key=lambda pair: pair[0])]
+                    if first in self.hint and self.hint[first] in values:
+                        values.remove(self.hint[first])
+                        values.insert(0, self.hint[first])
+                    self.frames.append([first, values, 0, key, self.found])
+                    marks.append(len(trail))
+                    assigned.append(assigned[-1] | 1 << self.variable_ids[first])
+
+                    since_checkpoint += 1
+                    if self.checkpoint_path is not None and since_checkpoint >= self.checkpoint_every:
+                        # The frame was pushed but nothing tried yet, which is a state checkpoint() can describe
+                        self.save(self.checkpoint_path)
+                        since_checkpoint = 0
+
+            if not self.frames:
+                break
+
+            # Take the newest frame's value back and try its next one, or drop the frame when it has none left
+            frame = self.frames[-1]
+            if len(trail) > marks[-1]:
+                csp.undo(assignment, trail, marks[-1])
+                if stats is not None:
+                    stats.backtracks += 1
+            variable, values, tried, key, found = frame
+            if tried == len(values):
+                # Every value failed without a solution, so the subproblem is one
+                if key is not None and found == self.found:
+                    nogoods.add(key)
+                    if stats is not None:
+                        stats.nogoods += 1
+                self.frames.pop()
+                marks.pop()
+                assigned.pop()
+                expand = False
+                continue
+
+            frame[2] += 1
+            csp.assign(variable, values[tried], assignment, trail)
+            expand = csp.consistent_incrementally(variable, assignment) and (not csp.inference or csp.propagate(assignment, trail))
+
+        self.done = True
+        if self.checkpoint_path is not None:
+            self.save(self.checkpoint_path)
+
+def load_checkpoint(path: str) -> Dict:
+    """
+    path: str - a file written by SolutionStream.save
+
+    returns: Dict - the checkpoint, for CSP.solutions(checkpoint=...)
+    """
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,91 @@
+import argparse
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tiles import Shape, MASKS, SHAPES, TILE_TYPES
+
+# Chance of each shape in the planted solution, EL_SHAPE is split evenly over its four orientations
+DEFAULT_MIX = {Shape.FULL_BLOCK: 0.2, Shape.OUTER_BOUNDARY: 0.3, Shape.EL_SHAPE: 0.5}
+
+def generate(blocks: int, seed: int, density: float = 0.6, shape_mix: Optional[Dict[Shape, float]] = None) -> Tuple[np.ndarray, Dict[Shape, int], Dict[int, int], np.ndarray]:
+    """
+    Generate a solvable problem by planting a random solution and reading the targets off it
+
+    blocks: int - locations per side, the landscape is 4 * blocks wide
+    seed: int - seed for a private RandomState, the same arguments always give the same problem
+    density: float - chance that a cell holds a bush, colors 1 to 4 are equally likely
+    shape_mix: Optional[Dict[Shape, float]] - relative chance of each shape in the planted solution, defaults to DEFAULT_MIX
+
+    returns: Tuple[np.ndarray, Dict[Shape, int], Dict[int, int], np.ndarray] - the int8 landscape, the tiles to place
+        per shape, the visible bushes per color and the planted solution as an array of TILE_TYPES indices
+    """
+    rng = np.random.RandomState(seed)
+    size = 4 * blocks
+    bushes = np.where(rng.rand(size, size) < density, rng.randint(1, 5, (size, size)), 0).astype(np.int8)
+
+    mix = shape_mix or DEFAULT_MIX
+    weights = np.array([mix.get(tile.shape, 0) / np.count_nonzero(SHAPES == tile.shape.value) for tile in TILE_TYPES])
+    solution = rng.choice(len(TILE_TYPES), blocks * blocks, p=weights / weights.sum()).astype(np.int8)
+
+    # Cover the landscape with the planted tiles, row by row like build_csp lays out the locations
+    masks = MASKS[solution].reshape(blocks, blocks, 4, 4).transpose(0, 2, 1, 3).reshape(size, size)
+    visible = bushes * (1 - masks)
+
+    shape_counts = np.bincount(SHAPES[solution], minlength=len(Shape))
+    shape_targets = {shape: int(shape_counts[shape.value]) for shape in Shape}
+    bush_counts = np.bincount(visible.ravel(), minlength=5)
+    bush_targets = {color: int(bush_counts[color]) for color in range(1, 5)}
+    return bushes, shape_targets, bush_targets, solution
+
+def format_problem(bushes: np.ndarray, shape_targets: Dict[Shape, int], bush_targets: Dict[int, int], solution: Optional[np.ndarray] = None) -> str:
+    """
+    Write a problem in the file format read_csp.load parses
+
+    bushes: np.ndarray - the size x size landscape, 0 where there is no bush
+    shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
+    bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
+    solution: Optional[np.ndarray] - a solution as an array of TILE_TYPES indices, left out when None
+
+    returns: str - the problem file's contents
+    """
+    lines: List[str] = ['# Landscape', '']
+    for row in bushes:
+        lines.append(''.join((str(cell) if cell else ' ') + ' ' for cell in row))
+    lines += ['', '# Tiles: ', '{' + ', '.join(f'{shape.name}={shape_targets.get(shape, 0)}' for shape in (Shape.EL_SHAPE, Shape.OUTER_BOUNDARY, Shape.FULL_BLOCK)) + '}']
+    lines += ['', '# Targets: '] + [f'{color}:{bush_targets[color]}' for color in range(1, 5)]
+    lines += ['', '', '# Tiles solution', '# This is just for your reference', '']
+    if solution is not None:
+        lines += [f'{tile_id} 4 {TILE_TYPES[index].shape.name}' for tile_id, index in enumerate(solution.tolist())]
+    return '\n'.join(lines) + '\n'
+
+def write_problem(path: str, blocks: int, seed: int, density: float = 0.6, shape_mix: Optional[Dict[Shape, float]] = None) -> None:
+    """
+    Generate a problem and write it to a file
+
+    path: str - where to write the problem
+    blocks: int - locations per side
+    seed: int - generator seed
+    density: float - chance that a cell holds a bush
+    shape_mix: Optional[Dict[Shape, float]] - relative chance of each shape in the planted solution
+    """
+    with open(path, 'w') as f:
+        f.write(format_problem(*generate(blocks, seed, density, shape_mix)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate solvable tile placement problems with a planted solution')
+    parser.add_argument('output', help='directory to write the problems to')
+    parser.add_argument('-b', '--blocks', type=int, nargs='+', default=[5], help='locations per side, one set of problems per value')
+    parser.add_argument('-n', '--count', type=int, default=5, help='problems per size')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the first problem, the rest count up from it')
+    parser.add_argument('-d', '--density', type=float, default=0.6, help='chance that a cell holds a bush')
+    parser.add_argument('--mix', type=float, nargs=3, metavar=('FULL', 'OUTER', 'EL'), default=None, help='relative chance of each shape')
+    args = parser.parse_args()
+
+    mix = dict(zip((Shape.FULL_BLOCK, Shape.OUTER_BOUNDARY, Shape.EL_SHAPE), args.mix)) if args.mix else None
+    os.makedirs(args.output, exist_ok=True)
+    for blocks in args.blocks:
+        for i in range(args.count):
+            seed = args.seed + i
+            write_problem(os.path.join(args.output, f'tilesproblem_{blocks}x{blocks}_{seed}.txt'), blocks, seed, args.density, mix)
@@ -0,0 +1,190 @@
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from csp_framework import CSP
+from tiles import Shape, Tile
+
+# Search state of a worker process, set once by init_worker so tasks only carry their partial assignment
+_worker: dict = {}
+
+def explore(csp: CSP, bushes: Dict, bush_targets: Dict[int, int], shape_targets: Dict[Shape, int], assignment: Dict, inference: bool = True,
+            max_nodes: Optional[int] = None, max_depth: Optional[int] = None, should_stop: Optional[Callable[[], bool]] = None) -> Tuple[Optional[Dict], List[Dict]]:
+    """
+    Search the subtree under a partial assignment exactly like CSP.backtracking_search, but hand back the parts of
+    it that were not explored. A node is left for later instead of being expanded when it is max_depth assignments
+    below the start, once max_nodes nodes were expanded, or when should_stop says so
+
+    csp: CSP - the problem
+    bushes: Dict - the initial bushes for all grid locations
+    bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
+    shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
+    assignmet: Dict - the partial assignment at the root of the subtree, it is not modified
+    inference: bool - passed to CSP.backtracking_search
+    max_nodes: Optional[int] - nodes to expand before the rest of the subtree is left for later
+    max_depth: Optional[int] - depth below the root at which nodes are left for later
+    should_stop: Optional[Callable[[], bool]] - polled at every node, leaves the rest for later when True
+
+    returns: Tuple[Optional[Dict], List[Dict]] - the first solution found (or None) and the partial assignments
+        left for later, both in the order the sequential search would reach them with the solution last
+    """
+    assignment = dict(assignment)
+    pending: List[Dict] = []
+    trail = csp.prepare(bushes, assignment, inference)
+    if trail is None:
+        return None, pending
+    depth = len(assignment)
+    expanded = 0
+
+    # One frame per assigned variable as in SolutionStream: the variable, its values in LCV order and how many have
+    # been tried, with the trail mark to undo back to. The recursion it replaces ran out of stack on large grids
+    frames: List[list] = []
+    marks: List[int] = []
+    expand = True
+    while True:
+        if expand and len(assignment) == len(csp.variables):
+            if csp.matches_target(assignment, bushes, bush_targets, shape_targets):
+                return dict(assignment), pending
+        elif expand:
+            if (max_depth is not None and len(assignment) - depth >= max_depth) or (max_nodes is not None and expanded >= max_nodes) or \
+                    (should_stop is not None and should_stop()):
+                pending.append(dict(assignment))
+            else:
+                expanded += 1
+                first = csp.most_constrained_variable(assignment)
+                frames.append([first, list(csp.least_constraining_value(first, bushes)), 0])
+                marks.append(len(trail))
+
+        if not frames:
+            return None, pending
+
+        # Take the newest frame's value back and try its next one, or drop the frame when it has none left
+        variable, values, tried = frames[-1]
+        csp.undo(assignment, trail, marks[-1])
+        if tried == len(values):
+            frames.pop()
+            marks.pop()
+            expand = False
+            continue
+        frames[-1][2] += 1
+        csp.assign(variable, values[tried], assignment, trail)
+        expand = csp.consistent_incrementally(variable, assignment) and (not csp.inference or csp.propagate(assignment, trail))
+
+def init_worker(csp: CSP, bushes: Dict, bush_targets: Dict[int, int], shape_targets: Dict[Shape, int], inference: bool, stop) -> None:
+    """
+    Process pool initializer, keeps the problem in the worker so it is only sent once per process
+
+    stop: multiprocessing.Event - set by the parent to make every running task return right away
+    """
+    _worker.update(csp=csp, bushes=bushes, bush_targets=bush_targets, shape_targets=shape_targets, inference=inference, stop=stop)
+
+def solve_piece(assignment: Dict, max_nodes: int) -> Tuple[Optional[Dict], List[Dict]]:
+    """
+    Process pool task, explore() one subproblem in the worker's copy of the problem
+
+    assignmet: Dict - the partial assignment of the subproblem
+    max_nodes: int - nodes to expand before the rest of the subproblem is split off and sent back
+
+    returns: Tuple[Optional[Dict], List[Dict]] - see explore()
+    """
+    return explore(_worker['csp'], _worker['bushes'], _worker['bush_targets'], _worker['shape_targets'], assignment,
+                   _worker['inference'], max_nodes=max_nodes, should_stop=_worker['stop'].is_set)
+
+def parallel_search(csp: CSP, bushes: Dict, bush_targets: Dict[int, int], shape_targets: Dict[Shape, int], assignment: Optional[Dict] = None,
+                    inference: bool = True, workers: Optional[int] = None, split_depth: int = 2, max_nodes: int = 2000, ordered: bool = True) -> Optional[Dict]:
+    """
+    CSP.backtracking_search across a pool of processes
+
+    csp: CSP - the problem
+    bushes: Dict - the initial bushes for all grid locations
+    bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
+    shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
+    assignmet: Optional[Dict] - the partial assignment to start from, it is not modified
+    inference: bool - passed to CSP.backtracking_search
+    workers: Optional[int] - number of processes, defaults to the number of cores
+    split_depth: int - the search tree is split into the subproblems this many assignments below the root
+    max_nodes: int - a task that expands this many nodes without finishing splits its unexplored part into new tasks
+    ordered: bool - return the solution the sequential search would find, otherwise the first one any worker finds
+
+    returns: Optional[Dict] - the solution if one exists, otherwise None
+
+    Subproblems are keyed by their position in the sequential search order. The pool hands tasks to whichever worker
+    is free, and a task that runs into max_nodes sends back the rest of its subtree as smaller tasks, so one heavy
+    subtree ends up spread over every worker. Live domains are the fixpoint of the propagation, so a worker that
+    starts from a partial assignment makes the same choices the sequential search makes below it. With ordered
+    the search can stop once a solution has been found and every subproblem before it is done, later subproblems are
+    cancelled. Without ordered it stops on the first solution. Either way the stop event makes running tasks return
+    """
+    solution, pieces = explore(csp, bushes, bush_targets, shape_targets, assignment or {}, inference, max_depth=split_depth)
+    if solution is not None or not pieces:
+        return canonical(csp, solution)
+
+    stop = multiprocessing.Event()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                   initargs=(csp, bushes, bush_targets, shape_targets, inference, stop))
+    try:
+        running = {executor.submit(solve_piece, piece, max_nodes): (i,) for i, piece in enumerate(pieces)}
+        best: Optional[Tuple[tuple, Dict]] = None
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                if future.cancelled():
+                    continue
+                solution, pieces = future.result()
+                if solution is not None and (best is None or key + (len(pieces),) < best[0]):
+                    best = (key + (len(pieces),), solution)
+                for i, piece in enumerate(pieces):
+                    if best is None or key + (i,) < best[0]:
+                        running[executor.submit(solve_piece, piece, max_nodes)] = key + (i,)
+
+            if best is not None:
+                if not ordered:
+                    break
+                # Everything after the best solution is no longer needed
+                for future, key in list(running.items()):
+                    if key > best[0] and future.cancel():
+                        del running[future]
+                if all(key > best[0] for key in running.values()):
+                    break
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return canonical(csp, best[1]) if best is not None else None
+
+def canonical(csp: CSP, solution: Optional[Dict]) -> Optional[Dict]:
+    """
+    Replace the tiles of a solution that came back from a worker with the matching tiles of the parent's domains
+
+    csp: CSP - the problem
+    solution: Optional[Dict] - a solution or None
+
+    returns: Optional[Dict] - the same solution built from csp.domains
+    """
+    if solution is None:
+        return None
+    return {variable: next(tile for tile in csp.domains[variable] if type(tile) is type(value)) for variable, value in solution.items()}
+
+if __name__ == '__main__':
+    # Time the sequential and the parallel search on a problem file and check they agree
+    from read_csp import read
+    from tile_placement import build_csp
+
+    bushes, shape_targets, size, bush_targets, _ = read(sys.argv[1])
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    csp, bush_dict = build_csp(np.asarray(bushes), shape_targets, size, bush_targets)
+
+    t0 = time.perf_counter()
+    sequential = csp.backtracking_search(bush_dict, bush_targets, shape_targets)
+    t1 = time.perf_counter()
+    parallel = parallel_search(csp, bush_dict, bush_targets, shape_targets, workers=workers)
+    t2 = time.perf_counter()
+
+    same = (sequential is None and parallel is None) or (sequential is not None and parallel is not None and
+                                                         all(type(sequential[k]) is type(parallel[k]) for k in sequential))
+    print(f'sequential {t1 - t0:.4f}s | parallel {t2 - t1:.4f}s | same solution {same}')
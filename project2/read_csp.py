@@ -1,57 +1,56 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
 from tiles import Shape
 
-def read_row(row, size):
-    bushes = []
-    row = row[:size*2]
-    for bush in row[::2]:
-        try:
-            bushes.append(int(bush))
-        except ValueError:
-            bushes.append(0)
-        bushes.append
-    return bushes
+def load(path: str) -> Tuple[np.ndarray, Dict[Shape, int], int, Dict[int, int], List[list]]:
+    """
+    Load a tile placement problem file
+
+    path: str - the problem file
+
+    returns: Tuple[np.ndarray, Dict[Shape, int], int, Dict[int, int], List[list]] - the size x size int8 landscape
+        (0 where there is no bush), the tiles to place per shape, the size, the visible bushes wanted per color and
+        the recorded solution as [tile id, tile size, shape] rows, empty when the file has none
+    """
+    with open(path, 'rb') as f:
+        lines = f.read().decode().splitlines()
+
+    # Landscape rows put a bush (or a space) every other character, the trailing space may be missing
+    size = (len(lines[2]) + 1) // 2
+    assert size > 0, 'size of bushes being read in is not positive'
+
+    # Parse the whole landscape at once from its bytes, anything that isn't a digit is an empty cell
+    block = ''.join(line.ljust(2 * size)[:2 * size] for line in lines[2:2 + size]).encode()
+    cells = np.frombuffer(block, dtype=np.uint8).reshape(size, 2 * size)[:, ::2]
+    digits = (cells >= ord('0')) & (cells <= ord('9'))
+    bushes = np.where(digits, cells - ord('0'), 0).astype(np.int8)
+
+    # Load available tiles, {SHAPE=count, ...}
+    tile_dict = {}
+    for tile in lines[2 + size + 2].strip()[1:-1].split(','):
+        k, v = tile.strip().split('=')
+        tile_dict[Shape[k]] = int(v)
+
+    # Load targets
+    targets = {}
+    for i in range(4):
+        k, v = lines[2 + size + 2 + 3 + i].strip().split(':')
+        targets[int(k)] = int(v)
+
+    # Load solution if it exists in the file
+    solution = []
+    for line in lines[2 + size + 2 + 3 + 9: 2 + size + 2 + 3 + 9 + size * size // 4 // 4]:
+        if not line.strip():
+            break
+        tile_id, tile_size, tile_shape = line.strip().split(' ')
+        solution.append([int(tile_id), int(tile_size), Shape[tile_shape]])
+    return bushes, tile_dict, size, targets, solution
 
 def read(path):
-    with open(path, 'r') as f:
-        # Skip header
-        lines = f.readlines()
-
-        bushes = []
-        size = len(lines[2]) // 2
-
-        assert size > 0, 'size of bushes being read in is not positive'
-
-        # Load inital map
-        bushes = [read_row(lines[2 + i], size) for i in range(size)]
-        
-        # Load available tiles
-        tile_dict = {}
-        # print('... ', lines[2 + size + 2])
-        temp_dict = lines[2 + size + 2].strip()
-        # Remove {}
-        temp_dict = temp_dict[1:len(temp_dict)-1]
-        # print(temp_dict)
-        for tile in temp_dict.split(','):
-            tile = tile.strip()
-            k, v = tile.split('=')
-            tile_dict[Shape[k]] = int(v)
-        # print(tile_dict)
-        
-        # Load targets
-        targets = {}
-        for i in range(4):
-            k, v = lines[2 + size + 2 + 3 + i].strip().split(':')
-            targets[int(k)] = int(v)
-        # print(targets)
-        
-        # Load solution if it exists in the file
-        solution = []
-        for line in lines[2 + size + 2 + 3 + 9: 2 + size + 2 + 3 + 9 + size * size // 4 // 4]:
-            # print(line)
-            tile_id, tile_size, tile_shape = line.strip().split(' ')
-            # print(tile_id)
-            # print(tile_size)
-            # print(tile_shape)
-            solution.append([int(tile_id), int(tile_size), Shape[tile_shape]])
-        # print(solution)
-        return bushes, tile_dict, size, targets, solution
\ No newline at end of file
+    """
+    Same as load, with the landscape as a list of lists of ints
+    """
+    bushes, tile_dict, size, targets, solution = load(path)
+    return bushes.astype(int).tolist(), tile_dict, size, targets, solution
@@ -0,0 +1,212 @@
+import argparse
+import sys
+import time
+from random import Random
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from csp_framework import NogoodCache, SearchStats
+from read_csp import load
+from tile_placement import GridLocation, build_csp
+from tiles import Shape, SHAPES, Tile
+
+class TileSession:
+    """
+    One landscape solved for many targets. The CSP, its BushIndex and a NogoodCache are built once and kept, the
+    targets are edited in place in the dicts the constraints hold. Nogoods are keyed on the budgets still left rather
+    than the counts so far, so what one query proves impossible prunes every later query too.
+
+    A query first tries to repair the previous solution with a tabu search over single tile changes, which usually
+    takes a handful of moves when the targets moved a little. Only when that fails does it fall back to backtracking,
+    trying the previous solution's tiles first
+    """
+    def __init__(self, bushes: np.ndarray, size: int, shape_targets: Dict[Shape, int], bush_targets: Dict[int, int], nogoods: int = 100_000) -> None:
+        """
+        bushes: np.ndarray - the size x size landscape of bush colors, 0 where there is no bush
+        size: int - the size of the landscape
+        shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
+        bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
+        nogoods: int - size of the NogoodCache kept across queries, 0 keeps none
+        """
+        self.size: int = size
+        # Copies the constraints share, set_targets edits them in place
+        self.shape_targets: Dict[Shape, int] = {shape: shape_targets.get(shape, 0) for shape in Shape}
+        self.bush_targets: Dict[int, int] = {color: bush_targets.get(color, 0) for color in range(1, 5)}
+        self.csp, self.bush_dict = build_csp(bushes, self.shape_targets, size, self.bush_targets)
+        self.nogoods: Optional[NogoodCache] = NogoodCache(nogoods) if nogoods > 0 else None
+
+        # (locations, tiles, shapes + colors) what every tile adds to the counts at every location: a one-hot of its
+        # shape, then the bushes it leaves visible per color
+        visible = self.csp.bush_index.visible
+        shapes = np.eye(len(Shape), dtype=visible.dtype)[SHAPES]
+        self.effects: np.ndarray = np.concatenate([np.broadcast_to(shapes, visible.shape[:2] + shapes.shape[1:]), visible], axis=2)
+
+        # The last solution found, as an assignment array, and every query answered so far by its targets
+        self.solution: Optional[np.ndarray] = None
+        self.answers: Dict[tuple, Optional[np.ndarray]] = {}
+
+    @classmethod
+    def from_file(cls, path: str, nogoods: int = 100_000) -> 'TileSession':
+        """
+        path: str - a problem file, its targets are the session's first targets
+        nogoods: int - size of the NogoodCache kept across queries
+
+        returns: TileSession - the session
+        """
+        bushes, shape_targets, size, bush_targets, _ = load(path)
+        return cls(bushes, size, shape_targets, bush_targets, nogoods)
+
+    def targets(self) -> Tuple[int, ...]:
+        """
+        returns: Tuple[int, ...] - the current targets, shapes in Shape order then colors 1 to 4, in the layout of
+            the last axis of self.effects
+        """
+        return tuple(self.shape_targets.values()) + tuple(self.bush_targets.values())
+
+    def set_targets(self, shape_targets: Optional[Dict[Shape, int]] = None, bush_targets: Optional[Dict[int, int]] = None) -> None:
+        """
+        Change some targets, the ones left out keep their value. A key that isn't a Shape or a color from 1 to 4 raises
+        ValueError, before any target is changed, since the targets have to keep the layout of self.effects
+
+        shape_targets: Optional[Dict[Shape, int]] - new targets for some shapes
+        bush_targets: Optional[Dict[int, int]] - new targets for some colors
+        """
+        unknown_shapes = [key for key in shape_targets or {} if key not in self.shape_targets]
+        if unknown_shapes:
+            raise ValueError(f'unknown shapes {unknown_shapes}, expected members of Shape')
+        unknown_colors = [key for key in bush_targets or {} if key not in self.bush_targets]
+        if unknown_colors:
+            raise ValueError(f'unknown colors {unknown_colors}, expected 1 to 4')
+        self.shape_targets.update(shape_targets or {})
+        self.bush_targets.update(bush_targets or {})
+
+    def repair(self, start: np.ndarray, max_steps: int = 2000, tabu: int = 10, seed: int = 0) -> Optional[np.ndarray]:
+        """
+        Tabu search from an assignment towards the current targets. Every step makes the single tile change that
+        brings the counts closest to the targets, ties broken at random, and a location changed in the last tabu steps
+        is left alone unless changing it reaches the targets outright
+
+        start: np.ndarray - a complete assignment array to start from, it is not modified
+        max_steps: int - tile changes to try before giving up
+        tabu: int - steps a changed location stays fixed
+        seed: int - seed for the tie breaking
+
+        returns: Optional[np.ndarray] - an assignment array meeting the targets, None if none was reached
+        """
+        rng = Random(seed)
+        array = start.copy()
+        locations = np.arange(len(array))
+        target = np.asarray(self.targets())
+        counts = self.effects[locations, array].sum(axis=0)
+        frozen_until = np.zeros(len(array), dtype=np.int64)
+        tabu = min(tabu, len(array) // 2)
+
+        for step in range(max_steps):
+            deviation = counts - target
+            if not deviation.any():
+                return array
+
+            # (locations, tiles) distance from the targets after each possible change
+            change = self.effects - self.effects[locations, array][:, None, :]
+            cost = np.abs(deviation + change).sum(axis=2)
+            cost[locations, array] = np.iinfo(cost.dtype).max
+            cost[(frozen_until > step) & (cost.min(axis=1) > 0)] = np.iinfo(cost.dtype).max
+
+            best = np.flatnonzero(cost == cost.min())
+            location, tile = divmod(int(best[rng.randrange(len(best))]), cost.shape[1])
+            counts += change[location, tile]
+            array[location] = tile
+            frozen_until[location] = step + 1 + tabu
+
+        return array if not (counts - target).any() else None
+
+    def solve(self, max_steps: int = 2000, restarts: int = 0, stats: Optional[SearchStats] = None) -> Optional[Dict[GridLocation, Tile]]:
+        """
+        Solve for the current targets, starting from the previous solution when there is one
+
+        max_steps: int - tile changes the repair may try before backtracking takes over
+        restarts: int - passed to CSP.backtracking_search
+        stats: Optional[SearchStats] - filled in by the backtracking search if it runs
+
+        returns: Optional[Dict[GridLocation, Tile]] - a solution if one exists, otherwise None
+        """
+        key = self.targets()
+        if key in self.answers:
+            array = self.answers[key]
+        else:
+            array = self.repair(self.solution, max_steps) if self.solution is not None else None
+            if array is None:
+                hint = self.csp.array_assignment(self.solution) if self.solution is not None else None
+                solution = self.csp.backtracking_search(self.bush_dict, self.bush_targets, self.shape_targets, stats=stats,
+                                                        nogoods=self.nogoods if self.nogoods is not None else 0, restarts=restarts, hint=hint)
+                array = self.csp.assignment_array(solution) if solution is not None else None
+            self.answers[key] = array
+
+        if array is None:
+            return None
+        self.solution = array
+        return self.csp.array_assignment(array)
+
+    def sweep(self, queries: List[Tuple[Optional[Dict[Shape, int]], Optional[Dict[int, int]]]], max_steps: int = 2000, restarts: int = 0) -> Iterator[Tuple[tuple, Optional[Dict[GridLocation, Tile]]]]:
+        """
+        Answer a list of what-if queries, each one's target changes applied on top of the session's first targets
+
+        queries: List[Tuple[Optional[Dict[Shape, int]], Optional[Dict[int, int]]]] - (shape_targets, bush_targets)
+            changes, as for set_targets
+        max_steps: int - passed to solve
+        restarts: int - passed to solve
+
+        returns: Iterator[Tuple[tuple, Optional[Dict[GridLocation, Tile]]]] - the targets() of every query with its solution
+        """
+        base_shapes, base_bushes = dict(self.shape_targets), dict(self.bush_targets)
+        try:
+            for shape_targets, bush_targets in queries:
+                self.set_targets(base_shapes, base_bushes)
+                self.set_targets(shape_targets, bush_targets)
+                yield self.targets(), self.solve(max_steps, restarts)
+        finally:
+            self.set_targets(base_shapes, base_bushes)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='What-if sweep over the bush targets of a problem, comparing a session with solving every query from scratch')
+    parser.add_argument('problem', help='the problem file')
+    parser.add_argument('-r', '--range', type=int, default=2, help='move every color target by up to this much either way')
+    parser.add_argument('--restarts', type=int, default=0, help='restarts for the backtracking the session falls back on')
+    parser.add_argument('--no-fresh', action='store_true', help='skip the from-scratch solves')
+    args = parser.parse_args()
+
+    bushes, shape_targets, size, bush_targets, _ = load(args.problem)
+    # A color the file leaves out has a target of 0 in the session, and no target is ever negative
+    queries = [(None, {color: target})
+               for color in range(1, 5)
+               for target in sorted({max(0, bush_targets.get(color, 0) + offset) for offset in range(-args.range, args.range + 1)})]
+
+    t0 = time.perf_counter()
+    session = TileSession(bushes, size, shape_targets, bush_targets)
+    base_shapes, base_bushes = dict(session.shape_targets), dict(session.bush_targets)
+    session.solve(restarts=args.restarts)
+    t1 = time.perf_counter()
+    print(f'first solve {t1 - t0:.3f}s')
+    results = []
+    for targets, solution in session.sweep(queries, restarts=args.restarts):
+        t2 = time.perf_counter()
+        results.append(solution is not None)
+        print(f'{targets} {"solved" if solution is not None else "no solution"} {t2 - t1:.3f}s')
+        t1 = t2
+
+    if not args.no_fresh:
+        t3 = time.perf_counter()
+        mismatches = []
+        for (_, changes), solved in zip(queries, results):
+            # The same complete targets the session solved for
+            targets = {**base_bushes, **changes}
+            csp, bush_dict = build_csp(bushes, base_shapes, size, targets)
+            if (csp.backtracking_search(bush_dict, targets, base_shapes) is not None) != solved:
+                mismatches.append((targets, solved))
+        t4 = time.perf_counter()
+        print(f'session sweep {t3 - t0:.3f}s | from scratch {t4 - t3:.3f}s')
+        for targets, solved in mismatches:
+            print(f'mismatch for bush targets {targets}: the session {"solved" if solved else "found no solution"}, from scratch did not agree', file=sys.stderr)
+        if mismatches:
+            sys.exit(1)
@@ -0,0 +1,75 @@
+import pytest
+
+from csp_framework import NogoodCache, load_checkpoint
+from generate import generate
+from tile_placement import build_csp
+
+def problem(seed: int, extra: int = 0):
+    """
+    seed: int - passed to generate
+    extra: int - added to the target of color 1, the bigger the less likely a solution is left
+
+    returns: tuple - (csp, bush_dict, bush_targets, shape_targets) for a 12 x 12 landscape
+    """
+    bushes, shape_targets, bush_targets, _ = generate(3, seed)
+    bush_targets = {**bush_targets, 1: bush_targets.get(1, 0) + extra}
+    csp, bush_dict = build_csp(bushes, shape_targets, 12, bush_targets)
+    return csp, bush_dict, bush_targets, shape_targets
+
+def valid(csp, solution) -> bool:
+    """
+    returns: bool - whether solution assigns every variable and meets every constraint
+    """
+    return set(solution) == set(csp.variables) and all(constraint.satisfied(solution) for constraint in csp.all_constraints)
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('extra', [0, 1, 3, 6])
+@pytest.mark.parametrize('options', [{'nogoods': 10_000}, {'restarts': 5, 'restart_base': 10, 'seed': 0},
+                                     {'nogoods': 10_000, 'restarts': 5, 'restart_base': 10}])
+def test_engines_match_plain_backtracking(seed, extra, options):
+    csp, bush_dict, bush_targets, shape_targets = problem(seed, extra)
+    expected = csp.backtracking_search(bush_dict, bush_targets, shape_targets)
+    solution = csp.backtracking_search(bush_dict, bush_targets, shape_targets, **options)
+    assert (solution is None) == (expected is None)
+    assert solution is None or valid(csp, solution)
+    if extra == 0:
+        assert solution is not None
+
+def test_shared_nogood_cache():
+    csp, bush_dict, bush_targets, shape_targets = problem(0, 6)
+    nogoods = NogoodCache(10_000)
+    assert csp.backtracking_search(bush_dict, bush_targets, shape_targets, nogoods=nogoods) is None
+    first = csp.expanded
+    assert csp.backtracking_search(bush_dict, bush_targets, shape_targets, nogoods=nogoods) is None
+    assert csp.expanded < first
+
+@pytest.mark.parametrize('stop', [0, 1, 40, 96])
+def test_checkpoint_resume(stop):
+    csp, bush_dict, bush_targets, shape_targets = problem(3)
+    expected = list(csp.solutions(bush_dict, bush_targets, shape_targets))
+    assert len(expected) == 97 and all(valid(csp, solution) for solution in expected)
+
+    stream = csp.solutions(bush_dict, bush_targets, shape_targets)
+    found = [solution for _, solution in zip(range(stop), stream)]
+    checkpoint = stream.checkpoint()
+    # A fresh CSP, as after a restart of the process
+    csp, bush_dict, bush_targets, shape_targets = problem(3)
+    assert found + list(csp.solutions(bush_dict, bush_targets, shape_targets, checkpoint=checkpoint)) == expected
+    assert csp.solutions(bush_dict, bush_targets, shape_targets, checkpoint=checkpoint).count() == len(expected)
+
+def test_saved_checkpoint(tmp_path):
+    csp, bush_dict, bush_targets, shape_targets = problem(3)
+    expected = list(csp.solutions(bush_dict, bush_targets, shape_targets))
+    stream = csp.solutions(bush_dict, bush_targets, shape_targets)
+    found = [solution for _, solution in zip(range(10), stream)]
+    stream.save(str(tmp_path / 'search.json'))
+    rest = list(csp.solutions(bush_dict, bush_targets, shape_targets, checkpoint=load_checkpoint(str(tmp_path / 'search.json'))))
+    assert found + rest == expected
+
+def test_checkpoint_for_another_problem():
+    csp, bush_dict, bush_targets, shape_targets = problem(3)
+    checkpoint = csp.solutions(bush_dict, bush_targets, shape_targets).checkpoint()
+    bushes, shape_targets, bush_targets, _ = generate(2, 0)
+    csp, bush_dict = build_csp(bushes, shape_targets, 8, bush_targets)
+    with pytest.raises(ValueError):
+        csp.solutions(bush_dict, bush_targets, shape_targets, checkpoint=checkpoint)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from generate import generate
+from parallel_search import explore, parallel_search
+from tile_placement import build_csp
+from tiles import Shape
+
+def full_block_grid(blocks: int):
+    """
+    blocks: int - locations per side
+
+    returns: tuple - (csp, bush_dict, shape_targets) for an empty landscape covered only by full blocks, deep enough that
+        a search recursing once per variable runs out of stack
+    """
+    shape_targets = {Shape.FULL_BLOCK: blocks * blocks, Shape.OUTER_BOUNDARY: 0, Shape.EL_SHAPE: 0}
+    csp, bush_dict = build_csp(np.zeros((4 * blocks, 4 * blocks), dtype=np.int8), shape_targets, 4 * blocks, {})
+    return csp, bush_dict, shape_targets
+
+def test_explore_large_grid():
+    csp, bush_dict, shape_targets = full_block_grid(34)
+    expected = csp.backtracking_search(bush_dict, {}, shape_targets)
+    solution, pending = explore(csp, bush_dict, {}, shape_targets, {}, max_nodes=5000)
+    assert expected is not None
+    assert solution == expected and pending == []
+
+def test_explore_leaves_the_rest_for_later():
+    csp, bush_dict, shape_targets = full_block_grid(34)
+    solution, pending = explore(csp, bush_dict, {}, shape_targets, {}, max_nodes=100)
+    assert solution is None
+    assert [len(piece) for piece in pending] == [100]
+
+def test_parallel_large_grid():
+    csp, bush_dict, shape_targets = full_block_grid(34)
+    expected = csp.backtracking_search(bush_dict, {}, shape_targets)
+    assert parallel_search(csp, bush_dict, {}, shape_targets, workers=2) == expected
+
+@pytest.mark.parametrize('seed', range(4))
+def test_parallel_matches_sequential(seed):
+    bushes, shape_targets, bush_targets, _ = generate(4, seed)
+    csp, bush_dict = build_csp(bushes, shape_targets, 16, bush_targets)
+    expected = csp.backtracking_search(bush_dict, bush_targets, shape_targets)
+    solution = parallel_search(csp, bush_dict, bush_targets, shape_targets, workers=2, max_nodes=20)
+    assert expected is not None
+    assert solution == expected
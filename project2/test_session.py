@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+from session import TileSession
+from tiles import Shape
+
+@pytest.mark.parametrize('shape_targets, bush_targets', [({'FULL_BLOCK': 1}, None), (None, {5: 1}), (None, {0: 1}), (None, {'1': 1})])
+def test_set_targets_rejects_unknown_keys(shape_targets, bush_targets):
+    session = TileSession(np.zeros((8, 8), dtype=np.int8), 8, {Shape.FULL_BLOCK: 4}, {})
+    before = session.targets()
+    with pytest.raises(ValueError):
+        session.set_targets(shape_targets, bush_targets)
+    assert session.targets() == before
+    assert session.solve() is not None
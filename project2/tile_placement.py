@@ -1,7 +1,8 @@
 from csp_framework import Constraint, CSP
-from typing import NamedTuple, Dict, List, Optional
+from typing import NamedTuple, Dict, List, Optional, Tuple
 
 from tiles import *
+from bush_index import BushIndex
 
 import numpy as np
 
@@ -14,6 +15,8 @@ class ShapeConstraint(Constraint[GridLocation, Tile]):
         super().__init__(variables)
         # self.variables: List[GridLocation] = variables
         self.shape_targets: Dict[Shape, int] = shape_targets
+        # running count of placed tiles per shape, kept up to date by assign/unassign
+        self.counts: Dict[Shape, int] = defaultdict(int)
     
     def satisfied(self, assignment: Dict[GridLocation, Tile]) -> bool:
         counts = defaultdict(int)
@@ -25,19 +28,78 @@ class ShapeConstraint(Constraint[GridLocation, Tile]):
                 return False
         return True
 
+    def reset(self, assignment: Dict[GridLocation, Tile]) -> None:
+        self.counts = defaultdict(int)
+        super().reset(assignment)
+
+    def assign(self, variable: GridLocation, value: Tile) -> None:
+        self.counts[value.shape] += 1
+
+    def unassign(self, variable: GridLocation, value: Tile) -> None:
+        self.counts[value.shape] -= 1
+
+    def satisfied_incrementally(self, assignment: Dict[GridLocation, Tile]) -> bool:
+        for k, v in self.shape_targets.items():
+            if self.counts[k] > v:
+                return False
+        return True
+
+    def state(self) -> Tuple[int, ...]:
+        # Tiles still to place per shape rather than the counts, so what is learned holds for other targets too
+        return tuple(self.shape_targets.get(shape, 0) - self.counts[shape] for shape in Shape)
+
+    def propagate(self, assignment: Dict[GridLocation, Tile], domains: Dict[GridLocation, List[Tile]]) -> Optional[List[Tuple[GridLocation, Tile]]]:
+        unassigned = [variable for variable in self.variables if variable not in assignment]
+        remaining = {k: v - self.counts[k] for k, v in self.shape_targets.items()}
+        # Every unassigned location still takes exactly one tile, so the remaining targets have to add up to them
+        if any(v < 0 for v in remaining.values()) or sum(remaining.values()) != len(unassigned):
+            return None
+
+        supporters: Dict[Shape, List[GridLocation]] = defaultdict(list)
+        for variable in unassigned:
+            for shape in {tile.shape for tile in domains[variable]}:
+                supporters[shape].append(variable)
+        
+        removals = []
+        for k, v in remaining.items():
+            if len(supporters[k]) < v:
+                return None
+            # Exactly as many locations can still take the shape as need it, so they all must
+            if v > 0 and len(supporters[k]) == v:
+                for variable in supporters[k]:
+                    removals.extend((variable, tile) for tile in domains[variable] if tile.shape != k)
+
+        # Shapes that are used up (or have no target) can't be placed anywhere else
+        for variable in unassigned:
+            removals.extend((variable, tile) for tile in domains[variable] if remaining.get(tile.shape, 0) == 0)
+        return removals
+
 class BushConstraint(Constraint[GridLocation, Tile]):
-    def __init__(self, variables: List[GridLocation], bushes: Dict[GridLocation, List[int]], bush_targets: Dict[int, int]) -> None:
+    def __init__(self, variables: List[GridLocation], bushes: Dict[GridLocation, List[int]], bush_targets: Dict[int, int],
+                 bush_index: Optional[BushIndex[GridLocation]] = None) -> None:
         super().__init__(variables)
         self.bushes: Dict[GridLocation, List[int]] = bushes
         self.bush_targets: Dict[int, int] = bush_targets
+        self.bush_index: Optional[BushIndex[GridLocation]] = bush_index
         self.max_bushes: Dict[int, int] = {}
         for i in range(1, 5):
             sum = 0
             for value in bushes.values():
                 sum += np.count_nonzero(value == i)
             self.max_bushes[i] = sum
+        # running count of hidden bushes per color, kept up to date by assign/unassign
+        self.hidden: List[int] = [0, 0, 0, 0]
+        # hidden_counts per (location, tile class), propagation asks for the same ones over and over
+        self.hidden_cache: Dict[Tuple[GridLocation, type], List[int]] = {}
     
     def satisfied(self, assignment: Dict[GridLocation, Tile]) -> bool:
+        if self.bush_index is not None:
+            hidden = self.bush_index.assignment_counts(assignment, self.bush_index.hidden)
+            for k, v in self.bush_targets.items():
+                if self.max_bushes[k] - hidden[k - 1] < v:
+                    return False
+            return True
+
         counts = defaultdict(int)
         for location, tile in assignment.items():
             hidden = self.bushes[location] * tile.mask
@@ -49,65 +111,78 @@ class BushConstraint(Constraint[GridLocation, Tile]):
                 return False
         return True
 
-# def AC3(csp):
-#     queue = list(csp.binary_constraints)
-
-#     while queue:
-#         (xi, xj) = queue.pop(0)
-
-#         if remove_inconsistent_values(csp, xi, xj):
-#             if len(csp.domains[xi]) == 0:
-#                 return False
-            
-#             for Xk in csp.related
-    
-#     return True
-
-def AC3(csp):
-    queue = set(csp.variables)
-
-    while len(queue) > 0:
-        element = queue.pop()
-        element_values = csp.domains[element]
-
-        # get all related variables with set values (initially none)
-        # r_all = set(csp.related_variables[element])
-        r_all = set([var for var in csp.variables])
-
-        changed = False
-
-        for related in r_all:
-            if element not in csp.variables:
-                continue
-
-            value = csp.domains[related]
-
-            if value in element_values:
-                csp.domains[element].remove(value)
-
-                if len(csp.domains[element]) == 1:
-                    pass
-
-
-
-        # Update domains
-        if changed:
-            related_unfinished = [r_element for r_element in r_all if r_element in csp.variables]
-            for item in related_unfinished:
-                queue.add(item)
+    def hidden_counts(self, location: GridLocation, tile: Tile) -> List[int]:
+        """
+        location: GridLocation - a grid location
+        tile: Tile - the tile placed there
+
+        returns: List[int] - bushes of colors 1 to 4 the tile hides
+        """
+        key = (location, type(tile))
+        if key not in self.hidden_cache:
+            if self.bush_index is not None:
+                self.hidden_cache[key] = self.bush_index.hidden_counts(location, tile).tolist()
+            else:
+                hidden = self.bushes[location] * tile.mask
+                self.hidden_cache[key] = [np.count_nonzero(hidden == bush) for bush in range(1, 5)]
+        return self.hidden_cache[key]
+
+    def reset(self, assignment: Dict[GridLocation, Tile]) -> None:
+        self.hidden = [0, 0, 0, 0]
+        super().reset(assignment)
+
+    def assign(self, variable: GridLocation, value: Tile) -> None:
+        for i, count in enumerate(self.hidden_counts(variable, value)):
+            self.hidden[i] += count
+
+    def unassign(self, variable: GridLocation, value: Tile) -> None:
+        for i, count in enumerate(self.hidden_counts(variable, value)):
+            self.hidden[i] -= count
+
+    def satisfied_incrementally(self, assignment: Dict[GridLocation, Tile]) -> bool:
+        for k, v in self.bush_targets.items():
+            if self.max_bushes[k] - self.hidden[k - 1] < v:
+                return False
+        return True
 
-if __name__ == '__main__':
-    # variable: (row, col)
-    # domain: tile
-    from read_csp import read
-    bushes, shape_targets, size, bush_targets, solution = read(r"C:\Users\ddeshler\Desktop\ai\project2\input\tilesproblem_1327003805972500.txt")
-    bushes = np.asarray(bushes)
-    print(type(bushes), type(shape_targets), type(size), type(bush_targets), type(solution))
-    print(bushes.shape)
-    print(shape_targets)
-    print(bush_targets)
+    def state(self) -> Tuple[int, ...]:
+        # Bushes still to hide per color, like ShapeConstraint.state it holds for other targets too
+        return tuple(self.max_bushes[k] - self.hidden[k - 1] - v for k, v in self.bush_targets.items())
 
-    tiles = [FullTile, OuterBoundaryTile, LeftTopTile, RightTopTile, LeftBottomTile, RightBottomTile]
+    def propagate(self, assignment: Dict[GridLocation, Tile], domains: Dict[GridLocation, List[Tile]]) -> Optional[List[Tuple[GridLocation, Tile]]]:
+        unassigned = [variable for variable in self.variables if variable not in assignment]
+        removals = []
+        for k, v in self.bush_targets.items():
+            # The unassigned locations together have to hide exactly this many more bushes of color k
+            needed = self.max_bushes[k] - self.hidden[k - 1] - v
+            counts = {variable: [self.hidden_counts(variable, tile)[k - 1] for tile in domains[variable]] for variable in unassigned}
+            lowest = sum(min(c) for c in counts.values())
+            highest = sum(max(c) for c in counts.values())
+            if not lowest <= needed <= highest:
+                return None
+
+            # Bounds consistency: a tile stays only if the other locations can make up the rest of the target
+            for variable in unassigned:
+                c = counts[variable]
+                others_low, others_high = lowest - min(c), highest - max(c)
+                for tile, hidden in zip(domains[variable], c):
+                    if others_low + hidden > needed or others_high + hidden < needed:
+                        removals.append((variable, tile))
+        return removals
+
+TILES = TILE_TYPES
+
+def build_csp(bushes: np.ndarray, shape_targets: Dict[Shape, int], size: int, bush_targets: Dict[int, int]) -> Tuple[CSP[GridLocation, Tile], Dict[GridLocation, np.ndarray]]:
+    """
+    Build the tile placement CSP for a landscape
+
+    bushes: np.ndarray - the size x size landscape of bush colors, 0 where there is no bush
+    shape_targets: Dict[Shape, int] - for a given tile shape, how many must be placed
+    size: int - the size of the landscape
+    bush_targets: Dict[int, int] - for a given bush type, how many need to be visible
+
+    returns: Tuple[CSP[GridLocation, Tile], Dict[GridLocation, np.ndarray]] - the CSP and the 4x4 bushes under every location
+    """
     locations = []
     tile_dict = {}
     bush_dict = {}
@@ -115,17 +190,45 @@ if __name__ == '__main__':
         for x in range(size // 4):
             location = GridLocation(y, x)
             locations.append(location)
-            tile_dict[location] = [tile() for tile in tiles]
+            tile_dict[location] = [tile() for tile in TILES]
             bush_dict[location] = bushes[y*4:(y+1)*4, x*4:(x+1)*4]
+    bush_index = BushIndex(bush_dict, TILES)
     
-    csp: CSP[GridLocation, Tile] = CSP(locations, tile_dict)
+    csp: CSP[GridLocation, Tile] = CSP(locations, tile_dict, bush_index)
     csp.add_constraint(ShapeConstraint(locations, shape_targets))
-    csp.add_constraint(BushConstraint(locations, bush_dict, bush_targets))
+    csp.add_constraint(BushConstraint(locations, bush_dict, bush_targets, bush_index))
+    return csp, bush_dict
 
-    solution: Optional[Dict[GridLocation, Tile]] = csp.backtracking_search(bush_dict, bush_targets, shape_targets)
-    if solution is None:
-        print('No solution found')
-    else:
-        print('Found solution: \n', solution.values())
-        csp.display_assignment(size, bush_dict, solution)
+if __name__ == '__main__':
+    # variable: (row, col)
+    # domain: tile
+    import argparse
+    import os
+    from read_csp import load
+    from csp_framework import load_checkpoint
+    parser = argparse.ArgumentParser(description='Solve a tile placement problem file')
+    parser.add_argument('problem', help='the problem file')
+    parser.add_argument('--count', action='store_true', help='count every solution instead of showing the first one')
+    parser.add_argument('--checkpoint', default=None, help='with --count, save the search here as it goes and resume from it if it exists')
+    args = parser.parse_args()
+
+    bushes, shape_targets, size, bush_targets, solution = load(args.problem)
+    print(type(bushes), type(shape_targets), type(size), type(bush_targets), type(solution))
+    print(bushes.shape)
+    print(shape_targets)
+    print(bush_targets)
 
+    csp, bush_dict = build_csp(bushes, shape_targets, size, bush_targets)
+
+    if args.count:
+        checkpoint = load_checkpoint(args.checkpoint) if args.checkpoint and os.path.exists(args.checkpoint) else None
+        stream = csp.solutions(bush_dict, bush_targets, shape_targets, checkpoint=checkpoint)
+        stream.checkpoint_path = args.checkpoint
+        print('Solutions:', stream.count())
+    else:
+        solution: Optional[Dict[GridLocation, Tile]] = csp.backtracking_search(bush_dict, bush_targets, shape_targets)
+        if solution is None:
+            print('No solution found')
+        else:
+            print('Found solution: \n', solution.values())
+            csp.display_assignment(size, bush_dict, solution)
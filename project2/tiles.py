@@ -10,9 +10,37 @@ class Shape(Enum):
     OUTER_BOUNDARY = 1
     EL_SHAPE = 2
 
+# One 4x4 mask per tile class, 1 where the tile covers the landscape, rows in TILE_TYPES order
+MASKS = np.asarray([
+    [[1, 1, 1, 1], [1, 1, 1, 1], [1, 1, 1, 1], [1, 1, 1, 1]],
+    [[1, 1, 1, 1], [1, 0, 0, 1], [1, 0, 0, 1], [1, 1, 1, 1]],
+    [[1, 1, 1, 1], [1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0]],
+    [[1, 1, 1, 1], [0, 0, 0, 1], [0, 0, 0, 1], [0, 0, 0, 1]],
+    [[1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0], [1, 1, 1, 1]],
+    [[0, 0, 0, 1], [0, 0, 0, 1], [0, 0, 0, 1], [1, 1, 1, 1]],
+])
+MASKS.setflags(write=False)
+
 class Tile(ABC):
-    def __init__(self, mask):
-        self.mask = mask
+    """
+    Tiles are flyweights: every class has a single shared instance and its mask is a read-only row of MASKS, so
+    building the domains of a big grid allocates no arrays. index is the row in MASKS and TILE_TYPES
+    """
+    __slots__ = ()
+    _instances: dict = {}
+    index: int
+    mask: np.ndarray
+    shape: 'Shape'
+
+    def __new__(cls):
+        instance = Tile._instances.get(cls)
+        if instance is None:
+            instance = Tile._instances[cls] = super().__new__(cls)
+        return instance
+
+    def __reduce__(self):
+        # Unpickle to the shared instance, so tiles coming back from other processes are the same objects
+        return type(self), ()
     
     # @abstractmethod
     # def condition(self, i, j):
@@ -32,50 +60,59 @@ class Tile(ABC):
     #     return True, covering
 
 class FullTile(Tile):
-    def __init__(self):
-        super().__init__(np.asarray([[1, 1, 1, 1], [1, 1, 1, 1], [1, 1, 1, 1], [1, 1, 1, 1]]))
-        self.shape = Shape.FULL_BLOCK
+    __slots__ = ()
+    index = 0
+    mask = MASKS[0]
+    shape = Shape.FULL_BLOCK
     
     # def condition(self, i, j):
     #     return True
 
 class OuterBoundaryTile(Tile):
-    def __init__(self):
-        super().__init__(np.asarray([[1, 1, 1, 1], [1, 0, 0, 1], [1, 0, 0, 1], [1, 1, 1, 1]]))
-        self.shape = Shape.OUTER_BOUNDARY
+    __slots__ = ()
+    index = 1
+    mask = MASKS[1]
+    shape = Shape.OUTER_BOUNDARY
     
     # def condition(self, i, j):
     #     return i == 0 or i == 3 or j == 0 or j == 3
 
 class ELTile(Tile):
-    def __init__(self, mask):
-        super().__init__(mask)
-        self.shape = Shape.EL_SHAPE
+    __slots__ = ()
+    shape = Shape.EL_SHAPE
 
 class LeftBottomTile(ELTile):
-    def __init__(self):
-        super().__init__(np.asarray([[1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0], [1, 1, 1, 1]]))
+    __slots__ = ()
+    index = 4
+    mask = MASKS[4]
 
     # def condition(self, i, j):
     #     return (j == 0 and (i == 0 or i == 1 or i == 2)) or (i == 3 and (j == 0 or j == 1 or j == 2 or j == 3))
 
 class RightBottomTile(ELTile):
-    def __init__(self):
-        super().__init__(np.asarray([[0, 0, 0, 1], [0, 0, 0, 1], [0, 0, 0, 1], [1, 1, 1, 1]]))
+    __slots__ = ()
+    index = 5
+    mask = MASKS[5]
     
     # def condition(self, i, j):
     #     return (j == 3 and (i == 0 or i == 1 or i == 2)) or (i == 3 and (j == 0 or j == 1 or j == 2 or j == 3))
 
 class LeftTopTile(ELTile):
-    def __init__(self):
-        super().__init__(np.asarray([[1, 1, 1, 1], [1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0]]))
+    __slots__ = ()
+    index = 2
+    mask = MASKS[2]
 
     # def condition(self, i, j):
     #     return (j == 0 and (i == 0 or i == 1 or i == 2 or i == 3)) or (i == 0 and (j == 0 or j == 1 or j == 2 or j == 3))
 
 class RightTopTile(ELTile):
-    def __init__(self):
-        super().__init__(np.asarray([[1, 1, 1, 1], [0, 0, 0, 1], [0, 0, 0, 1], [0, 0, 0, 1]]))
+    __slots__ = ()
+    index = 3
+    mask = MASKS[3]
     
     # def condition(self, i, j):
-    #     return (j == 3 and (i == 0 or i == 1 or i == 2 or i == 3)) or (i == 0 and (j == 0 or j == 1 or j == 2 or j == 3))
\ No newline at end of file
+    #     return (j == 3 and (i == 0 or i == 1 or i == 2 or i == 3)) or (i == 0 and (j == 0 or j == 1 or j == 2 or j == 3))
+
+TILE_TYPES = [FullTile, OuterBoundaryTile, LeftTopTile, RightTopTile, LeftBottomTile, RightBottomTile]
+# Shape.value of every row of MASKS, so shapes of an array assignment are one lookup
+SHAPES = np.asarray([tile.shape.value for tile in TILE_TYPES], dtype=np.int8)
@@ -0,0 +1,91 @@
+import argparse
+import json
+import socket
+import sys
+import threading
+from typing import Dict, Iterable, Iterator, Optional
+
+def connect(host: str = '127.0.0.1', port: int = 8765, socket_path: Optional[str] = None, timeout: Optional[float] = None) -> socket.socket:
+    """
+    host: str - the daemon's interface when not using a Unix socket
+    port: int - the daemon's TCP port when not using a Unix socket
+    socket_path: Optional[str] - the daemon's Unix socket
+    timeout: Optional[float] - seconds to wait on the socket before giving up, None waits forever
+
+    returns: socket.socket - a connection to the daemon
+    """
+    if socket_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        return connection
+    return socket.create_connection((host, port), timeout=timeout)
+
+def exchange(connection: socket.socket, requests: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Send requests one per line and yield the responses as the daemon sends them, which may not be in request order.
+    Requests are written from a thread so a long batch keeps flowing while the daemon holds back on reading. Requests
+    without an id are numbered in the order they are sent
+
+    connection: socket.socket - from connect()
+    requests: Iterable[Dict] - the requests, e.g. {"kind": "water_jug", "capacities": [3, 5], "goal": 4}
+
+    returns: Iterator[Dict] - one response per request
+    """
+    def send() -> None:
+        with connection.makefile('wb') as stream:
+            for sent, request in enumerate(requests):
+                if request.get('id') is None:
+                    request = {**request, 'id': sent}
+                stream.write(json.dumps(request).encode() + b'\n')
+                stream.flush()
+        connection.shutdown(socket.SHUT_WR)
+
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+    # The daemon closes the connection once it has answered everything sent before the shutdown
+    with connection.makefile('rb') as stream:
+        for line in stream:
+            yield json.loads(line)
+    sender.join()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Send requests to a running solver_daemon.py and print its JSON responses')
+    parser.add_argument('--host', default='127.0.0.1', help="the daemon's interface")
+    parser.add_argument('-p', '--port', type=int, default=8765, help="the daemon's TCP port")
+    parser.add_argument('-s', '--socket', default=None, help="the daemon's Unix socket, instead of TCP")
+    parser.add_argument('-t', '--timeout', type=float, default=None, help='seconds the daemon may spend on each request')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    jug = commands.add_parser('jug', help='solve a water jug instance')
+    jug.add_argument('capacities', help='c1,c2,...,cn without the goal jug')
+    jug.add_argument('goal', type=int, help='amount wanted in the goal jug')
+    jug.add_argument('-e', '--engine', default='greedy', help="search() engine, or 'table' for a distance table lookup")
+
+    tile = commands.add_parser('tile', help='solve a tile placement problem file')
+    tile.add_argument('path', help='the problem file, as the daemon sees it')
+    tile.add_argument('--bush-targets', type=int, nargs=4, metavar=('C1', 'C2', 'C3', 'C4'), default=None, help="replace the file's bush targets")
+    tile.add_argument('--restarts', type=int, default=0, help='restarts for the backtracking search')
+
+    commands.add_parser('ping', help="show the daemon's status")
+    commands.add_parser('batch', help='send JSON requests from stdin, one per line')
+    args = parser.parse_args()
+
+    if args.command == 'jug':
+        requests = [{'kind': 'water_jug', 'capacities': [int(c) for c in args.capacities.split(',')], 'goal': args.goal, 'engine': args.engine}]
+    elif args.command == 'tile':
+        requests = [{'kind': 'tile', 'path': args.path, 'restarts': args.restarts,
+                     **({'bush_targets': dict(zip(range(1, 5), args.bush_targets))} if args.bush_targets else {})}]
+    elif args.command == 'ping':
+        requests = [{'kind': 'ping'}]
+    else:
+        requests = (json.loads(line) for line in sys.stdin if line.strip())
+    if args.timeout is not None:
+        requests = ({'timeout': args.timeout, **request} for request in requests)
+
+    failed = False
+    with connect(args.host, args.port, args.socket) as connection:
+        for response in exchange(connection, requests):
+            print(json.dumps(response), flush=True)
+            failed = failed or response['status'] != 'ok'
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,485 @@
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+# Both projects are flat directories of scripts, the daemon imports from them the way their own scripts do
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'project1'), os.path.join(ROOT, 'project2')]
+
+import numpy as np
+
+from water_jug_v3 import search, SearchBudget, SearchStats as JugStats, ENGINES as JUG_ENGINES
+from distance_tables import DistanceTables
+from csp_framework import SearchStats as TileStats
+from read_csp import load
+from session import TileSession
+from tiles import Shape
+
+# Capacity of the goal jug, as batch_solve.py and distance_tables.py use it
+GOAL_JUG = int(1e9)
+
+# Per process state of a worker, set by init_worker and warm caches that outlive single requests
+_worker: dict = {}
+
+class Deadline(Exception):
+    """
+    Raised inside a worker when a request runs past its deadline
+    """
+
+def init_worker(cache_dir: Optional[str], max_goal: int, max_sessions: int) -> None:
+    """
+    Process pool initializer, sets up the caches a worker keeps between requests
+
+    cache_dir: Optional[str] - directory for distance tables shared by every worker, None keeps them in memory
+    max_goal: int - the largest goal distance tables answer
+    max_sessions: int - landscapes whose TileSession is kept, least recently used are dropped first
+    """
+    _worker.update(tables=DistanceTables(max_goal, directory=cache_dir), sessions=OrderedDict(), max_sessions=max_sessions)
+
+def warm() -> int:
+    """
+    Run a tiny job of every kind so imports, numpy and the code paths are loaded before the first real request
+
+    returns: int - the worker's pid
+    """
+    search([GOAL_JUG, 3, 5], 4)
+    bushes = np.zeros((4, 4), dtype=np.int8)
+    TileSession(bushes, 4, {Shape.FULL_BLOCK: 1}, {1: 0, 2: 0, 3: 0, 4: 0}, nogoods=0).solve()
+    return os.getpid()
+
+def solve_jug(request: Dict, deadline: float) -> Dict:
+    """
+    Answer a water jug request
+
+    request: Dict - {"capacities": [...], "goal": g, "engine": name}, capacities leave out the goal jug. The engine is
+        one of search()'s or 'table', which looks the goal up in the worker's distance table for the capacities
+    deadline: float - time.time() by which to answer, search() returns its best answer so far when it runs out
+
+    returns: Dict - the cost and how the search went
+    """
+    capacities = [GOAL_JUG] + [int(c) for c in request['capacities']]
+    goal = int(request['goal'])
+    engine = request.get('engine', 'greedy')
+    if engine == 'table':
+        return {'cost': _worker['tables'].lookup(capacities, goal), 'complete': True}
+
+    stats = JugStats()
+    result = search(capacities, goal, stats=stats, engine=engine, budget=SearchBudget(time_limit=max(0.0, deadline - time.time())))
+    if not result.complete and result.cost == -1:
+        raise Deadline()
+    lower_bound = result.lower_bound if result.lower_bound != float('inf') else None
+    return {'cost': result.cost, 'lower_bound': lower_bound, 'complete': result.complete, **stats.as_dict()}
+
+def tile_session(request: Dict) -> Tuple[TileSession, Dict[Shape, int], Dict[int, int]]:
+    """
+    The worker's TileSession for the request's landscape, created on first use
+
+    request: Dict - {"path": problem file} or {"bushes": rows of colors, "shape_targets": {...}, "bush_targets": {...}},
+        targets in the request override the file's
+
+    returns: Tuple[TileSession, Dict[Shape, int], Dict[int, int]] - the session and the targets to solve for, every
+        shape and color 1 to 4, those neither the request nor the file sets are 0
+    """
+    if 'path' in request:
+        bushes, shape_targets, size, bush_targets, _ = load(request['path'])
+    else:
+        bushes = np.asarray(request['bushes'], dtype=np.int8)
+        size, shape_targets, bush_targets = len(bushes), {}, {}
+    shape_targets = {**shape_targets, **{Shape[k]: int(v) for k, v in request.get('shape_targets', {}).items()}}
+    bush_targets = {**bush_targets, **{int(k): int(v) for k, v in request.get('bush_targets', {}).items()}}
+    # The session is shared by every request for the landscape, so each one sets all of the targets rather than
+    # leaving some at whatever the previous request asked for
+    shape_targets = {shape: shape_targets.get(shape, 0) for shape in Shape}
+    bush_targets = {color: bush_targets.get(color, 0) for color in range(1, 5)}
+
+    sessions: OrderedDict = _worker['sessions']
+    key = (size, bushes.tobytes())
+    if key in sessions:
+        sessions.move_to_end(key)
+    else:
+        sessions[key] = TileSession(bushes, size, shape_targets, bush_targets)
+        if len(sessions) > _worker['max_sessions']:
+            sessions.popitem(last=False)
+    return sessions[key], shape_targets, bush_targets
+
+def solve_tile(request: Dict, deadline: float) -> Dict:
+    """
+    Answer a tile placement request from the worker's session for its landscape
+
+    request: Dict - see tile_session, optionally with "restarts" for the backtracking
+    deadline: float - time.time() by which to answer, the search raises Deadline once it is past it
+
+    returns: Dict - the solution as TILE_TYPES indices in row major order, None when there is none
+    """
+    session, shape_targets, bush_targets = tile_session(request)
+    session.set_targets(shape_targets, bush_targets)
+
+    def check(stats: TileStats) -> None:
+        if time.time() > deadline:
+            raise Deadline()
+
+    solution = session.solve(restarts=int(request.get('restarts', 0)), stats=TileStats(callback=check, every=50))
+    return {'solution': session.solution.tolist() if solution is not None else None}
+
+# kind: worker function called as handler(request, deadline)
+HANDLERS = {
+    'water_jug': solve_jug,
+    'tile': solve_tile,
+}
+
+def run_job(kind: str, request: Dict, deadline: float) -> Dict:
+    """
+    Process pool task, run one request in the worker and turn what happened into a response
+
+    kind: str - a name from HANDLERS
+    request: Dict - the request
+    deadline: float - time.time() by which to answer
+
+    returns: Dict - {"status": "ok", "result": ...}, {"status": "timeout"} or {"status": "error", "error": message}
+    """
+    if time.time() > deadline:
+        return {'status': 'timeout'}
+    try:
+        return {'status': 'ok', 'result': HANDLERS[kind](request, deadline)}
+    except Deadline:
+        return {'status': 'timeout'}
+    except Exception as error:
+        return {'status': 'error', 'error': f'{type(error).__name__}: {error}'}
+
+def affinity(kind: str, request: Dict) -> str:
+    """
+    What requests that share a worker cache have in common, used to send them to the same worker
+
+    kind: str - the request kind
+    request: Dict - the request
+
+    returns: str - the capacity set for water jug requests, the problem file or landscape for tile requests
+    """
+    if kind == 'water_jug':
+        return 'jug:' + ','.join(map(str, sorted(request.get('capacities', []))))
+    return 'tile:' + (request['path'] if 'path' in request else json.dumps(request.get('bushes')))
+
+def is_int(value) -> bool:
+    """
+    returns: bool - whether a parsed JSON value is an integer, JSON true and false are not
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def request_error(kind: str, request: Dict) -> Optional[str]:
+    """
+    Check the fields of a request against what its handler expects, so a malformed request is answered with an error
+    instead of failing in a worker or in the daemon
+
+    kind: str - a name from HANDLERS
+    request: Dict - the request
+
+    returns: Optional[str] - what is wrong with the request, None when nothing is
+    """
+    if kind == 'water_jug':
+        capacities = request.get('capacities')
+        if not isinstance(capacities, list) or not capacities or not all(is_int(c) and c > 0 for c in capacities):
+            return f'capacities should be a list of positive integers, got {capacities!r}'
+        if not is_int(request.get('goal')) or request['goal'] < 0:
+            return f'goal should be a non-negative integer, got {request.get("goal")!r}'
+        engine = request.get('engine', 'greedy')
+        if not isinstance(engine, str) or engine not in list(JUG_ENGINES) + ['table']:
+            return f'unknown engine {engine}, expected one of {sorted(JUG_ENGINES) + ["table"]}'
+        return None
+
+    if 'path' in request:
+        if not isinstance(request['path'], str):
+            return f'path should be a string, got {request["path"]!r}'
+    elif 'bushes' in request:
+        bushes = request['bushes']
+        square = isinstance(bushes, list) and bushes and all(isinstance(row, list) and len(row) == len(bushes) for row in bushes)
+        if not square or not all(is_int(c) and 0 <= c <= 4 for row in bushes for c in row):
+            return 'bushes should be a square list of rows of colors 0 to 4'
+    else:
+        return 'expected a path or bushes'
+    shape_targets = request.get('shape_targets', {})
+    if not isinstance(shape_targets, dict) or not all(k in Shape.__members__ and is_int(v) and v >= 0 for k, v in shape_targets.items()):
+        return f'shape_targets should map shape names {list(Shape.__members__)} to non-negative integers, got {shape_targets!r}'
+    bush_targets = request.get('bush_targets', {})
+    if not isinstance(bush_targets, dict) or not all(k in ('1', '2', '3', '4') and is_int(v) and v >= 0 for k, v in bush_targets.items()):
+        return f'bush_targets should map colors 1 to 4 to non-negative integers, got {bush_targets!r}'
+    if not is_int(request.get('restarts', 0)) or request.get('restarts', 0) < 0:
+        return f'restarts should be a non-negative integer, got {request.get("restarts")!r}'
+    return None
+
+class SolverDaemon:
+    """
+    Long lived solver behind a newline delimited JSON protocol. Every request is a JSON object on its own line,
+    {"id": ..., "kind": "water_jug" | "tile" | "ping", "timeout": seconds, ...}, answered by one line with the same id
+    as soon as it is done, so a client may pipeline any number of requests on one connection.
+
+    Jobs run in worker processes that are started and warmed up before the daemon accepts connections. Each worker is
+    its own single process pool and requests go to a worker picked from affinity(), so every request for a capacity
+    set or landscape finds the distance table or TileSession the previous one left behind.
+
+    At most max_in_flight jobs are handed to the workers at once. Further requests wait, and while they wait their
+    connection isn't read, so a client that sends too much is slowed down by its socket. Past max_waiting waiting
+    requests new ones are answered "busy" straight away. A request that is not answered within its timeout gets
+    "timeout": one still queued is cancelled, a running one notices the deadline itself and returns early. Not every
+    solver can check a deadline (building a distance table can't), so a worker still busy a second past the deadline
+    is killed and replaced, losing its caches. Requests queued behind it move to the new worker
+    """
+    def __init__(self, workers: Optional[int] = None, max_in_flight: Optional[int] = None, max_waiting: int = 1000,
+                 timeout: float = 30.0, cache_dir: Optional[str] = None, max_goal: int = 1000, max_sessions: int = 8) -> None:
+        """
+        workers: Optional[int] - worker processes, defaults to the number of cpus
+        max_in_flight: Optional[int] - jobs handed to the workers at once, defaults to 4 per worker
+        max_waiting: int - requests allowed to wait for a slot before new ones are turned away
+        timeout: float - seconds a request may take when it doesn't set its own timeout
+        cache_dir: Optional[str] - directory for distance tables shared by every worker and across restarts
+        max_goal: int - the largest goal the 'table' engine answers
+        max_sessions: int - landscapes each worker keeps a TileSession for
+        """
+        self.workers: int = workers or os.cpu_count() or 1
+        self.max_in_flight: int = max_in_flight or 4 * self.workers
+        self.max_waiting: int = max_waiting
+        self.timeout: float = timeout
+        self.initargs: tuple = (cache_dir, max_goal, max_sessions)
+        self.pools: List[ProcessPoolExecutor] = [self.pool() for _ in range(self.workers)]
+        self.restarts: int = 0
+        self.background: set = set()
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.waiting: int = 0
+        self.in_flight: int = 0
+        # responses sent per status
+        self.counts: Dict[str, int] = {}
+        self.started: float = time.time()
+
+    def pool(self) -> ProcessPoolExecutor:
+        """
+        Workers come from a fork server, started along with the first worker by warm_up() before the daemon listens.
+        A worker forked from the daemon itself, as a replacement is, would inherit the client sockets open at the time
+        and keep those connections open after the daemon closes them
+
+        returns: ProcessPoolExecutor - a new single worker pool
+        """
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('forkserver'), initializer=init_worker,
+                                   initargs=self.initargs)
+
+    async def restart(self, shard: int, pool: ProcessPoolExecutor) -> None:
+        """
+        Kill a worker that is stuck past a deadline and warm up a new one in its place
+
+        shard: int - position of the worker in self.pools
+        pool: ProcessPoolExecutor - the pool that was stuck, nothing happens if it was already replaced
+        """
+        if self.pools[shard] is not pool:
+            return
+        self.pools[shard] = self.pool()
+        self.restarts += 1
+        # Kill through the stuck pool's own process handles, they stay valid until the pool reaps the process, so this
+        # never hits a reused pid. shutdown() alone would leave a busy worker running
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.pools[shard], warm)
+        finally:
+            self.background.discard(asyncio.current_task())
+
+    async def warm_up(self) -> List[int]:
+        """
+        Start every worker and run warm() in it
+
+        returns: List[int] - the workers' pids
+        """
+        loop = asyncio.get_running_loop()
+        return list(await asyncio.gather(*(loop.run_in_executor(pool, warm) for pool in self.pools)))
+
+    def status(self) -> Dict:
+        """
+        returns: Dict - the answer to a ping, what the daemon is doing right now and has done
+        """
+        return {'workers': self.workers, 'in_flight': self.in_flight, 'waiting': self.waiting, 'max_in_flight': self.max_in_flight,
+                'uptime': time.time() - self.started, 'restarts': self.restarts, 'responses': dict(self.counts)}
+
+    def check(self, request: Dict) -> Optional[Dict]:
+        """
+        Answer the requests that never reach a worker: pings, malformed requests and, when too many requests already
+        wait for a slot, everything else
+
+        request: Dict - the parsed request line
+
+        returns: Optional[Dict] - the response, None when the request should be queued for a worker
+        """
+        kind = request.get('kind')
+        timeout = request.get('timeout', self.timeout)
+        if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or not 0 <= timeout < math.inf:
+            return {'status': 'error', 'error': f'bad request: timeout should be a number of seconds, got {timeout!r}'}
+        if kind == 'ping':
+            return {'status': 'ok', 'result': self.status()}
+        if not isinstance(kind, str) or kind not in HANDLERS:
+            return {'status': 'error', 'error': f'unknown kind {kind}, expected one of {sorted(HANDLERS) + ["ping"]}'}
+        error = request_error(kind, request)
+        if error is not None:
+            return {'status': 'error', 'error': f'bad request: {error}'}
+        if self.waiting >= self.max_waiting:
+            return {'status': 'busy'}
+        return None
+
+    async def run(self, request: Dict, deadline: float) -> Dict:
+        """
+        Run a request in its worker, the caller holds one of the slots and this releases it
+
+        request: Dict - a request check() let through
+        deadline: float - time.time() by which to answer
+
+        returns: Dict - the response, without the id
+        """
+        shard = zlib.crc32(affinity(request['kind'], request).encode()) % len(self.pools)
+        self.in_flight += 1
+        try:
+            while time.time() < deadline:
+                pool = self.pools[shard]
+                try:
+                    future = pool.submit(run_job, request['kind'], request, deadline)
+                    # The worker checks the deadline itself, the extra second covers getting the answer back
+                    return await asyncio.wait_for(asyncio.wrap_future(future), max(0.0, deadline - time.time()) + 1.0)
+                except asyncio.TimeoutError:
+                    if not future.cancel():
+                        # Answer now, the replacement warms up in the background
+                        self.background.add(asyncio.ensure_future(self.restart(shard, pool)))
+                    break
+                except BrokenProcessPool:
+                    # The worker died under this request, usually killed by another request's timeout, try the new one
+                    await self.restart(shard, pool)
+            return {'status': 'timeout'}
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Read request lines until the client closes the connection, answering each as it finishes. Before a request
+        goes to a worker the loop waits for a slot, so nothing more is read from a client while every slot is taken
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(request: Dict, response: Dict, t0: float) -> None:
+            response = {'id': request.get('id'), **response, 'time': time.perf_counter() - t0}
+            self.counts[response['status']] = self.counts.get(response['status'], 0) + 1
+            async with lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+
+        async def answer(request: Dict, deadline: float, t0: float) -> None:
+            await respond(request, await self.run(request, deadline), t0)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('expected a JSON object')
+                except ValueError as error:
+                    await respond({}, {'status': 'error', 'error': f'bad request: {error}'}, t0)
+                    continue
+
+                # A request check() missed still only gets an error of its own, the connection carries on
+                try:
+                    response = self.check(request)
+                    if response is None:
+                        timeout = float(request.get('timeout', self.timeout))
+                except (TypeError, ValueError) as error:
+                    response = {'status': 'error', 'error': f'bad request: {error}'}
+                if response is not None:
+                    await respond(request, response, t0)
+                    continue
+
+                deadline = time.time() + timeout
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(self.slots.acquire(), timeout)
+                except asyncio.TimeoutError:
+                    await respond(request, {'status': 'timeout'}, t0)
+                    continue
+                finally:
+                    self.waiting -= 1
+
+                task = asyncio.ensure_future(answer(request, deadline, t0))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, socket_path: Optional[str] = None) -> None:
+        """
+        Warm the workers up, then serve until SIGINT or SIGTERM
+
+        host: str - interface to listen on when not using a Unix socket
+        port: int - TCP port to listen on when not using a Unix socket
+        socket_path: Optional[str] - listen on this Unix socket instead of TCP
+        """
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        pids = await self.warm_up()
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.serve_connection, path=socket_path)
+            where = socket_path
+        else:
+            server = await asyncio.start_server(self.serve_connection, host, port)
+            where = f'{host}:{port}'
+        print(f'serving on {where} with {len(pids)} workers', file=sys.stderr, flush=True)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        async with server:
+            await stop.wait()
+        self.close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+    def close(self) -> None:
+        """
+        Stop the workers, dropping queued jobs
+        """
+        for pool in self.pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve water jug and tile placement requests from warm worker processes, one JSON object per line')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on')
+    parser.add_argument('-p', '--port', type=int, default=8765, help='TCP port to listen on')
+    parser.add_argument('-s', '--socket', default=None, help='listen on this Unix socket instead of TCP')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: cpu count)')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='jobs handed to the workers at once (default: 4 per worker)')
+    parser.add_argument('--max-waiting', type=int, default=1000, help='waiting requests before new ones are answered busy')
+    parser.add_argument('-t', '--timeout', type=float, default=30.0, help='seconds a request may take unless it sets its own timeout')
+    parser.add_argument('--cache-dir', default=None, help='directory for distance tables shared by the workers')
+    parser.add_argument('--max-goal', type=int, default=1000, help='largest goal the table engine answers')
+    parser.add_argument('--max-sessions', type=int, default=8, help='landscapes every worker keeps warm')
+    args = parser.parse_args()
+
+    daemon = SolverDaemon(args.workers, args.max_in_flight, args.max_waiting, args.timeout, args.cache_dir, args.max_goal, args.max_sessions)
+    asyncio.run(daemon.serve(args.host, args.port, args.socket))
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from solver_daemon import SolverDaemon, init_worker, request_error, run_job
+
+@pytest.fixture
+def daemon():
+    # The worker pools only start a process on their first job, so nothing runs here
+    daemon = SolverDaemon(1, max_waiting=2)
+    yield daemon
+    daemon.close()
+
+@pytest.mark.parametrize('request_', [
+    {'capacities': '12', 'goal': 4},
+    {'capacities': [], 'goal': 4},
+    {'capacities': [3, 0], 'goal': 4},
+    {'capacities': [3, True], 'goal': 4},
+    {'capacities': [3, 5.0], 'goal': 4},
+    {'capacities': [3, 5]},
+    {'capacities': [3, 5], 'goal': -1},
+    {'capacities': [3, 5], 'goal': '4'},
+    {'capacities': [3, 5], 'goal': 4, 'engine': 'dfs'},
+    {'capacities': [3, 5], 'goal': 4, 'engine': ['astar']},
+])
+def test_bad_water_jug_requests(request_):
+    assert request_error('water_jug', request_) is not None
+
+@pytest.mark.parametrize('request_', [
+    {},
+    {'path': 3},
+    {'bushes': []},
+    {'bushes': [[0, 1], [2]]},
+    {'bushes': [[0, 5], [0, 0]]},
+    {'bushes': [[0, 0], [0, 0]], 'shape_targets': {'CIRCLE': 1}},
+    {'bushes': [[0, 0], [0, 0]], 'shape_targets': {'FULL_BLOCK': -1}},
+    {'bushes': [[0, 0], [0, 0]], 'bush_targets': {'5': 1}},
+    {'bushes': [[0, 0], [0, 0]], 'bush_targets': {'1': 1.5}},
+    {'bushes': [[0, 0], [0, 0]], 'restarts': -1},
+])
+def test_bad_tile_requests(request_):
+    assert request_error('tile', request_) is not None
+
+@pytest.mark.parametrize('kind, request_', [
+    ('water_jug', {'capacities': [3, 5], 'goal': 4}),
+    ('water_jug', {'capacities': [3, 5], 'goal': 0, 'engine': 'table'}),
+    ('tile', {'path': 'problem.txt', 'restarts': 2}),
+    ('tile', {'bushes': [[0, 1], [2, 0]], 'shape_targets': {'FULL_BLOCK': 1}, 'bush_targets': {'1': 0}}),
+])
+def test_good_requests(kind, request_):
+    assert request_error(kind, request_) is None
+
+@pytest.mark.parametrize('request_', [
+    {'kind': 'water_jug', 'capacities': [3, 5], 'goal': 4, 'timeout': -1},
+    {'kind': 'water_jug', 'capacities': [3, 5], 'goal': 4, 'timeout': float('inf')},
+    {'kind': 'water_jug', 'capacities': [3, 5], 'goal': 4, 'timeout': '1'},
+    {'kind': 'ping', 'timeout': True},
+    {'kind': 'sort'},
+    {'capacities': [3, 5], 'goal': 4},
+    {'kind': 'water_jug', 'capacities': [3, 5], 'goal': -4},
+])
+def test_check_rejects(daemon, request_):
+    assert daemon.check(request_)['status'] == 'error'
+
+def test_check(daemon):
+    request = {'kind': 'water_jug', 'capacities': [3, 5], 'goal': 4, 'timeout': 1}
+    assert daemon.check(request) is None
+    assert daemon.check({'kind': 'ping'})['result']['workers'] == 1
+    daemon.waiting = 2
+    assert daemon.check(request) == {'status': 'busy'}
+    assert daemon.check({'kind': 'ping'})['status'] == 'ok'
+
+def test_run_job():
+    init_worker(None, 100, 2)
+    deadline = time.time() + 10
+    assert run_job('water_jug', {'capacities': [3, 5], 'goal': 4, 'engine': 'astar'}, deadline)['result']['cost'] == 7
+    assert run_job('water_jug', {'capacities': [3, 5], 'goal': 4, 'engine': 'table'}, deadline)['result']['cost'] == 7
+    assert run_job('water_jug', {'capacities': [3, 5], 'goal': 400, 'engine': 'table'}, deadline)['status'] == 'error'
+    assert run_job('water_jug', {'capacities': [3, 5], 'goal': 4}, time.time() - 1) == {'status': 'timeout'}
+    solution = run_job('tile', {'bushes': [[0] * 4] * 4, 'shape_targets': {'FULL_BLOCK': 1}}, deadline)['result']['solution']
+    assert len(solution) == 1